@@ -1,6 +1,16 @@
 import configparser as cp
+import gzip
+import pickle
+from pathlib import Path
+from typing import Union
+import numpy as np
 from event_handler import e_handler, event
 from market.markets import Markets
+from market.bar_feed import BarFeed
+from market.shared_market import SharedMarket
+from backtest.signal_handler import SignalHandler
+from backtest.profiler import Profiler
+from holdings.portfolio import Portfolio
 from holdings.portfolio_master import MasterPortfolio
 from metric.metric import Metrics
 
@@ -9,9 +19,14 @@ class Backtests:
     """
     Main backtest class.
     Holds a MasterPortfolio, a Market and Metric object.
+    The market is either a Markets object, a BarFeed for streaming bars from disk, or a SharedMarket attached to
+    market data in shared memory.
+    The event-driven backtest can save its complete state to checkpoint files at an interval of bars (see
+    checkpoint), so a run can be resumed or forked from a checkpoint (see resume and fork).
+    With profiling enabled, time spent per event type and phase is recorded by a Profiler and reported at the end.
     """
     def __init__(self,
-                 market: Markets,
+                 market: Union[Markets, BarFeed, SharedMarket],
                  mpf: MasterPortfolio,
                  start_date: str,
                  end_date: str,
@@ -29,17 +44,39 @@ class Backtests:
         self.metric = Metrics()
         self.strategy = None
 
-        self.start_date = start_date
-        self.end_date = end_date
+        # Dates are converted once here, and are np.datetime64 throughout the backtest.
+        self.start_date = Markets.to_date(start_date)
+        self.end_date = Markets.to_date(end_date)
         self.validate_date(date=self.start_date)
         self.validate_date(date=self.end_date)
-        self.start_index = self.market.data.index.get_loc(self.start_date)
+        self.start_index = self.market.index_of(self.start_date)
 
-        self.end_index = self.market.data.index.get_loc(self.end_date)
+        self.end_index = self.market.index_of(self.end_date)
 
         self.current_date = self.start_date
         self.current_index = self.start_index
 
+        self.signal_dates = {}
+        self.signal_schedule()
+        self.signal_handlers = {}
+        self.register_strategies()
+
+        # Allocate portfolio history for all dates in the backtest period up front.
+        bars = self.end_index - self.start_index + 1
+        for pf in list(self.mpf.portfolios.values()) + [self.mpf]:
+            pf.history_table.reserve(len(pf.history_table) + bars)
+
+        # Row index of the next bar to handle. Set by resume() to continue a run from a checkpoint.
+        self.next_index = self.start_index
+        self.checkpoint_interval = int(self.config['checkpoint']['interval'])
+        self.checkpoint_directory = Path(self.config['checkpoint']['checkpoint_directory'])
+        # Name of checkpoint files of this run.
+        self.run_id = self.mpf.pf_id
+
+        # Profiler for timing the backtest. Records nothing when profiling is disabled.
+        self.profiler = Profiler(enabled=self.config['profiling'].getboolean('enabled'),
+                                 trace_memory=self.config['profiling'].getboolean('trace_memory'))
+
     @staticmethod
     def config() -> cp.ConfigParser:
         """
@@ -55,143 +92,445 @@ class Backtests:
         return conf
 
     def validate_date(self,
-                      date: str) -> bool:
+                      date) -> bool:
         """
         Check if given date exists in market data.
         :param date: Start or end date.
         :return: True/False.
         """
-        if date in self.market.data.index.values:
+        if date in self.market.date_index:
             return True
         else:
-            print('CRITICAL: Date ' + date + ' does not exist in market data files. Aborted.')
+            print('CRITICAL: Date ' + Markets.date_str(date) + ' does not exist in market data files. Aborted.')
             quit()
 
+    def signal_schedule(self) -> None:
+        """
+        Precompute the dates (as row indexes) on which each portfolio's strategy needs a signal, from
+        Strategy.schedule. CALCSIGNAL events are only created on these dates. Strategies without a schedule get
+        one every date.
+        :return: None.
+        """
+        for pf_id, st in self.mpf.strategies.items():
+            indices = st.schedule(calendar=self.market.calendar,
+                                  start=self.start_index,
+                                  end=self.end_index)
+            self.signal_dates[pf_id] = None if indices is None else set(indices.tolist())
+
+    def register_strategies(self) -> None:
+        """
+        Resolve a SignalHandler for each portfolio's strategy, which prepares the strategy's market data once.
+        :return: None.
+        """
+        for pf_id, pf in self.mpf.portfolios.items():
+            st = self.mpf.strategies.get(pf_id)
+            handler = SignalHandler.resolve(st)
+            self.signal_handlers[pf_id] = handler(strategy=st,
+                                                  pf=pf,
+                                                  market=self.market,
+                                                  start=self.start_index,
+                                                  end=self.end_index,
+                                                  commission=self.mpf.commission)
+
     def run(self) -> None:
         """
         Runs the backtest for all portfolios as an infinite outer loop for handling dates,
         and an inner loop for handling events.
         :return: None.
         """
-        print('INFO: Backtest running from ' + self.start_date + ' to ' + self.end_date + '.')
+        print('INFO: Backtest running from ' + Markets.date_str(self.start_date) + ' to ' +
+              Markets.date_str(self.end_date) + '.')
         print('')
         if self.verbose:
             print('INFO: Verbose logging of events.')
+        profiler = self.profiler
+        with profiler.phase(name='run'):
+
+            # Outer loop for handling each date in backtest period.
+            # Bars come from the market, either fully in memory or streamed from disk by a BarFeed.
+            for self.current_index, self.current_date in self.market.bars(start=self.next_index,
+                                                                          end=self.end_index):
+                self.mpf.current_date = self.current_date
+                market_ev = event.NewBar(date=self.current_date,
+                                         pf_id='')
+                self.event_handler.put_event(market_ev)
+
+                # Infinite inner loop for handling events in event queue.
+                while not self.event_handler.is_empty():
+                    # Handle each event for one portfolio at a time.
+                    self.current_event = self.event_handler.get_event()
+
+                    if self.verbose:
+                        print('  ' + self.current_event.details)
 
-        # Infinite outer loop for handling each date in backtest period
-        while self.cont_backtest:
-            market_ev = event.NewBar(date=self.current_date,
-                                     pf_id='')
-            self.event_handler.put_event(market_ev)
-
-            # Infinite inner loop for handling events in event queue.
-            while not self.event_handler.is_empty():
-                # Handle each event for one portfolio at a time.
-                self.current_event = self.event_handler.get_event()
-
-                if self.verbose:
-                    print('  ' + self.current_event.details)
-
-                # BAR type event.
-                # Done for all portfolios.
-                if self.current_event.type == 'BAR':
-                    for pf_id in self.mpf.portfolios:
-                        # If there is a strategy, calculate signal for it.
-                        calc_signal_ev = event.CalcSignal(date=self.current_date,
-                                                          pf_id=pf_id)
-                        self.event_handler.put_event(event=calc_signal_ev)
-                        # Update market values.
-                        pf = self.mpf.portfolios.get(pf_id)
-                        pf.update_all_market_values(date=self.current_event.date,
-                                                    market_data=self.market)
-                    self.mpf.update_bench_mark(date=self.current_date,
-                                               market=self.market)
-
-                # CALCSIGNAL type event.
-                # Done for all portfolios.
-                if self.current_event.type == 'CALCSIGNAL':
-                    for pf_id in self.mpf.portfolios:
-                        pf = self.mpf.portfolios.get(pf_id)
-                        # Choose corresponding strategy for the portfolio.
-                        self.strategy = self.mpf.strategies.get(pf_id)
-                        # Different strategies require different ways to handle calculation of signals.
-                        if self.strategy.name == 'Periodic re-balancing':
-                            # Get market data for specific date.
-                            cols = list(self.strategy.id_weight.keys())
-                            df = self.market.select(columns=cols,
-                                                    start_date=self.current_event.date,
-                                                    end_date=self.current_event.date)
-                            transaction = ''
-                            # Start-of-month re-balance.
-                            if df['is_som'].iloc[0] == 1 and self.strategy.period == 'som':
-                                transaction = self.strategy.calc_signal(events=self.current_event,
-                                                                        data=df,
-                                                                        idx=self.current_index,
-                                                                        pf=pf)
-                            # End-of-month re-balance.
-                            elif df['is_eom'].iloc[0] == 1 and self.strategy.period == 'eom':
-                                transaction = self.strategy.calc_signal(events=self.current_event,
-                                                                        data=df,
-                                                                        idx=self.current_index,
-                                                                        pf=pf)
-                            # Start-of-week re-balance.
-                            elif df['is_sow'].iloc[0] == 1 and self.strategy.period == 'sow':
-                                transaction = self.strategy.calc_signal(events=self.current_event,
-                                                                        data=df,
-                                                                        idx=self.current_index,
-                                                                        pf=pf)
-                            # End-of-week re-balance.
-                            elif df['is_eow'].iloc[0] == 1 and self.strategy.period == 'eow':
-                                transaction = self.strategy.calc_signal(events=self.current_event,
-                                                                        data=df,
-                                                                        idx=self.current_index,
-                                                                        pf=pf)
-                            # Add transaction from signal generation to event_handler.
-                            if transaction:
-                                self.event_handler.put_event(event=transaction)
-
-                        elif self.strategy.name == 'Buy and hold':
-                            # Get market data for specific date.
-                            cols = list(self.strategy.id_num_shares.keys())
-
-                            df = self.market.select(columns=cols,
-                                                    start_date=self.current_event.date,
-                                                    end_date=self.current_event.date)
-                            transaction = self.strategy.calc_signal(data=df,
-                                                                    idx=self.current_index,
-                                                                    pf=pf,
-                                                                    commission=self.mpf.commission)
-                            # Add transaction from signal generation to event_handler.
-                            if transaction:
-                                self.event_handler.put_event(event=transaction)
-
-                        else:
-                            pass
-
-                # TRANSACTION type event.
-                # Done for a specific portfolio.
-                if self.current_event.type == 'TRANSACTION':
-                    # Choose the corresponding portfolio.
-                    pf = self.mpf.portfolios.get(self.current_event.pf_id)
-                    pf.transact_security(trans=self.current_event.trans)
-
-            # Move to next date.
-            self.current_index += 1
+                    # BAR type event.
+                    # Done for all portfolios.
+                    if self.current_event.type == event.EventType.BAR:
+                        with profiler.phase(name='BAR'):
+                            for pf_id in self.mpf.portfolios:
+                                # Calculate signal for the portfolio's strategy, if it needs one on this date.
+                                dates = self.signal_dates[pf_id]
+                                if dates is None or self.current_index in dates:
+                                    calc_signal_ev = event.CalcSignal(date=self.current_date,
+                                                                      pf_id=pf_id)
+                                    self.event_handler.put_event(event=calc_signal_ev)
+                                # Update market values.
+                                pf = self.mpf.portfolios.get(pf_id)
+                                with profiler.phase(name='mark_to_market',
+                                                    pf_id=pf_id):
+                                    pf.update_all_market_values(date=self.current_event.date,
+                                                                market_data=self.market)
+                            with profiler.phase(name='master_aggregation'):
+                                self.mpf.update_bench_mark(date=self.current_date,
+                                                           market=self.market)
+
+                    # CALCSIGNAL type event.
+                    # Done for a specific portfolio.
+                    if self.current_event.type == event.EventType.CALCSIGNAL:
+                        pf_id = self.current_event.pf_id
+                        with profiler.phase(name='CALCSIGNAL',
+                                            pf_id=pf_id):
+                            # Choose corresponding strategy for the portfolio.
+                            self.strategy = self.mpf.strategies.get(pf_id)
+                            transactions = self.signal_handlers[pf_id].signal(idx=self.current_index)
+                            # Add transactions from signal generation to event_handler.
+                            self.event_handler.put_events(events=transactions)
+
+                    # TRANSACTION type event.
+                    # Done for a specific portfolio.
+                    if self.current_event.type == event.EventType.TRANSACTION:
+                        # Choose the corresponding portfolio.
+                        pf = self.mpf.portfolios.get(self.current_event.pf_id)
+                        with profiler.phase(name='TRANSACTION',
+                                            pf_id=pf.pf_id):
+                            pf.transact_security(trans=self.current_event.trans)
+
+                self.next_index = self.current_index + 1
+                if self.checkpoint_interval > 0 and \
+                        (self.next_index - self.start_index) % self.checkpoint_interval == 0:
+                    with profiler.phase(name='checkpoint'):
+                        self.checkpoint()
 
             # End backtest when end_date is reached.
-            if self.current_index > self.end_index:
-                # Calculate metrics for all portfolios and for the Master Portfolio.
+            self.calc_metrics()
+        if profiler.enabled:
+            self.end_profiling()
+
+    def checkpoint(self,
+                   path: Union[str, Path] = None) -> Path:
+        """
+        Save the complete state of the backtest after the current bar: the next bar to handle, the event queue and
+        the MasterPortfolio with all its portfolios, positions, strategies and history. Saved as a gzip compressed
+        pickle. Market data is not saved, it is given again on resume.
+        The file is written to a temporary file first and then renamed, so a run dying while saving does not
+        leave a broken checkpoint.
+        :param path: Checkpoint file. None for "<run id>_<date>.ckpt" in the checkpoint directory.
+        :return: Path of checkpoint file.
+        """
+        if path is None:
+            path = self.checkpoint_directory / (self.run_id + '_' + Markets.date_str(self.current_date) + '.ckpt')
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {'start_date': self.start_date,
+                 'end_date': self.end_date,
+                 'current_index': self.current_index,
+                 'current_date': self.current_date,
+                 'next_index': self.next_index,
+                 'queue': [item[3] for item in sorted(self.event_handler.event_queue)],
+                 'mpf': self.mpf}
+        temp_path = path.with_suffix(path.suffix + '.tmp')
+        with gzip.open(temp_path, 'wb', compresslevel=1) as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(path)
+        print('INFO: Checkpoint saved to ' + str(path) + '.')
+        return path
+
+    @classmethod
+    def latest_checkpoint(cls,
+                          run_id: str = None) -> Path:
+        """
+        Find the most recently saved checkpoint file of a run in the checkpoint directory.
+        :param run_id: Run id. None for the master portfolio id in portfolio_config.ini, the run id of a run that was
+        not resumed or forked.
+        :return: Path of checkpoint file.
+        """
+        if not run_id:
+            run_id = MasterPortfolio.config()[0]['portfolio_information']['pf_id']
+        directory = Path(cls.config()['checkpoint']['checkpoint_directory'])
+        # File names are "<run id>_<YYYY-MM-DD>.ckpt". Compare the run id exactly, since run ids may share a prefix.
+        files = [f for f in directory.glob('*_*.ckpt') if f.stem[:-11] == run_id]
+        if not files:
+            print('CRITICAL: No checkpoint files of run ' + run_id + ' found in ' + str(directory) + '. Aborted.')
+            quit()
+        return max(files, key=lambda f: f.stat().st_mtime)
+
+    @classmethod
+    def resume(cls,
+               market: Union[Markets, BarFeed, SharedMarket],
+               path: Union[str, Path] = None,
+               strategies: dict = None,
+               run_id: str = None,
+               verbose=False) -> 'Backtests':
+        """
+        Create a backtest continuing from a checkpoint. Running it gives results identical to the run that saved
+        the checkpoint. With strategies, the run is forked instead: the given portfolios continue with other
+        strategies from the checkpoint's date, without replaying the backtest up to it.
+        :param market: Market data of the saved run.
+        :param path: Checkpoint file. None for the latest checkpoint of run_id (see latest_checkpoint).
+        :param strategies: Dict of {portfolio id: Strategy object} replacing strategies of the saved run.
+        :param run_id: Name of checkpoint files saved by the resumed run. None for the master portfolio id.
+        :param verbose: Bool.
+        :return: Backtests object. Call run() to continue.
+        """
+        if path is None:
+            path = cls.latest_checkpoint(run_id=run_id)
+        if not Path(path).exists():
+            print('CRITICAL: Checkpoint file ' + str(path) + ' not found. Aborted.')
+            quit()
+        with gzip.open(path, 'rb') as f:
+            state = pickle.load(f)
+        mpf = state['mpf']
+        for pf_id, st in (strategies or {}).items():
+            if pf_id not in mpf.portfolios:
+                print('CRITICAL: Portfolio ' + str(pf_id) + ' not in checkpoint. Aborted.')
+                quit()
+            mpf.add_strategy(pf_id=pf_id,
+                             st=st)
+        test = cls(market=market,
+                   mpf=mpf,
+                   start_date=state['start_date'],
+                   end_date=state['end_date'],
+                   verbose=verbose)
+        test.current_index = state['current_index']
+        test.current_date = state['current_date']
+        test.next_index = state['next_index']
+        test.event_handler.put_events(events=state['queue'])
+        if run_id:
+            test.run_id = run_id
+        print('INFO: Resumed from checkpoint ' + str(path) + ' after ' + Markets.date_str(test.current_date) + '.')
+        return test
+
+    @classmethod
+    def fork(cls,
+             market: Union[Markets, BarFeed, SharedMarket],
+             date: str,
+             strategies: dict,
+             run_id: str,
+             source_run_id: str = None,
+             verbose=False) -> 'Backtests':
+        """
+        Create a backtest continuing from the checkpoint saved at a date with other strategies for some portfolios.
+        :param market: Market data of the saved run.
+        :param date: Date of the checkpoint, as "YYYY-MM-DD" string.
+        :param strategies: Dict of {portfolio id: Strategy object} replacing strategies of the saved run.
+        :param run_id: Name of checkpoint files saved by the forked run, so it does not overwrite the saved run's.
+        :param source_run_id: Run id of the saved run. None for the master portfolio id in portfolio_config.ini.
+        :param verbose: Bool.
+        :return: Backtests object. Call run() to continue.
+        """
+        if not source_run_id:
+            source_run_id = MasterPortfolio.config()[0]['portfolio_information']['pf_id']
+        directory = Path(cls.config()['checkpoint']['checkpoint_directory'])
+        path = directory / (source_run_id + '_' + Markets.date_str(Markets.to_date(date)) + '.ckpt')
+        if not path.exists():
+            print('CRITICAL: No checkpoint of run ' + source_run_id + ' for ' + str(date) + ' in ' + str(directory) +
+                  '. Aborted.')
+            quit()
+        return cls.resume(market=market,
+                          path=path,
+                          strategies=strategies,
+                          run_id=run_id,
+                          verbose=verbose)
+
+    def run_vectorized(self) -> None:
+        """
+        Runs the backtest for all portfolios without the event loop, for strategies with a schedule of signal dates
+        (see signal_schedule). Signals are calculated and transactions made only on scheduled dates, with the same
+        portfolio accounting as run(). Portfolio history for all dates in between is calculated with array
+        operations on market data, in the same order of operations as run(), so results are identical.
+        Falls back to run() if a strategy has no schedule, or if the market is a BarFeed.
+        :return: None.
+        """
+        if isinstance(self.market, BarFeed):
+            print('WARNING: Vectorized backtest needs random access to market data, which a BarFeed does not give. '
+                  'Running event-driven backtest.')
+            self.run()
+            return
+        for pf_id in self.mpf.portfolios:
+            if self.signal_dates[pf_id] is None:
+                print('WARNING: Strategy for portfolio ' + pf_id + ' needs a signal for every date and can not be '
+                      'vectorized. Running event-driven backtest.')
+                self.run()
+                return
+
+        print('INFO: Vectorized backtest running from ' + Markets.date_str(self.start_date) + ' to ' +
+              Markets.date_str(self.end_date) + '.')
+        print('')
+        profiler = self.profiler
+        with profiler.phase(name='run'):
+            values = {}
+            for pf_id, pf in self.mpf.portfolios.items():
+                self.strategy = self.mpf.strategies.get(pf_id)
+                blocks = []
+                first = self.start_index
+                # Positions are unchanged between two scheduled dates. History for a scheduled date is added before
+                # its transactions are made.
+                for idx in sorted(self.signal_dates[pf_id]):
+                    with profiler.phase(name='mark_to_market',
+                                        pf_id=pf_id):
+                        blocks.append(self.mark_to_market(pf=pf,
+                                                          start=first,
+                                                          end=idx))
+                    with profiler.phase(name='signal',
+                                        pf_id=pf_id):
+                        self.signal(pf_id=pf_id,
+                                    idx=idx)
+                    first = idx + 1
+                with profiler.phase(name='mark_to_market',
+                                    pf_id=pf_id):
+                    if first <= self.end_index:
+                        blocks.append(self.mark_to_market(pf=pf,
+                                                          start=first,
+                                                          end=self.end_index))
+                    values[pf_id] = np.concatenate(blocks)
+
+            with profiler.phase(name='master_aggregation'):
+                # Aggregate portfolio history for the Master Portfolio, in the same order as
+                # MasterPortfolio.update_bench_mark.
+                total = 0
                 for pf_id in self.mpf.portfolios:
-                    pf = self.mpf.portfolios.get(pf_id)
-                    if not pf.history.empty:
-                        self.metric.all_metrics(pf)
-                    else:
-                        print('WARNING: No transactions made in portfolio ' + pf.pf_id + '.')
-                self.metric.all_metrics(self.mpf)
-                self.cont_backtest = False
-                print('')
-                print('SUCCESS: Backtest completed for master portfolio: ' + self.mpf.pf_id + '.')
+                    total = total + values[pf_id][:, :6]
+                bm = self.prices(columns=[self.mpf.benchmark],
+                                 start=self.start_index,
+                                 end=self.end_index)[:, 0]
+                dates = self.market.dates[self.start_index:self.end_index + 1]
+                for pf_id, pf in self.mpf.portfolios.items():
+                    pf.history_table.extend(dates=dates,
+                                            values=values[pf_id])
+                self.mpf.history_table.extend(dates=dates,
+                                              values=np.column_stack([total, bm]))
+            self.current_index = self.end_index
+            self.current_date = self.end_date
+            self.mpf.current_date = self.end_date
+
+            self.calc_metrics()
+        if profiler.enabled:
+            self.end_profiling()
+
+    def signal(self,
+               pf_id: str,
+               idx: int) -> None:
+        """
+        Calculate signal for a portfolio on a scheduled date and make the transactions, as for a CALCSIGNAL event.
+        :param pf_id: Portfolio id.
+        :param idx: Row index of date.
+        :return: None.
+        """
+        self.current_index = idx
+        self.current_date = self.market.dates[idx]
+        pf = self.mpf.portfolios.get(pf_id)
+        transactions = self.signal_handlers[pf_id].signal(idx=idx)
+        for transaction in transactions:
+            if self.verbose:
+                print('  ' + transaction.details)
+            pf.transact_security(trans=transaction.trans)
+
+    def prices(self,
+               columns: list,
+               start: int,
+               end: int) -> np.ndarray:
+        """
+        Market data for columns between two row indexes, as float64 (as Markets.price_at).
+        :param columns: List of column names.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Numpy array with one column per column name.
+        """
+        if not columns:
+            return np.empty((end - start + 1, 0))
+        return self.market.select(columns=columns,
+                                  start_date=self.market.dates[start],
+                                  end_date=self.market.dates[end]).to_numpy(dtype=np.float64)
+
+    def mark_to_market(self,
+                       pf: Portfolio,
+                       start: int,
+                       end: int) -> np.ndarray:
+        """
+        Update market values of all positions in a portfolio for all dates from start to end, between which the
+        positions do not change, and calculate the portfolio history for them.
+        Same accounting as Portfolio.update_all_market_values, including removal of closed positions after the
+        first date.
+        :param pf: Portfolio.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Numpy array with the Portfolio.history columns, one row per date.
+        """
+        handler = pf.position_handler
+        arrays = handler.arrays
+        n = len(arrays)
+        names = list(handler.positions)
+        benchmark = [pf.benchmark] if pf.benchmark != '' else []
+        prices = self.prices(columns=names + benchmark,
+                             start=start,
+                             end=end)
+        held = prices[:, :n]
+        not_positive = (held <= 0.0).any(axis=0)
+        if not_positive.any():
+            i = int(np.argmax(not_positive))
+            print('CRITICAL: Market price "%s" of asset "%s" must be positive to update the position. '
+                  'Aborted.' % (float(held[held[:, i] <= 0.0, i][0]), names[i]))
+            quit()
+        quantities = arrays.quantities[:n]
+        realized_pnls = arrays.realized_pnls[:n]
+        unrealized_pnls = (held - arrays.avg_prices[:n]) * quantities
+        arrays.mark(prices=held[-1],
+                    date=self.market.dates[end])
+        pf.current_date = self.market.dates[end]
+        block = np.empty((end - start + 1, len(pf.history_table.columns)))
+        block[:, 0] = pf.current_cash
+        block[:, 1] = arrays.ordered_sum(arrays.commissions[:n])
+        block[:, 2] = arrays.ordered_sum(realized_pnls)
+        block[:, 3] = arrays.ordered_sum(unrealized_pnls)
+        block[:, 4] = arrays.ordered_sum(realized_pnls + unrealized_pnls)
+        block[:, 5] = arrays.ordered_sum(quantities * held) + pf.current_cash
+        if benchmark:
+            block[:, 6] = prices[:, -1]
+
+        handler.remove_closed()
+        if end > start and len(arrays) < n:
+            # Closed positions are removed after the first date.
+            return np.concatenate([block[:1], self.mark_to_market(pf=pf,
+                                                                  start=start + 1,
+                                                                  end=end)])
+        return block
+
+    def calc_metrics(self) -> None:
+        """
+        Calculate metrics for all portfolios and for the Master Portfolio.
+        :return: None.
+        """
+        profiler = self.profiler
+        for pf_id in self.mpf.portfolios:
+            pf = self.mpf.portfolios.get(pf_id)
+            if not pf.history.empty:
+                with profiler.phase(name='metrics',
+                                    pf_id=pf_id):
+                    self.metric.all_metrics(pf)
             else:
-                self.current_date = \
-                    self.market.data.iloc[self.current_index, :].to_frame().transpose().index.values[0]
-                self.mpf.current_date = self.current_date
+                print('WARNING: No transactions made in portfolio ' + pf.pf_id + '.')
+        with profiler.phase(name='metrics',
+                            pf_id=self.mpf.pf_id):
+            self.metric.all_metrics(self.mpf)
+        self.cont_backtest = False
+        print('')
+        print('SUCCESS: Backtest completed for master portfolio: ' + self.mpf.pf_id + '.')
+
+    def end_profiling(self) -> None:
+        """
+        Stop memory tracing of the profiler and print its report. The report stays available from
+        self.profiler.report().
+        :return: None.
+        """
+        self.profiler.close()
+        self.profiler.print_report()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+from event_handler import e_handler, event
+from market.markets import Markets
+from market.live_market import LiveMarket
+from market.replay_feed import ReplayFeed
+from backtest.backtest import Backtests
+from holdings.portfolio_master import MasterPortfolio
+
+
+class PaperTrading(Backtests):
+    """
+    Paper trading of a MasterPortfolio on bars arriving from a live market data feed, with asyncio.
+    Bars are received from the feed in a separate task, so a slow feed never blocks processing and processing never
+    blocks receiving. Each bar is handled by the same event pipeline as a backtest (BAR, CALCSIGNAL and TRANSACTION
+    events), with one EventHandler and one coroutine per portfolio, so portfolios are processed concurrently.
+    Transactions are filled at once at the bar's prices, as in a backtest.
+    Strategies run unchanged: market data is a LiveMarket with the feed's trading dates, so signal schedules and
+    results are the same as a backtest over the same dates.
+    Latency from bar arrival to processing start, to order generation (signal calculated) and to the bar being
+    fully processed is recorded for every bar, see latency_report.
+    """
+    def __init__(self,
+                 feed: ReplayFeed,
+                 mpf: MasterPortfolio,
+                 verbose=False):
+        """
+
+        :param feed: ReplayFeed object, or another feed with the same API.
+        :param mpf: MasterPortfolio object.
+        :param verbose: Bool.
+        """
+        self.feed = feed
+        live = LiveMarket(columns=feed.columns,
+                          dates=feed.dates,
+                          holidays=feed.holidays,
+                          dtype=feed.dtype)
+        # Strategies looking back at recent history need the bars before the first bar received.
+        lookback = max([int(st.lookback()) for st in mpf.strategies.values()] + [1])
+        for date, values in feed.warmup(lookback - 1):
+            live.append(date=date,
+                        values=values)
+        super().__init__(market=live,
+                         mpf=mpf,
+                         start_date=feed.dates[feed.start_index],
+                         end_date=feed.dates[feed.end_index],
+                         verbose=verbose)
+        self.event_handlers = {pf_id: e_handler.EventHandler(verbose=verbose) for pf_id in self.mpf.portfolios}
+        # Bars received from the feed and not yet processed, as (date, values, arrival time) tuples.
+        self.bar_queue = None
+        # Latency records, as (date, portfolio id, stage, seconds) tuples.
+        self.latency = []
+
+    def run(self) -> None:
+        """
+        Runs paper trading until the feed has sent its last bar.
+        :return: None.
+        """
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        """
+        Runs paper trading in a running event loop, until the feed has sent its last bar.
+        :return: None.
+        """
+        print('INFO: Paper trading running from ' + Markets.date_str(self.start_date) + ' to ' +
+              Markets.date_str(self.end_date) + '.')
+        print('')
+        if self.verbose:
+            print('INFO: Verbose logging of events.')
+
+        self.bar_queue = asyncio.Queue()
+        receiver = asyncio.create_task(self.receive())
+        while True:
+            bar = await self.bar_queue.get()
+            if bar is None:
+                break
+            date, values, arrival = bar
+            self.latency.append((date, self.mpf.pf_id, 'queue', time.perf_counter() - arrival))
+            self.current_index = self.market.append(date=date,
+                                                     values=values)
+            self.current_date = date
+            self.mpf.current_date = date
+            await asyncio.gather(*[self.process(pf_id=pf_id,
+                                                arrival=arrival) for pf_id in self.mpf.portfolios])
+            self.mpf.update_bench_mark(date=date,
+                                       market=self.market)
+            self.latency.append((date, self.mpf.pf_id, 'bar', time.perf_counter() - arrival))
+        await receiver
+
+        # End paper trading when the feed is done.
+        self.calc_metrics()
+
+    async def receive(self) -> None:
+        """
+        Receive bars from the feed into the bar queue. A None ends the queue.
+        :return: None.
+        """
+        async for bar in self.feed.bars():
+            await self.bar_queue.put(bar)
+        await self.bar_queue.put(None)
+
+    async def process(self,
+                      pf_id: str,
+                      arrival: float) -> None:
+        """
+        Handle the events of one portfolio for the current bar. Yields to other portfolios and the feed after each
+        event.
+        :param pf_id: Portfolio id.
+        :param arrival: Arrival time of the bar, from time.perf_counter.
+        :return: None.
+        """
+        handler = self.event_handlers[pf_id]
+        pf = self.mpf.portfolios.get(pf_id)
+        handler.put_event(event.NewBar(date=self.current_date,
+                                       pf_id=pf_id))
+        while not handler.is_empty():
+            current_event = handler.get_event()
+
+            if self.verbose:
+                print('  ' + current_event.details)
+
+            # BAR type event.
+            if current_event.type == event.EventType.BAR:
+                # Calculate signal for the portfolio's strategy, if it needs one on this date.
+                dates = self.signal_dates[pf_id]
+                if dates is None or self.current_index in dates:
+                    handler.put_event(event.CalcSignal(date=current_event.date,
+                                                       pf_id=pf_id))
+                # Update market values.
+                pf.update_all_market_values(date=current_event.date,
+                                            market_data=self.market)
+
+            # CALCSIGNAL type event.
+            if current_event.type == event.EventType.CALCSIGNAL:
+                transactions = self.signal_handlers[pf_id].signal(idx=self.current_index)
+                self.latency.append((current_event.date, pf_id, 'signal', time.perf_counter() - arrival))
+                # Add transactions from signal generation to event handler.
+                handler.put_events(events=transactions)
+
+            # TRANSACTION type event.
+            if current_event.type == event.EventType.TRANSACTION:
+                pf.transact_security(trans=current_event.trans)
+
+            await asyncio.sleep(0)
+
+    def latency_report(self) -> pd.DataFrame:
+        """
+        Summary of recorded latencies, in milliseconds. Stage "queue" is from bar arrival to processing start (bars
+        queue up when they arrive faster than they are processed), "signal" is from bar arrival to the portfolio's
+        orders being generated, "bar" is from bar arrival to all portfolios and the master portfolio being updated.
+        :return: Pandas dataframe with one row per stage and portfolio.
+        """
+        records = pd.DataFrame(self.latency, columns=['date', 'pf_id', 'stage', 'seconds'])
+        rows = []
+        for (stage, pf_id), group in records.groupby(['stage', 'pf_id'], sort=True):
+            ms = group['seconds'].to_numpy() * 1000.0
+            rows.append({'stage': stage,
+                         'pf_id': pf_id,
+                         'count': len(ms),
+                         'mean_ms': ms.mean(),
+                         'p50_ms': np.percentile(ms, 50),
+                         'p95_ms': np.percentile(ms, 95),
+                         'p99_ms': np.percentile(ms, 99),
+                         'max_ms': ms.max()})
+        return pd.DataFrame(rows, columns=['stage', 'pf_id', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+                                           'max_ms'])
@@ -0,0 +1,143 @@
+import contextlib
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+
+class Profiler:
+    """
+    Opt-in timing of a backtest, per phase (event type or part of the backtest loop) and per portfolio.
+    Phases are timed with the phase() context manager. A disabled profiler returns the same empty context for every
+    phase, so a backtest without profiling pays one method call per phase.
+    Optionally traces memory allocations with tracemalloc, which slows the backtest down considerably. The net
+    allocated memory of each phase is recorded, i.e. memory still held when the phase ends.
+    """
+    # Report columns.
+    columns = ['phase', 'pf_id', 'count', 'total_s', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+               'share', 'alloc_kb']
+
+    # Context of phases of a disabled profiler.
+    disabled = contextlib.nullcontext()
+
+    def __init__(self,
+                 enabled: bool = True,
+                 trace_memory: bool = False) -> None:
+        """
+
+        :param enabled: If False, nothing is timed or recorded.
+        :param trace_memory: If True, record net allocated memory per phase with tracemalloc.
+        """
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        # Durations (seconds) and net allocations (bytes) per (phase, portfolio id).
+        self.durations = {}
+        self.allocations = {}
+        self.started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def phase(self,
+              name: str,
+              pf_id: str = ''):
+        """
+        Context manager timing a phase. A phase left by an exception is not recorded.
+        :param name: Phase name.
+        :param pf_id: Portfolio id. Empty for phases for all portfolios.
+        :return: Context manager.
+        """
+        if not self.enabled:
+            return self.disabled
+        return self.timed(name=name,
+                          pf_id=pf_id)
+
+    @contextlib.contextmanager
+    def timed(self,
+              name: str,
+              pf_id: str):
+        """
+        Time a phase, see phase().
+        :param name: Phase name.
+        :param pf_id: Portfolio id.
+        """
+        started = self.start()
+        yield
+        self.stop(phase=name,
+                  started=started,
+                  pf_id=pf_id)
+
+    def start(self) -> tuple:
+        """
+        Start timing a phase.
+        :return: Start time, and traced memory if memory is traced. Pass to stop().
+        """
+        if self.trace_memory:
+            return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), 0
+
+    def stop(self,
+             phase: str,
+             started: tuple,
+             pf_id: str = '') -> None:
+        """
+        Stop timing a phase and record it.
+        :param phase: Phase name.
+        :param started: Return value of start().
+        :param pf_id: Portfolio id. Empty for phases for all portfolios.
+        :return: None.
+        """
+        duration = time.perf_counter() - started[0]
+        key = (phase, pf_id)
+        durations = self.durations.get(key)
+        if durations is None:
+            durations = self.durations[key] = []
+            self.allocations[key] = 0
+        durations.append(duration)
+        if self.trace_memory:
+            self.allocations[key] += tracemalloc.get_traced_memory()[0] - started[1]
+
+    def close(self) -> None:
+        """
+        Stop tracing memory, if started by this profiler.
+        :return: None.
+        """
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def report(self) -> pd.DataFrame:
+        """
+        Summary of recorded phases, slowest total time first. Share is the part of the time of the "run" phase (the
+        whole backtest). Phases are nested, e.g. mark_to_market is part of BAR, so shares do not add up to one.
+        :return: Pandas dataframe with one row per phase and portfolio.
+        """
+        total = sum(self.durations.get(('run', ''), [np.nan]))
+        rows = []
+        for (phase, pf_id), durations in self.durations.items():
+            ms = np.asarray(durations) * 1000.0
+            rows.append([phase,
+                         pf_id,
+                         len(ms),
+                         ms.sum() / 1000.0,
+                         ms.mean(),
+                         np.percentile(ms, 50),
+                         np.percentile(ms, 95),
+                         np.percentile(ms, 99),
+                         ms.max(),
+                         ms.sum() / 1000.0 / total,
+                         self.allocations[(phase, pf_id)] / 1024.0 if self.trace_memory else np.nan])
+        df = pd.DataFrame(rows, columns=self.columns)
+        return df.sort_values('total_s', ascending=False).reset_index(drop=True)
+
+    def print_report(self) -> None:
+        """
+        Print the report.
+        :return: None.
+        """
+        print('')
+        print('INFO: Profiling report.')
+        with pd.option_context('display.max_rows', None,
+                               'display.width', 200,
+                               'display.float_format', '{:.3f}'.format):
+            print(self.report().to_string(index=False))
@@ -0,0 +1,104 @@
+from market.bar_feed import BarFeed
+
+
+class SignalHandler:
+    """
+    Calculates signals of one portfolio's strategy in a backtest.
+    Resolved once per portfolio when a Backtests is created, from the strategy's class (see register), so handling
+    a CALCSIGNAL event costs the same whatever the number of strategy types.
+    Market data for the strategy's required columns is selected once for the whole backtest period, including the
+    lookback before the start date. Each signal gets a view of the last lookback bars of it, without copying.
+    The selection is a copy held for the whole backtest: one value of the market dtype per required column and bar,
+    e.g. 80 kB for 4 columns over 10 years of daily float64 bars. It is small compared with market data, since only
+    the strategy's columns are selected, but grows with the number of portfolios.
+    For streaming market data (a BarFeed, or a LiveMarket in paper trading), the bars are selected on each signal
+    instead.
+    Strategies needing other data handling can register a subclass.
+    """
+    # Handler classes for strategy classes.
+    registry = {}
+
+    def __init__(self,
+                 strategy,
+                 pf,
+                 market,
+                 start: int,
+                 end: int,
+                 commission: str) -> None:
+        """
+
+        :param strategy: Strategy object.
+        :param pf: Portfolio object of the strategy.
+        :param market: Markets, SharedMarket, BarFeed or LiveMarket object.
+        :param start: Row index of backtest start date.
+        :param end: Row index of backtest end date.
+        :param commission: Commission scheme name.
+        """
+        self.strategy = strategy
+        self.pf = pf
+        self.market = market
+        self.commission = commission
+        self.columns = strategy.required_columns()
+        self.lookback = max(int(strategy.lookback()), 1)
+        self.first = max(start - self.lookback + 1, 0)
+        self.data = None
+        if isinstance(market, BarFeed) and self.lookback > market.lookback:
+            print('CRITICAL: Strategy for portfolio ' + pf.pf_id + ' needs ' + str(self.lookback) +
+                  ' bars, but the BarFeed only keeps ' + str(market.lookback) + '. Increase lookback. Aborted.')
+            quit()
+        if not getattr(market, 'streaming', False):
+            self.data = market.select(columns=self.columns,
+                                      start_date=market.dates[self.first],
+                                      end_date=market.dates[end])
+
+    @classmethod
+    def register(cls,
+                 strategy_class: type):
+        """
+        Class decorator registering a handler class for a strategy class and its subclasses.
+        :param strategy_class: Strategy class.
+        :return: Decorator.
+        """
+        def decorator(handler_class: type) -> type:
+            cls.registry[strategy_class] = handler_class
+            return handler_class
+        return decorator
+
+    @classmethod
+    def resolve(cls,
+                strategy) -> type:
+        """
+        Get the handler class for a strategy, the one registered for the closest class in its class hierarchy.
+        :param strategy: Strategy object.
+        :return: Handler class. SignalHandler if none is registered.
+        """
+        for strategy_class in type(strategy).__mro__:
+            if strategy_class in cls.registry:
+                return cls.registry[strategy_class]
+        return cls
+
+    def bars(self,
+             idx: int):
+        """
+        Market data for the last lookback bars up to and including a bar.
+        :param idx: Row index of the bar.
+        :return: Pandas dataframe.
+        """
+        first = max(idx - self.lookback + 1, 0)
+        if self.data is None:
+            return self.market.select(columns=self.columns,
+                                      start_date=self.market.dates[first],
+                                      end_date=self.market.dates[idx])
+        return self.data.iloc[first - self.first:idx - self.first + 1]
+
+    def signal(self,
+               idx: int) -> list:
+        """
+        Calculate the strategy's signal for a bar.
+        :param idx: Row index of the bar.
+        :return: List of Transaction events.
+        """
+        return self.strategy.calc_signal(data=self.bars(idx),
+                                         idx=idx,
+                                         pf=self.pf,
+                                         commission=self.commission)
@@ -0,0 +1,297 @@
+import argparse
+import configparser as cp
+import contextlib
+import io
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+import strategy.strategy as strat
+from backtest.backtest import Backtests
+from holdings.portfolio import Portfolio
+from holdings.portfolio_master import MasterPortfolio
+from market.markets import Markets
+from market.shared_market import SharedMarket
+from metric.metric import Metrics
+
+
+def summarize(metric: Metrics,
+              pf: Portfolio) -> dict:
+    """
+
+    Summarize the metrics of a backtested portfolio, for a row of sweep results. Metrics must have been calculated.
+    :param metric: Metrics object.
+    :param pf: Portfolio.
+    :return: Dictionary of results.
+    """
+    return {'total_return': metric.tot_pf_rets(pf),
+            'benchmark_return': metric.tot_bm_rets(pf) if pf.benchmark != '' else None,
+            'cagr': metric.cagr(pf),
+            'sharpe_ratio': metric.sharpe_ratio(pf),
+            'sortino_ratio': metric.sortino_ratio(pf),
+            'max_drawdown': metric.max_drawdown(pf),
+            'max_drawdown_duration': metric.max_drawdown_duration(pf)}
+
+
+def run_combination(market,
+                    strategy: type,
+                    params: dict,
+                    start_date: str,
+                    end_date: str,
+                    init_cash: float,
+                    benchmark: str) -> dict:
+    """
+
+    Run one backtest of a parameter sweep and summarize its metrics. Runs in a worker process.
+    Log output of the backtest is discarded. Errors, including aborts, are returned instead of raised, so each run
+    fails independently.
+    :param market: Markets, or SharedMarket attached in the worker process.
+    :param strategy: Strategy class.
+    :param params: Keyword arguments for the strategy.
+    :param start_date: Start date as "YYYY-MM-DD" string.
+    :param end_date: End date as "YYYY-MM-DD" string.
+    :param init_cash: Initial cash of the portfolio.
+    :param benchmark: Benchmark column name of the portfolio.
+    :return: Dictionary of results.
+    """
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            mp = MasterPortfolio(inception_date=start_date)
+            pf = Portfolio(init_cash=init_cash if init_cash is not None else mp.init_cash,
+                           benchmark=benchmark if benchmark is not None else mp.benchmark,
+                           pf_id='sweep')
+            mp.add_portfolio(pf_id=pf.pf_id,
+                             pf=pf)
+            mp.add_strategy(pf_id=pf.pf_id,
+                            st=strategy(**params))
+            test = Backtests(market=market,
+                             mpf=mp,
+                             start_date=start_date,
+                             end_date=end_date)
+            test.run_vectorized()
+            result = {**summarize(metric=test.metric,
+                                  pf=pf),
+                      'total_market_value': pf.total_market_value,
+                      'total_commission': pf.total_commission,
+                      'transactions': len(pf.ledger),
+                      'error': None}
+    except (Exception, SystemExit) as e:
+        # Aborts print a CRITICAL message and quit.
+        messages = [line for line in log.getvalue().splitlines() if line.startswith('CRITICAL')]
+        result = {'error': messages[-1] if messages else repr(e)}
+    return result
+
+
+def run_parallel(market: Markets,
+                 tasks: list,
+                 workers: int) -> list:
+    """
+
+    Run backtests with run_combination in a process pool, with market data shared with the worker processes
+    through SharedMarket. With 1 worker, runs are made in this process.
+    :param market: Markets object.
+    :param tasks: List of dictionaries of keyword arguments for run_combination, except market.
+    :param workers: Number of worker processes.
+    :return: List of results, in the same order as tasks.
+    """
+    results = [None] * len(tasks)
+    if workers == 1:
+        for i, task in enumerate(tasks):
+            results[i] = run_combination(market=market,
+                                         **task)
+        return results
+
+    shared = SharedMarket.publish(market)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_combination,
+                                       market=shared,
+                                       **task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    # E.g. a worker process that died.
+                    results[futures[future]] = {'error': repr(e)}
+    finally:
+        shared.close()
+    return results
+
+
+class Sweep:
+    """
+    Parameter sweep for one strategy.
+    Runs a backtest with a single portfolio for every combination of strategy parameters in a grid, in a process
+    pool. Market data is loaded once and shared with the worker processes through shared memory (SharedMarket).
+    Each run fails independently. Results are collected in one table with a row per combination.
+    """
+    def __init__(self,
+                 strategy: type,
+                 grid,
+                 start_date: str,
+                 end_date: str,
+                 init_cash: float = None,
+                 benchmark: str = None,
+                 workers: int = None) -> None:
+        """
+
+        :param strategy: Strategy class, e.g. strategy.strategy.PeriodicRebalancing.
+        :param grid: Either a dictionary of {parameter name: list of values}, for all combinations of values, or a
+        list of dictionaries of {parameter name: value}, one per combination.
+        :param start_date: Start date as "YYYY-MM-DD" string.
+        :param end_date: End date as "YYYY-MM-DD" string.
+        :param init_cash: Initial cash of each portfolio. None uses init_cash of the master portfolio.
+        :param benchmark: Benchmark column name of each portfolio. None uses the master portfolio's benchmark.
+        :param workers: Number of worker processes. None uses the number set in backtest_config.ini, 0 the number of
+        CPUs. With 1 worker, runs are made in this process.
+        """
+        self.config = self.config()
+        self.strategy = strategy
+        self.combinations = self.combine(grid)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.init_cash = init_cash
+        self.benchmark = benchmark
+        if workers is None:
+            workers = int(self.config['sweep']['workers'])
+        self.workers = workers or os.cpu_count()
+        self.results = pd.DataFrame()
+
+    @staticmethod
+    def config() -> cp.ConfigParser:
+        """
+        Read backtest_config file and return a config object.
+        :return: A ConfigParser object.
+        """
+        conf = cp.ConfigParser()
+        conf.read('backtest/backtest_config.ini')
+
+        print('INFO: Read from backtest_config.ini file.')
+        print(' ')
+
+        return conf
+
+    @staticmethod
+    def combine(grid) -> list:
+        """
+        Get all parameter combinations of a grid.
+        :param grid: Dictionary of {parameter name: list of values}, or list of dictionaries.
+        :return: List of dictionaries of {parameter name: value}.
+        """
+        if isinstance(grid, dict):
+            names = list(grid.keys())
+            return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+        return [dict(params) for params in grid]
+
+    def required_columns(self) -> list:
+        """
+        Market data columns needed by all combinations and the benchmark. Combinations for which the strategy can
+        not be created, and columns that are not in market data files, are skipped here, so that only the
+        combinations using them fail when run.
+        :return: List of column names.
+        """
+        input_file_directory = Path(Markets.config()['input_files']['input_file_directory'])
+        assets = [f.stem for f in input_file_directory.iterdir() if f.is_file()]
+        columns = set()
+        mp = MasterPortfolio(inception_date=self.start_date)
+        benchmark = self.benchmark if self.benchmark is not None else mp.benchmark
+        for col in [mp.benchmark, benchmark]:
+            if col != '':
+                columns.add(col)
+        for params in self.combinations:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    columns.update(self.strategy(**params).required_columns())
+            except (Exception, SystemExit):
+                pass
+        return sorted(col for col in columns if col.rpartition('_')[0] in assets and
+                      col.rpartition('_')[2] in Markets.fields)
+
+    def run(self,
+            market: Markets = None) -> pd.DataFrame:
+        """
+        Run all combinations.
+        :param market: Markets object. None loads market data with only the columns needed by the sweep.
+        :return: Pandas dataframe with one row per combination: parameters, metrics and error message (None for
+        successful runs).
+        """
+        if market is None:
+            market = Markets(fill_missing_method=None,
+                             columns=self.required_columns())
+        print('INFO: Sweep of ' + str(len(self.combinations)) + ' combinations of strategy ' +
+              self.strategy.__name__ + ' with ' + str(self.workers) + ' worker(s).')
+        print('')
+
+        tasks = [{'strategy': self.strategy,
+                  'params': params,
+                  'start_date': self.start_date,
+                  'end_date': self.end_date,
+                  'init_cash': self.init_cash,
+                  'benchmark': self.benchmark} for params in self.combinations]
+        results = run_parallel(market=market,
+                               tasks=tasks,
+                               workers=self.workers)
+
+        failed = 0
+        for params, result in zip(self.combinations, results):
+            if result['error'] is not None:
+                failed += 1
+                print('WARNING: Sweep run ' + str(params) + ' failed: ' + result['error'])
+        self.results = pd.DataFrame([{**params, **result} for params, result in zip(self.combinations, results)])
+        print('SUCCESS: Sweep completed. ' + str(len(results) - failed) + ' of ' + str(len(results)) +
+              ' runs succeeded.')
+        return self.results
+
+
+def main() -> None:
+    """
+    Command line interface, run from the project base directory:
+    python -m backtest.sweep --strategy PeriodicRebalancing --grid grid.json --start 2020-12-30 --end 2023-03-06
+    The grid is a JSON object of {parameter name: list of values}, or a JSON list of {parameter name: value}, given
+    either as a string or as a file name.
+    :return: None.
+    """
+    parser = argparse.ArgumentParser(description='Run a strategy for all combinations of a parameter grid.')
+    parser.add_argument('--strategy', required=True, help='Strategy class name in strategy/strategy.py.')
+    parser.add_argument('--grid', required=True, help='Parameter grid as JSON string or JSON file.')
+    parser.add_argument('--start', required=True, help='Start date as YYYY-MM-DD.')
+    parser.add_argument('--end', required=True, help='End date as YYYY-MM-DD.')
+    parser.add_argument('--init-cash', type=float, default=None, help='Initial cash of each portfolio.')
+    parser.add_argument('--benchmark', default=None, help='Benchmark column name of each portfolio.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes, 0 for all CPUs.')
+    parser.add_argument('--output', default=None, help='Write results to this CSV file.')
+    args = parser.parse_args()
+
+    strategy = getattr(strat, args.strategy, None)
+    if not isinstance(strategy, type) or not issubclass(strategy, strat.Strategy):
+        print('CRITICAL: Strategy "' + args.strategy + '" not found in strategy/strategy.py. Aborted.')
+        quit()
+    if os.path.isfile(args.grid):
+        with open(args.grid) as f:
+            grid = json.load(f)
+    else:
+        grid = json.loads(args.grid)
+
+    sweep = Sweep(strategy=strategy,
+                  grid=grid,
+                  start_date=args.start,
+                  end_date=args.end,
+                  init_cash=args.init_cash,
+                  benchmark=args.benchmark,
+                  workers=args.workers)
+    results = sweep.run()
+    if args.output is not None:
+        results.to_csv(args.output,
+                       index=False)
+        print('INFO: Sweep results written to ' + args.output + '.')
+    else:
+        with pd.option_context('display.max_columns', None,
+                               'display.width', 200):
+            print(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+import configparser as cp
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+from backtest.backtest import Backtests
+from backtest.sweep import Sweep, run_parallel, summarize
+from holdings.portfolio import Portfolio
+from holdings.portfolio_master import MasterPortfolio
+from market.markets import Markets
+from metric.metric import Metrics
+
+
+class WalkForward:
+    """
+    Walk-forward optimisation of strategy parameters.
+    The backtest period is split into consecutive out-of-sample windows. Each one is preceded by an in-sample
+    window, of fixed length (rolling) or from the start date (expanding). For each in-sample window all combinations
+    of a parameter grid are scored and the combination with the highest objective metric is then used in the
+    out-of-sample window.
+    Each combination is backtested on each in-sample window by itself, starting with initial cash and no positions
+    at the window's start. These runs are independent and made together in one process pool (see Sweep), with market
+    data loaded once.
+    The out-of-sample windows are run as one continuous backtest of one portfolio, carrying positions, cash and
+    strategy state from one window into the next (see run_out_of_sample).
+    """
+    def __init__(self,
+                 strategy: type,
+                 grid,
+                 start_date: str,
+                 end_date: str,
+                 in_sample: int = None,
+                 out_of_sample: int = None,
+                 mode: str = None,
+                 objective: str = None,
+                 init_cash: float = None,
+                 benchmark: str = None,
+                 workers: int = None) -> None:
+        """
+
+        :param strategy: Strategy class, e.g. strategy.strategy.PeriodicRebalancing.
+        :param grid: Parameter grid, as for Sweep.
+        :param start_date: Start date of the first in-sample window as "YYYY-MM-DD" string.
+        :param end_date: End date of the last out-of-sample window as "YYYY-MM-DD" string.
+        :param in_sample: Number of bars in each in-sample window (the first one for expanding windows).
+        :param out_of_sample: Number of bars in each out-of-sample window (the last one may be shorter).
+        :param mode: Either "rolling" or "expanding".
+        :param objective: Result column of Sweep to maximise in-sample, e.g. "sharpe_ratio".
+        :param init_cash: Initial cash of each portfolio. None uses init_cash of the master portfolio.
+        :param benchmark: Benchmark column name of each portfolio. None uses the master portfolio's benchmark.
+        :param workers: Number of worker processes, as for Sweep.
+        All parameters set to None use the values in backtest_config.ini.
+        """
+        self.config = self.config()
+        self.sweep = Sweep(strategy=strategy,
+                           grid=grid,
+                           start_date=start_date,
+                           end_date=end_date,
+                           init_cash=init_cash,
+                           benchmark=benchmark,
+                           workers=workers)
+        self.in_sample = in_sample if in_sample is not None else int(self.config['walk_forward']['in_sample'])
+        self.out_of_sample = out_of_sample if out_of_sample is not None else \
+            int(self.config['walk_forward']['out_of_sample'])
+        self.mode = mode if mode is not None else self.config['walk_forward']['mode']
+        self.objective = objective if objective is not None else self.config['walk_forward']['objective']
+        if self.mode not in ['rolling', 'expanding']:
+            print('CRITICAL: Walk-forward mode "' + self.mode + '" not implemented. Should be either "rolling" or '
+                  '"expanding". Aborted.')
+            quit()
+        if self.in_sample < 2 or self.out_of_sample < 1:
+            print('CRITICAL: Walk-forward windows must have at least 2 in-sample and 1 out-of-sample bars. Aborted.')
+            quit()
+        # Initial cash and benchmark of the portfolios.
+        mp_config = MasterPortfolio.config()[0]
+        self.init_cash = init_cash if init_cash is not None else float(mp_config['init_cash']['init_cash'])
+        self.benchmark = benchmark if benchmark is not None else mp_config['benchmark']['benchmark_name']
+        self.windows = pd.DataFrame()
+        self.in_sample_results = pd.DataFrame()
+        self.portfolio = None
+
+    @staticmethod
+    def config() -> cp.ConfigParser:
+        """
+        Read backtest_config file and return a config object.
+        :return: A ConfigParser object.
+        """
+        conf = cp.ConfigParser()
+        conf.read('backtest/backtest_config.ini')
+
+        print('INFO: Read from backtest_config.ini file.')
+        print(' ')
+
+        return conf
+
+    def split(self,
+              market: Markets) -> list:
+        """
+        Split the backtest period into in-sample and out-of-sample windows.
+        :param market: Markets object.
+        :return: List of (in-sample start, in-sample end, out-of-sample start, out-of-sample end) row indexes, all
+        included.
+        """
+        start = market.index_of(self.sweep.start_date)
+        end = market.index_of(self.sweep.end_date)
+        windows = []
+        oos_start = start + self.in_sample
+        while oos_start <= end:
+            is_start = start if self.mode == 'expanding' else oos_start - self.in_sample
+            windows.append((is_start, oos_start - 1, oos_start, min(oos_start + self.out_of_sample - 1, end)))
+            oos_start += self.out_of_sample
+        if not windows:
+            print('CRITICAL: Backtest period is shorter than the in-sample window. Aborted.')
+            quit()
+        return windows
+
+    def run(self,
+            market: Markets = None) -> pd.DataFrame:
+        """
+        Run walk-forward optimisation.
+        Results per window are in self.windows, all in-sample results in self.in_sample_results and the continuous
+        out-of-sample portfolio, with metrics, in self.portfolio.
+        :param market: Markets object. None loads market data with only the columns needed.
+        :return: Pandas dataframe with one row per window: dates, chosen parameters, in-sample objective value and
+        out-of-sample results.
+        """
+        if market is None:
+            market = Markets(fill_missing_method=None,
+                             columns=self.sweep.required_columns())
+        windows = self.split(market)
+        combinations = self.sweep.combinations
+        print('INFO: Walk-forward optimisation of strategy ' + self.sweep.strategy.__name__ + ' over ' +
+              str(len(windows)) + ' ' + self.mode + ' windows, ' + str(len(combinations)) + ' combinations each.')
+        print('')
+
+        # One in-sample run per window and combination.
+        tasks = [{'strategy': self.sweep.strategy,
+                  'params': params,
+                  'start_date': market.dates[is_start],
+                  'end_date': market.dates[is_end],
+                  'init_cash': self.init_cash,
+                  'benchmark': self.benchmark} for is_start, is_end, _, _ in windows for params in combinations]
+        results = run_parallel(market=market,
+                               tasks=tasks,
+                               workers=self.sweep.workers)
+        self.in_sample_results = pd.DataFrame([{'window': i // len(combinations), **combinations[i % len(combinations)],
+                                                **result} for i, result in enumerate(results)])
+
+        # Best combination per window.
+        best = []
+        for w in range(len(windows)):
+            scores = [results[w * len(combinations) + c].get(self.objective) for c in range(len(combinations))]
+            scores = [np.nan if score is None else float(score) for score in scores]
+            if np.all(np.isnan(scores)):
+                print('WARNING: No successful in-sample run with a valid ' + self.objective + ' in window ' +
+                      str(w) + '. Parameters of the previous window kept.')
+                best.append(None)
+            else:
+                best.append(int(np.nanargmax(scores)))
+
+        oos_results = self.run_out_of_sample(market=market,
+                                             windows=windows,
+                                             best=best)
+
+        rows = []
+        for w, (is_start, is_end, oos_start, oos_end) in enumerate(windows):
+            row = {'window': w,
+                   'in_sample_start': market.dates[is_start],
+                   'in_sample_end': market.dates[is_end],
+                   'out_of_sample_start': market.dates[oos_start],
+                   'out_of_sample_end': market.dates[oos_end],
+                   'params': None,
+                   'in_sample_' + self.objective: None}
+            if best[w] is not None:
+                row['params'] = combinations[best[w]]
+                row['in_sample_' + self.objective] = results[w * len(combinations) + best[w]][self.objective]
+            if w in oos_results:
+                row.update(oos_results[w])
+                if oos_results[w]['error'] is not None:
+                    print('WARNING: Out-of-sample run of window ' + str(w) + ' failed: ' + oos_results[w]['error'])
+            rows.append(row)
+        self.windows = pd.DataFrame(rows)
+
+        if self.portfolio is None:
+            print('WARNING: No successful out-of-sample runs.')
+
+        print('SUCCESS: Walk-forward optimisation completed.')
+        return self.windows
+
+    def run_out_of_sample(self,
+                          market: Markets,
+                          windows: list,
+                          best: list) -> dict:
+        """
+        Run all out-of-sample windows as one continuous backtest of one portfolio, switching the strategy to the
+        best parameters of each window at its start date. Positions and cash are carried into the next window, so
+        there is no cash drag at window boundaries: the portfolio stays invested, and the new parameters take effect
+        at the strategy's first scheduled signal in the window. Windows without a best combination keep the
+        parameters of the previous window. Positions in assets the new parameters do not trade are kept as they are.
+        The strategy is only replaced when the parameters change, and then takes over the state of the replaced
+        strategy (see Strategy.carry_state), e.g. a completed BuyAndHold purchase is not made again.
+        Each window continues the portfolio of the previous one, so the windows are run one after the other, in this
+        process. The resulting portfolio, with metrics, is in self.portfolio.
+        Log output of the backtests is discarded. A failed window ends the run, later windows are not run.
+        :param market: Markets object.
+        :param windows: List of windows, from split().
+        :param best: List of the position of the best combination for each window, None for none.
+        :return: Dictionary of {window: results}, results as for Sweep for the window's part of the history.
+        """
+        results = {}
+        mp = None
+        pf = None
+        st = None
+        st_params = None
+        params = None
+        for w, (_, _, oos_start, oos_end) in enumerate(windows):
+            if best[w] is not None:
+                params = self.sweep.combinations[best[w]]
+            if params is None:
+                continue
+            log = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(log):
+                    if mp is None:
+                        mp = MasterPortfolio(inception_date=market.dates[oos_start])
+                        pf = Portfolio(init_cash=self.init_cash,
+                                       benchmark=self.benchmark,
+                                       pf_id='walk_forward')
+                        mp.add_portfolio(pf_id=pf.pf_id,
+                                         pf=pf)
+                    if params != st_params:
+                        new_st = self.sweep.strategy(**params)
+                        if st is not None:
+                            new_st.carry_state(st)
+                        st = new_st
+                        st_params = params
+                        mp.add_strategy(pf_id=pf.pf_id,
+                                        st=st)
+                    test = Backtests(market=market,
+                                     mpf=mp,
+                                     start_date=market.dates[oos_start],
+                                     end_date=market.dates[oos_end])
+                    test.run_vectorized()
+                    results[w] = self.window_results(metric=test.metric,
+                                                     result={'history': pf.history,
+                                                             'transaction_dates': pf.ledger.dates[:len(pf.ledger)]},
+                                                     start_date=market.dates[oos_start],
+                                                     end_date=market.dates[oos_end])
+                self.portfolio = pf
+            except (Exception, SystemExit) as e:
+                # Aborts print a CRITICAL message and quit.
+                messages = [line for line in log.getvalue().splitlines() if line.startswith('CRITICAL')]
+                results[w] = {'error': messages[-1] if messages else repr(e)}
+                break
+        return results
+
+    def window_results(self,
+                       metric: Metrics,
+                       result: dict,
+                       start_date: np.datetime64,
+                       end_date: np.datetime64) -> dict:
+        """
+        Results of one window from the history of a backtest over a longer period, as if the portfolio was valued
+        at the start of the window: returns are measured from the total market value on the day before the window,
+        or from the initial cash if the backtest starts with the window. Positions held from before the window are
+        part of its results.
+        :param metric: Metrics object.
+        :param result: Results of the backtest, with "history" and "transaction_dates".
+        :param start_date: First date of the window.
+        :param end_date: Last date of the window.
+        :return: Dictionary of results, as for Sweep.
+        """
+        history = result['history']
+        first = int(history.index.searchsorted(start_date))
+        last = int(history.index.searchsorted(end_date, side='right'))
+        if first > 0:
+            init_cash = history['total_market_value'].iloc[first - 1]
+            commission = history['total_commission'].iloc[first - 1]
+        else:
+            init_cash = self.init_cash
+            commission = 0.0
+        pf = Portfolio(init_cash=init_cash,
+                       benchmark=self.benchmark,
+                       pf_id='window')
+        pf.history = history.iloc[first:last]
+        metric.all_metrics(pf)
+        dates = result['transaction_dates']
+        return {**summarize(metric=metric,
+                            pf=pf),
+                'total_market_value': pf.history['total_market_value'].iloc[-1],
+                'total_commission': pf.history['total_commission'].iloc[-1] - commission,
+                'transactions': int(((dates >= start_date) & (dates <= end_date)).sum()),
+                'error': None}
@@ -0,0 +1,332 @@
+import argparse
+import configparser as cp
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from market.markets import Markets
+from holdings.portfolio import Portfolio
+from holdings.portfolio_master import MasterPortfolio
+from backtest.backtest import Backtests
+from backtest.profiler import Profiler
+from benchmark.synthetic import SyntheticMarket
+import strategy.strategy as strat
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_memory() -> float:
+    """
+
+    Peak resident memory of this process.
+    :return: Peak memory in MB. None if not available on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kB on Linux.
+    return peak / 1024.0 ** 2 if sys.platform == 'darwin' else peak / 1024.0
+
+
+def measure(workspace: str,
+            point: dict,
+            period: str,
+            assets_per_portfolio: int) -> dict:
+    """
+
+    Measure one point of a scaling curve. Runs in a fresh process, so peak memory is that of this point only.
+    Loads market data from the workspace's files (cold, without cache) and again from the cache, then runs an
+    event-driven backtest over all dates with profiling, for the run and metrics times.
+    Log output is discarded. Errors, including aborts, are returned instead of raised.
+    :param workspace: Workspace directory with config files and market data files (see BenchmarkSuite.workspace).
+    :param point: Dictionary with curve name, assets, portfolios and years.
+    :param period: Re-balancing period of the portfolios' strategies.
+    :param assets_per_portfolio: Number of assets in each portfolio.
+    :return: Dictionary of the point and its measurements.
+    """
+    result = dict(point)
+    log = io.StringIO()
+    try:
+        # All config files are read relative to the working directory.
+        os.chdir(workspace)
+        with contextlib.redirect_stdout(log):
+            shutil.rmtree('input_files/cache', ignore_errors=True)
+            shutil.rmtree('input_files/cube', ignore_errors=True)
+            started = time.perf_counter()
+            market = Markets(fill_missing_method=None)
+            result['load_s'] = time.perf_counter() - started
+            del market
+            started = time.perf_counter()
+            market = Markets(fill_missing_method=None)
+            result['cached_load_s'] = time.perf_counter() - started
+
+            start_date = Markets.date_str(market.dates[0])
+            end_date = Markets.date_str(market.dates[-1])
+            assets = [col for col in market.columns if col.endswith('_Close') and not col.startswith('^')]
+            mp = MasterPortfolio(inception_date=start_date)
+            n = min(assets_per_portfolio, len(assets))
+            for i in range(point['portfolios']):
+                pf = Portfolio(init_cash=mp.init_cash / point['portfolios'],
+                               benchmark=SyntheticMarket.benchmark + '_Close',
+                               pf_id='pf' + str(i))
+                mp.add_portfolio(pf_id=pf.pf_id,
+                                 pf=pf)
+                weights = {assets[(i * n + j) % len(assets)]: 0.95 / n for j in range(n)}
+                mp.add_strategy(pf_id=pf.pf_id,
+                                st=strat.PeriodicRebalancing(period=period,
+                                                             id_weight=weights))
+            test = Backtests(market=market,
+                             mpf=mp,
+                             start_date=start_date,
+                             end_date=end_date)
+            test.profiler = Profiler()
+            test.run()
+        report = test.profiler.report()
+        run_s = float(report.loc[report['phase'] == 'run', 'total_s'].sum())
+        metrics_s = float(report.loc[report['phase'] == 'metrics', 'total_s'].sum())
+        bars = test.end_index - test.start_index + 1
+        result.update({'bars': bars,
+                       'run_s': run_s,
+                       'metrics_s': metrics_s,
+                       'loop_s': run_s - metrics_s,
+                       'bars_per_s': bars / (run_s - metrics_s),
+                       'portfolio_bars_per_s': bars * point['portfolios'] / (run_s - metrics_s),
+                       'transactions': int(sum(len(pf.ledger) for pf in mp.portfolios.values())),
+                       'peak_memory_mb': peak_memory(),
+                       'error': None})
+    except (Exception, SystemExit) as e:
+        lines = [line for line in log.getvalue().splitlines() if 'CRITICAL' in line]
+        result['error'] = lines[-1] if lines else repr(e)
+    return result
+
+
+class BenchmarkSuite:
+    """
+    Offline benchmark suite of end-to-end backtest throughput, market data load time, metrics time and peak memory,
+    along scaling curves of the number of assets, portfolios and years. Each curve varies one dimension with the
+    others at their defaults (see benchmark_config.ini).
+    Market data is generated by SyntheticMarket, so no network access is needed. Each point runs in a fresh
+    process, in a workspace directory with its own market data files, cache and copies of the config files.
+    Results are written as JSON, for comparing versions (see compare).
+    """
+    curve_names = ['assets', 'portfolios', 'years']
+
+    def __init__(self,
+                 curves: list = None,
+                 quick: bool = False,
+                 label: str = '') -> None:
+        """
+
+        :param curves: Names of curves to run, from "assets", "portfolios" and "years". None runs all curves.
+        :param quick: If True, run the shorter curves of the [quick] section.
+        :param label: Label of the results, e.g. a version.
+        """
+        self.config = self.config()
+        self.curves = curves if curves else self.curve_names
+        for curve in self.curves:
+            if curve not in self.curve_names:
+                print('CRITICAL: Benchmark curve "' + str(curve) + '" not implemented. Should be one of ' +
+                      ', '.join(self.curve_names) + '. Aborted.')
+                quit()
+        self.quick = quick
+        self.label = label
+        self.defaults = {name: int(self.config['defaults'][name]) for name in self.curve_names}
+        self.period = self.config['strategy']['period']
+        self.assets_per_portfolio = int(self.config['strategy']['assets_per_portfolio'])
+        self.results_directory = Path(self.config['output']['results_directory'])
+        self.workspace_directory = self.results_directory / 'workspace'
+
+    @staticmethod
+    def config() -> cp.ConfigParser:
+        """
+        Read benchmark_config file and return a config object.
+        :return: A ConfigParser object.
+        """
+        conf = cp.ConfigParser()
+        conf.read('benchmark/benchmark_config.ini')
+
+        print('')
+        print('INFO: Read from benchmark_config.ini file.')
+
+        return conf
+
+    def points(self) -> list:
+        """
+        Points of all curves to run.
+        :return: List of dictionaries with curve name, assets, portfolios and years.
+        """
+        section = 'quick' if self.quick else 'curves'
+        points = []
+        for curve in self.curves:
+            for value in self.config[section][curve].split(','):
+                point = {'curve': curve}
+                point.update(self.defaults)
+                point[curve] = int(value)
+                points.append(point)
+        return points
+
+    def workspace(self,
+                  assets: int,
+                  years: int) -> Path:
+        """
+        Prepare the workspace directory for a market size: synthetic market data files, and copies of the project's
+        config files with market data, cache and cube directories inside the workspace.
+        :param assets: Number of assets.
+        :param years: Number of years.
+        :return: Absolute path of workspace directory.
+        """
+        workspace = (self.workspace_directory / ('a' + str(assets) + '_y' + str(years))).resolve()
+        for config_file in Path('.').glob('*/*.ini'):
+            target = workspace / config_file
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(config_file, target)
+        market_config = cp.ConfigParser()
+        market_config.read(workspace / 'market' / 'market_config.ini')
+        market_config['input_files']['input_file_directory'] = './input_files/assets'
+        market_config['cache']['cache_directory'] = './input_files/cache'
+        market_config['storage']['cube_directory'] = './input_files/cube'
+        with open(workspace / 'market' / 'market_config.ini', 'w') as f:
+            market_config.write(f)
+        synthetic = SyntheticMarket(assets=assets,
+                                    years=years,
+                                    start_date=self.config['synthetic']['start_date'],
+                                    seed=int(self.config['synthetic']['seed']))
+        if synthetic.write(workspace / 'input_files' / 'assets'):
+            print('INFO: Generated synthetic market data of ' + str(assets) + ' assets and ' + str(years) +
+                  ' years.')
+        return workspace
+
+    def run(self) -> dict:
+        """
+        Run all points of the selected curves.
+        :return: Dictionary of environment information and a list of results, one per point.
+        """
+        points = self.points()
+        print('INFO: Benchmark of ' + str(len(points)) + ' points.')
+        print('')
+        context = multiprocessing.get_context('spawn')
+        results = []
+        for point in points:
+            workspace = self.workspace(assets=point['assets'],
+                                       years=point['years'])
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=context) as executor:
+                result = executor.submit(measure,
+                                         str(workspace),
+                                         point,
+                                         self.period,
+                                         self.assets_per_portfolio).result()
+            results.append(result)
+            if result['error'] is not None:
+                print('WARNING: Benchmark point ' + self.describe(result) + ' failed: ' + result['error'])
+            else:
+                print('INFO: ' + self.describe(result) + ': ' + str(round(result['bars_per_s'], 1)) +
+                      ' bars/s, load ' + str(round(result['load_s'], 3)) + ' s, metrics ' +
+                      str(round(result['metrics_s'], 3)) + ' s, peak memory ' +
+                      str(round(result['peak_memory_mb'] or 0.0, 1)) + ' MB.')
+        print('')
+        print('SUCCESS: Benchmark completed.')
+        return {'label': self.label,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'quick': self.quick,
+                'defaults': self.defaults,
+                'period': self.period,
+                'assets_per_portfolio': self.assets_per_portfolio,
+                'results': results}
+
+    @staticmethod
+    def describe(point: dict) -> str:
+        """
+        Short description of a point, for output.
+        :param point: Point dictionary.
+        :return: Description string.
+        """
+        return (point['curve'] + ' curve (' + str(point['assets']) + ' assets, ' + str(point['portfolios']) +
+                ' portfolios, ' + str(point['years']) + ' years)')
+
+    def write(self,
+              results: dict,
+              path: str = None) -> Path:
+        """
+        Write results to a JSON file.
+        :param results: Return value of run().
+        :param path: File name. None for "benchmark_<date and time>.json" in the results directory.
+        :return: Path of results file.
+        """
+        if path is None:
+            path = self.results_directory / ('benchmark_' + datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('INFO: Benchmark results written to ' + str(path) + '.')
+        return path
+
+    @staticmethod
+    def compare(baseline: str,
+                current: str) -> pd.DataFrame:
+        """
+        Compare two results files point by point.
+        :param baseline: Baseline results file.
+        :param current: Current results file.
+        :return: Pandas dataframe with one row per point in both files, with ratios current / baseline of bars per
+        second (higher is faster) and of load, metrics and peak memory (lower is better).
+        """
+        frames = []
+        for path in [baseline, current]:
+            with open(path) as f:
+                frames.append(pd.DataFrame(json.load(f)['results']))
+        keys = ['curve', 'assets', 'portfolios', 'years']
+        df = frames[0].merge(frames[1],
+                             on=keys,
+                             suffixes=('_baseline', '_current'))
+        for col in ['bars_per_s', 'load_s', 'cached_load_s', 'metrics_s', 'peak_memory_mb']:
+            df[col] = df[col + '_current'] / df[col + '_baseline']
+        return df[keys + ['bars_per_s', 'load_s', 'cached_load_s', 'metrics_s', 'peak_memory_mb']]
+
+
+def main() -> None:
+    """
+    Command line interface, run from the project base directory:
+    python -m benchmark.suite --curves assets years --quick --label v1 --compare benchmark_results/baseline.json
+    :return: None.
+    """
+    parser = argparse.ArgumentParser(description='Run the offline scaling benchmark suite.')
+    parser.add_argument('--curves', nargs='*', default=None, help='Curves to run: assets, portfolios, years.')
+    parser.add_argument('--quick', action='store_true', help='Run the shorter curves.')
+    parser.add_argument('--label', default='', help='Label of the results, e.g. a version.')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file.')
+    parser.add_argument('--compare', default=None, help='Compare results to this baseline JSON file.')
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(curves=args.curves,
+                           quick=args.quick,
+                           label=args.label)
+    path = suite.write(results=suite.run(),
+                       path=args.output)
+    if args.compare is not None:
+        with pd.option_context('display.max_columns', None,
+                               'display.width', 200):
+            print(BenchmarkSuite.compare(baseline=args.compare,
+                                         current=str(path)))
+
+
+if __name__ == '__main__':
+    main()
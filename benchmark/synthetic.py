@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+class SyntheticMarket:
+    """
+    Generator of synthetic market data files in Yahoo Finance format, for benchmarks and tests without network
+    access. Prices follow a geometric random walk per asset, with consistent open, high, low and close prices.
+    Dates are business days, so every date is a trading date.
+    The benchmark index is written as "^OMX", the default benchmark in portfolio_config.ini, and the assets as
+    "S0000", "S0001", ...
+    """
+    benchmark = '^OMX'
+
+    def __init__(self,
+                 assets: int,
+                 years: int,
+                 start_date: str = '1990-01-01',
+                 seed: int = 0) -> None:
+        """
+
+        :param assets: Number of assets, not counting the benchmark index.
+        :param years: Number of years of daily bars (252 bars per year).
+        :param start_date: First date.
+        :param seed: Random seed. The same parameters and seed give the same files.
+        """
+        self.assets = max(int(assets), 1)
+        self.years = max(int(years), 1)
+        self.start_date = start_date
+        self.seed = int(seed)
+        self.dates = pd.bdate_range(start=start_date,
+                                    periods=self.years * 252)
+        self.names = [self.benchmark] + ['S' + str(i).zfill(4) for i in range(self.assets)]
+
+    def parameters(self) -> dict:
+        """
+        Parameters of the generated files.
+        :return: Dictionary.
+        """
+        return {'assets': self.assets,
+                'years': self.years,
+                'start_date': self.start_date,
+                'seed': self.seed}
+
+    def asset(self,
+              rng: np.random.Generator) -> pd.DataFrame:
+        """
+        Generate bars for one asset.
+        :param rng: Numpy random generator.
+        :return: Pandas dataframe in Yahoo Finance format.
+        """
+        n = len(self.dates)
+        drift = rng.normal(0.0002, 0.0002)
+        volatility = rng.uniform(0.005, 0.025)
+        close = rng.uniform(20.0, 500.0) * np.exp(np.cumsum(rng.normal(drift, volatility, n)))
+        open_ = np.concatenate([[close[0]], close[:-1]]) * np.exp(rng.normal(0.0, volatility / 4, n))
+        high = np.maximum(open_, close) * (1.0 + np.abs(rng.normal(0.0, volatility / 2, n)))
+        low = np.minimum(open_, close) * (1.0 - np.abs(rng.normal(0.0, volatility / 2, n)))
+        return pd.DataFrame({'Date': self.dates.strftime('%Y-%m-%d'),
+                             'Open': open_,
+                             'High': high,
+                             'Low': low,
+                             'Close': close,
+                             'Adj Close': close,
+                             'Volume': rng.integers(1000, 1000000, n).astype(float)})
+
+    def write(self,
+              directory: str) -> bool:
+        """
+        Write one CSV file per asset to a directory. Files are only written if the directory does not already hold
+        files generated with the same parameters. The parameters are kept in "<directory>.json" next to the
+        directory, since Markets reads all files in it.
+        :param directory: Directory for market data files.
+        :return: True if files were written.
+        """
+        directory = Path(directory)
+        meta_file = directory.parent / (directory.name + '.json')
+        if meta_file.exists():
+            with open(meta_file) as f:
+                if json.load(f) == self.parameters():
+                    return False
+            meta_file.unlink()
+        directory.mkdir(parents=True, exist_ok=True)
+        for f in directory.glob('*.csv'):
+            f.unlink()
+        rng = np.random.default_rng(self.seed)
+        for name in self.names:
+            self.asset(rng).to_csv(directory / (name + '.csv'),
+                                   index=False)
+        with open(meta_file, 'w') as f:
+            json.dump(self.parameters(), f)
+        return True
@@ -1,4 +1,6 @@
-import queue
+import heapq
+import itertools
+import threading
 
 from event_handler import event as ev
 
@@ -6,14 +8,21 @@ from event_handler import event as ev
 class EventHandler:
     """
     Class for handling events.
+    Events are kept in a heap ordered by (date, priority, sequence number): the oldest date first, then by event
+    type priority (see Event.priority), then first in, first out.
+    The backtest is single-threaded, so by default nothing is locked. A thread-safe handler locks every operation.
     """
     def __init__(self,
-                 verbose=False):
+                 verbose=False,
+                 thread_safe=False):
         """
         Create empty queue.
         :param verbose: Bool.
+        :param thread_safe: If True, lock queue operations, for use from several threads.
         """
-        self.event_queue = queue.Queue()
+        self.event_queue = []
+        self.sequence = itertools.count()
+        self.lock = threading.Lock() if thread_safe else None
         self.verbose = verbose
 
     def put_event(self,
@@ -23,25 +32,72 @@ class EventHandler:
         :param event: Event object.
         :return: None.
         """
-        self.event_queue.put(event)
+        if self.lock is None:
+            heapq.heappush(self.event_queue, (event.date, event.priority, next(self.sequence), event))
+        else:
+            with self.lock:
+                heapq.heappush(self.event_queue, (event.date, event.priority, next(self.sequence), event))
+
+    def put_events(self,
+                   events: list) -> None:
+        """
+        Put several events in the queue, in list order for events with the same date and priority.
+        :param events: List of Event objects.
+        :return: None.
+        """
+        if self.lock is None:
+            for event in events:
+                heapq.heappush(self.event_queue, (event.date, event.priority, next(self.sequence), event))
+        else:
+            with self.lock:
+                for event in events:
+                    heapq.heappush(self.event_queue, (event.date, event.priority, next(self.sequence), event))
 
     def get_event(self) -> ev:
         """
         Get and remove next event from the queue.
-        :return: None.
+        :return: Event object.
+        """
+        if self.lock is None:
+            return heapq.heappop(self.event_queue)[3]
+        with self.lock:
+            return heapq.heappop(self.event_queue)[3]
+
+    def get_events(self,
+                   max_events: int = None) -> list:
+        """
+        Get and remove the next events from the queue.
+        :param max_events: Maximum number of events. None gets all events.
+        :return: List of Event objects, in queue order.
+        """
+        if self.lock is None:
+            return self.pop_events(max_events)
+        with self.lock:
+            return self.pop_events(max_events)
+
+    def pop_events(self,
+                   max_events: int = None) -> list:
+        """
+        Remove the next events from the heap, without locking.
+        :param max_events: Maximum number of events. None gets all events.
+        :return: List of Event objects, in queue order.
         """
-        return self.event_queue.get()
+        if max_events is None or max_events >= len(self.event_queue):
+            events = [item[3] for item in sorted(self.event_queue)]
+            self.event_queue = []
+            return events
+        return [heapq.heappop(self.event_queue)[3] for _ in range(max_events)]
 
     def is_empty(self) -> bool:
         """
         Check if queue is empty.
         :return: Bool.
         """
-        return self.event_queue.empty()
+        return not self.event_queue
 
     def done(self) -> None:
         """
-        Previous enqueued task is completed.
+        Previous enqueued task is completed. Kept for compatibility, nothing to do without worker threads.
         :return: None
         """
-        self.event_queue.task_done()
+        pass
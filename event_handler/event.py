@@ -1,20 +1,48 @@
+from enum import IntEnum
+import numpy as np
 import holdings.transaction as transaction
 
 
+class EventType(IntEnum):
+    """
+    Event type tags.
+    """
+    BAR = 0
+    CALCSIGNAL = 1
+    TRANSACTION = 2
+
+
 class Event:
     """
     Base class for events.
+    Events with the same date are handled in priority order (lowest first): new market data, then signals, then
+    transactions.
+    Events are slotted, with the type and priority as class attributes, since one or more are created every bar.
     """
+    __slots__ = ()
+    type = None
+    priority = 0
+
+    @property
+    def event_type(self) -> EventType:
+        """
+        Event type.
+        :return: Event type.
+        """
+        return self.type
 
 
 class NewBar(Event):
     """
     Market event indicates that a new day has passed and there is new market data.
     """
+    __slots__ = ('date', 'pf_id')
+    type = EventType.BAR
+    priority = 0
+
     def __init__(self,
-                 date: str,
+                 date: np.datetime64,
                  pf_id: str):
-        self.type = 'BAR'
         self.date = date
         self.pf_id = pf_id
 
@@ -24,26 +52,21 @@ class NewBar(Event):
         Details for verbose logging.
         :return: String for logging.
         """
-        return f'{self.date} - Portfolio: {self.pf_id} - Event: BAR.'
-
-    @property
-    def event_type(self) -> str:
-        """
-        Event type.
-        :return: Event type.
-        """
-        return self.type
+        return f'{np.datetime64(self.date, "D")} - Portfolio: {self.pf_id} - Event: BAR.'
 
 
 class Transaction(Event):
     """
     Transaction (buy or sell) event for a position in a portfolio.
     """
+    __slots__ = ('date', 'trans', 'pf_id')
+    type = EventType.TRANSACTION
+    priority = 2
+
     def __init__(self,
-                 date: str,
+                 date: np.datetime64,
                  trans: transaction.Transaction,
                  pf_id: str):
-        self.type = 'TRANSACTION'
         self.date = date
         self.trans = trans
         self.pf_id = pf_id
@@ -54,28 +77,23 @@ class Transaction(Event):
         Details for verbose logging.
         :return: String for logging.
         """
-        return f'{self.date} - Portfolio: {self.pf_id} - Event: TRANSACTION. Details: {self.trans.direction} ' \
-               f'{self.trans.quantity} {self.trans.name} @ {self.trans.price}'
-
-    @property
-    def event_type(self) -> str:
-        """
-        Event type.
-        :return: Event type.
-        """
-        return self.type
+        return f'{np.datetime64(self.date, "D")} - Portfolio: {self.pf_id} - Event: TRANSACTION. ' \
+               f'Details: {self.trans.direction} {self.trans.quantity} {self.trans.name} @ {self.trans.price}'
 
 
 class CalcSignal(Event):
     """
     Event indicating that we need to calculate the Strategy's signal requirements.
     """
+    __slots__ = ('date', 'pf_id')
+    type = EventType.CALCSIGNAL
+    priority = 1
+
     def __init__(self,
-                 date: str,
+                 date: np.datetime64,
                  pf_id: str):
-        self.type = 'CALCSIGNAL'
         self.date = date
-        self.port_id = pf_id
+        self.pf_id = pf_id
 
     @property
     def details(self) -> str:
@@ -83,20 +101,4 @@ class CalcSignal(Event):
         Details for verbose logging.
         :return: String for logging.
         """
-        return f'{self.date} - Portfolio: {self.pf_id}. Event: CALCSIGNAL.'
-
-    @property
-    def event_type(self) -> str:
-        """
-        Event type.
-        :return: Event type.
-        """
-        return self.type
-
-    @property
-    def pf_id(self) -> str:
-        """
-        Event type.
-        :return: Portfolio id.
-        """
-        return self.port_id
+        return f'{np.datetime64(self.date, "D")} - Portfolio: {self.pf_id}. Event: CALCSIGNAL.'
@@ -1,36 +1,49 @@
 class CommissionScheme:
+    """
+    Commission scheme, by name. Unknown names give no commission.
+    A scheme has no state per transaction, so transactions use one shared instance per scheme name (see shared).
+    """
+    # Avanza.se: {scheme name: (minimum commission, commission rate, value below which the minimum applies)}.
+    rate_schemes = {'avanza_mini': (1.0, 0.0025, 400.0),
+                    'avanza_small': (39.0, 0.0015, 26000.0),
+                    'avanza_medium': (69.0, 0.00069, 100000.0)}
+    # {scheme name: fixed commission per transaction}.
+    fixed_schemes = {'avanza_fast': 99.0}
+    # Shared instances by scheme name.
+    instances = {}
+
     def __init__(self,
                  scheme: str):
         self.name = scheme
-        self.commission = 0
+        self.min_commission, self.rate, self.min_value = self.rate_schemes.get(scheme, (0.0, None, 0.0))
+        self.fixed_commission = self.fixed_schemes.get(scheme, 0.0)
+
+    @classmethod
+    def shared(cls,
+               scheme: str) -> 'CommissionScheme':
+        """
+        Get the shared instance of a commission scheme.
+        :param scheme: Scheme name.
+        :return: CommissionScheme object.
+        """
+        instance = cls.instances.get(scheme)
+        if instance is None:
+            instance = cls(scheme)
+            cls.instances[scheme] = instance
+        return instance
+
+    def __reduce__(self):
+        """
+        Pickle by scheme name, so unpickled transactions use the shared instance again.
+        :return: Tuple for pickle.
+        """
+        return CommissionScheme.shared, (self.name,)
 
     def calculate_commission(self,
                              quantity: float,
                              price: float) -> float:
-        # Avanza.se
-        if self.name == 'avanza_mini':
-            min_com = 1.0
-            trans_com = quantity * price * 0.0025
-            if quantity * price < 400.0:
-                return min_com
-            else:
-                return trans_com
-        elif self.name == 'avanza_small':
-            min_com = 39.0
-            trans_com = quantity * price * 0.0015
-            if quantity * price < 26000.0:
-                return min_com
-            else:
-                return trans_com
-        elif self.name == 'avanza_medium':
-            min_com = 69.0
-            trans_com = quantity * price * 0.00069
-            if quantity * price < 100000.0:
-                return min_com
-            else:
-                return trans_com
-        elif self.name == 'avanza_fast':
-            return 99.0
-        # No commission
-        else:
-            return 0.0
+        if self.rate is None:
+            return self.fixed_commission
+        if quantity * price < self.min_value:
+            return self.min_commission
+        return quantity * price * self.rate
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+
+class HistoryTable:
+    """
+    Daily values of a portfolio, one row per date, in a preallocated numpy buffer.
+    Rows are written in place, so adding a day costs the same however long the history is. The buffer is sized
+    from the backtest period (see reserve) and grows geometrically if more rows are added.
+    The history is exposed as a pandas dataframe only on demand (see frame). The dataframe is built once and cached
+    until the next change.
+    """
+    def __init__(self,
+                 columns: list,
+                 capacity: int = 256) -> None:
+        """
+
+        :param columns: Column names.
+        :param capacity: Number of rows to allocate.
+        """
+        self.columns = list(columns)
+        self.column_index = {col: i for i, col in enumerate(self.columns)}
+        self.values = np.empty((max(int(capacity), 1), len(self.columns)), dtype='float64')
+        self.dates = np.empty(len(self.values), dtype='datetime64[ns]')
+        self.date_index = {}
+        self.length = 0
+        self.cached = None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle only the used rows, without the cached dataframe.
+        :return: State dictionary.
+        """
+        state = self.__dict__.copy()
+        state['values'] = self.values[:self.length].copy()
+        state['dates'] = self.dates[:self.length].copy()
+        state['cached'] = None
+        return state
+
+    @property
+    def empty(self) -> bool:
+        """
+        Check if history has no rows.
+        :return: Bool.
+        """
+        return self.length == 0
+
+    def reserve(self,
+                capacity: int) -> None:
+        """
+        Make room for at least capacity rows in total.
+        :param capacity: Number of rows.
+        :return: None.
+        """
+        if capacity <= len(self.values):
+            return
+        values = np.empty((capacity, len(self.columns)), dtype='float64')
+        dates = np.empty(capacity, dtype='datetime64[ns]')
+        values[:self.length] = self.values[:self.length]
+        dates[:self.length] = self.dates[:self.length]
+        self.values = values
+        self.dates = dates
+
+    def append(self,
+               date: np.datetime64,
+               row: list) -> None:
+        """
+        Add the values of a date. Values of a date already in history are replaced.
+        :param date: Date.
+        :param row: Values in column order.
+        :return: None.
+        """
+        idx = self.date_index.get(date)
+        if idx is None:
+            idx = self.length
+            if idx == len(self.values):
+                self.reserve(max(2 * idx, 256))
+            self.dates[idx] = date
+            self.date_index[date] = idx
+            self.length += 1
+        self.values[idx] = row
+        self.cached = None
+
+    def extend(self,
+               dates: np.ndarray,
+               values: np.ndarray) -> None:
+        """
+        Add the values of several dates, none of which are in history.
+        :param dates: Dates.
+        :param values: Numpy array with one row per date, in column order.
+        :return: None.
+        """
+        n = len(dates)
+        if self.length + n > len(self.values):
+            self.reserve(max(self.length + n, 2 * len(self.values)))
+        self.dates[self.length:self.length + n] = dates
+        self.values[self.length:self.length + n] = values
+        for i, date in enumerate(self.dates[self.length:self.length + n]):
+            self.date_index[date] = self.length + i
+        self.length += n
+        self.cached = None
+
+    def row(self,
+            date: np.datetime64) -> np.ndarray:
+        """
+        Get the values of a date, as a view.
+        :param date: Date.
+        :return: Numpy array in column order.
+        """
+        return self.values[self.date_index[date]]
+
+    def value(self,
+              date: np.datetime64,
+              column: str) -> float:
+        """
+        Get a single value.
+        :param date: Date.
+        :param column: Column name.
+        :return: Value as float.
+        """
+        return float(self.values[self.date_index[date], self.column_index[column]])
+
+    def frame(self) -> pd.DataFrame:
+        """
+        History as a dataframe indexed by date. Cached until the history changes.
+        :return: Pandas dataframe.
+        """
+        if self.cached is None:
+            self.cached = pd.DataFrame(self.values[:self.length].copy(),
+                                       index=pd.DatetimeIndex(self.dates[:self.length], name='date'),
+                                       columns=self.columns)
+        return self.cached
+
+    def replace(self,
+                frame: pd.DataFrame) -> None:
+        """
+        Replace the history with the rows of a dataframe indexed by date, with the same columns.
+        :param frame: Pandas dataframe.
+        :return: None.
+        """
+        self.values = np.empty((max(len(frame), 1), len(self.columns)), dtype='float64')
+        self.dates = np.empty(len(self.values), dtype='datetime64[ns]')
+        self.date_index = {}
+        self.length = 0
+        self.extend(dates=frame.index.values,
+                    values=frame[self.columns].to_numpy(dtype='float64'))
@@ -0,0 +1,213 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+class Ledger:
+    """
+    Append-only log of all transactions (fills) of a portfolio, shared by the portfolio and its positions.
+    Each row holds the transaction and the state of its position after it. Rows are written into growable numpy
+    column arrays, so a fill costs the same however many fills there are.
+    Portfolio.records and Position.transaction_history are views of the ledger, built as dataframes on demand and
+    cached until the next fill. Positions are keyed by a position id, so a position that is closed and later opened
+    again gets a new history.
+    """
+    # Columns of Portfolio.records.
+    record_columns = ['date',
+                      'direction',
+                      'name',
+                      'quantity',
+                      'price',
+                      'commission']
+    # Columns of Position.transaction_history.
+    position_columns = ['current_date',
+                        'current_price',
+                        'buy_quantity',
+                        'sell_quantity',
+                        'net_quantity',
+                        'avg_bought',
+                        'avg_sold',
+                        'avg_price',
+                        'buy_commission',
+                        'sell_commission',
+                        'total_commission',
+                        'realized_pnl',
+                        'unrealized_pnl',
+                        'total_pnl']
+    # Columns of the numeric array: transaction values, then position values (dates are kept separately).
+    value_columns = record_columns[3:] + position_columns[1:]
+
+    def __init__(self,
+                 capacity: int = 256) -> None:
+        """
+
+        :param capacity: Number of rows to allocate.
+        """
+        capacity = max(int(capacity), 1)
+        self.length = 0
+        self.dates = np.empty(capacity, dtype='datetime64[ns]')
+        self.position_ids = np.empty(capacity, dtype='int64')
+        self.name_codes = np.empty(capacity, dtype='int32')
+        self.directions = np.empty(capacity, dtype='U1')
+        self.values = np.empty((capacity, len(self.value_columns)), dtype='float64')
+        # Names by name code, and name codes by name.
+        self.names = []
+        self.name_index = {}
+        self.position_count = 0
+        # Row indexes of the transactions of each position, by position id.
+        self.position_rows = {}
+        # Cached dataframe views, by view name.
+        self.cached = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle only the used rows, without cached views.
+        :return: State dictionary.
+        """
+        state = self.__dict__.copy()
+        for key in ['dates', 'position_ids', 'name_codes', 'directions', 'values']:
+            state[key] = state[key][:self.length].copy()
+        state['cached'] = {}
+        return state
+
+    def new_position(self) -> int:
+        """
+        Get an id for a new position.
+        :return: Position id.
+        """
+        self.position_count += 1
+        return self.position_count - 1
+
+    def reserve(self,
+                capacity: int) -> None:
+        """
+        Make room for at least capacity rows in total.
+        :param capacity: Number of rows.
+        :return: None.
+        """
+        if capacity <= len(self.dates):
+            return
+        for key in ['dates', 'position_ids', 'name_codes', 'directions', 'values']:
+            old = getattr(self, key)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.length] = old[:self.length]
+            setattr(self, key, new)
+
+    def append(self,
+               position_id: int,
+               trans,
+               position) -> None:
+        """
+        Add a transaction and the state of its position after it.
+        :param position_id: Position id.
+        :param trans: Transaction object.
+        :param position: Position object, after the transaction.
+        :return: None.
+        """
+        idx = self.length
+        if idx == len(self.dates):
+            self.reserve(max(2 * idx, 256))
+        code = self.name_index.get(trans.name)
+        if code is None:
+            code = self.name_index[trans.name] = len(self.names)
+            self.names.append(trans.name)
+        self.dates[idx] = position.current_date
+        self.position_ids[idx] = position_id
+        self.position_rows.setdefault(position_id, []).append(idx)
+        self.name_codes[idx] = code
+        self.directions[idx] = trans.direction
+        self.values[idx] = (trans.quantity,
+                            trans.price,
+                            trans.commission,
+                            position.current_price,
+                            position.buy_quantity,
+                            position.sell_quantity,
+                            position.net_quantity,
+                            position.avg_bought,
+                            position.avg_sold,
+                            position.avg_price,
+                            position.buy_commission,
+                            position.sell_commission,
+                            position.total_commission,
+                            position.realized_pnl,
+                            position.unrealized_pnl,
+                            position.total_pnl)
+        self.length += 1
+        if self.cached:
+            self.cached = {}
+
+    def records(self) -> pd.DataFrame:
+        """
+        All transactions, in order. Cached until the next transaction.
+        :return: Pandas dataframe with the record columns.
+        """
+        if 'records' not in self.cached:
+            n = self.length
+            self.cached['records'] = pd.DataFrame({'date': self.dates[:n].copy(),
+                                                   'direction': self.directions[:n].astype(object),
+                                                   'name': np.array(self.names, dtype=object)[self.name_codes[:n]],
+                                                   'quantity': self.values[:n, 0].copy(),
+                                                   'price': self.values[:n, 1].copy(),
+                                                   'commission': self.values[:n, 2].copy()},
+                                                  columns=self.record_columns)
+        return self.cached['records']
+
+    def position_history(self,
+                         position_id: int) -> pd.DataFrame:
+        """
+        Transactions of one position, with the state of the position after each. Cached until the next transaction.
+        Rows are looked up in the row index of the position, so the cost does not grow with other positions.
+        :param position_id: Position id.
+        :return: Pandas dataframe with the position columns.
+        """
+        key = 'position_' + str(position_id)
+        if key not in self.cached:
+            rows = np.array(self.position_rows.get(position_id, []), dtype='int64')
+            history = pd.DataFrame(self.values[rows, 3:],
+                                   columns=self.position_columns[1:])
+            history.insert(0, 'current_date', self.dates[rows])
+            self.cached[key] = history
+        return self.cached[key]
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The whole ledger, one row per transaction, with position id, record columns and position columns.
+        :return: Pandas dataframe.
+        """
+        n = self.length
+        df = self.records().copy()
+        df.insert(0, 'position_id', self.position_ids[:n].copy())
+        for i, col in enumerate(self.value_columns[3:]):
+            df[col] = self.values[:n, 3 + i]
+        return df
+
+    def to_parquet(self,
+                   path: str) -> Path:
+        """
+        Export the ledger (see frame) to a Parquet file, or to CSV if pyarrow is not installed.
+        :param path: File name.
+        :return: Path to written file.
+        """
+        path = Path(path)
+        try:
+            self.frame().to_parquet(path,
+                                    index=False)
+        except ImportError:
+            print('WARNING: pyarrow is not installed. Ledger exported as CSV instead of Parquet.')
+            path = self.to_csv(path.with_suffix('.csv'))
+        return path
+
+    def to_csv(self,
+               path: str) -> Path:
+        """
+        Export the ledger (see frame) to a CSV file.
+        :param path: File name.
+        :return: Path to written file.
+        """
+        path = Path(path)
+        self.frame().to_csv(path,
+                            index=False)
+        return path
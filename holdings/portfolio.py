@@ -1,15 +1,20 @@
+import numpy as np
 import pandas as pd
 from holdings.transaction import Transaction
 from market.markets import Markets
 from holdings.position_handler import PositionHandler
+from holdings.history_table import HistoryTable
+from holdings.ledger import Ledger
 
 
 class Portfolio:
     """
     Create a Portfolio object.
     Read portfolio_config.ini for starting values.
-    Portfolio.history has information on positions, their market values, cash etc.
-    Portfolio.records has calculated metrics, if the metrics.py functions are called.
+    Portfolio.history has information on positions, their market values, cash etc. It is kept in a HistoryTable
+    (Portfolio.history_table) and built as a dataframe when read.
+    Portfolio.records has all transactions. It is a view of the portfolio's Ledger (Portfolio.ledger), built as a
+    dataframe when read.
     """
     def __init__(self,
                  init_cash: float,
@@ -22,14 +27,13 @@ class Portfolio:
         self.current_date = None
         self.benchmark = benchmark
         self.pf_id = pf_id
-        self.position_handler = PositionHandler()
+        self.ledger = Ledger()
+        self.position_handler = PositionHandler(ledger=self.ledger)
         self.symbols = []
-        self.history = pd.DataFrame()
-        self.records = pd.DataFrame()
+        self.history_table = None
         self.metrics = pd.DataFrame()
 
         self.create_history_table()
-        self.crete_records_table()
         self.add_symbols()
         print('SUCCESS: Portfolio ' + self.pf_id + ' created.')
 
@@ -42,7 +46,7 @@ class Portfolio:
             self.symbols.append(key)
 
     def update_all_market_values(self,
-                                 date: str,
+                                 date: np.datetime64,
                                  market_data: Markets) -> None:
         """
         Update current date and prices of all positions in portfolio.
@@ -51,47 +55,55 @@ class Portfolio:
         :param market_data: Market object.
         :return: None.
         """
-        for pos in self.position_handler.positions:
-            price = market_data.select(columns=[pos],
-                                       start_date=date,
-                                       end_date=date)
-            self.position_handler.positions[pos].update_current_market_price(date=date,
-                                                                             market_price=price.iloc[0, 0])
+        self.position_handler.update_market_values(date=date,
+                                                   market_data=market_data)
         self.current_date = date
         self.add_history(date=date,
                          market_data=market_data)
-
-        for pos in self.position_handler.positions:
-            if self.position_handler.positions[pos].net_quantity == 0:
-                del self.position_handler.positions[pos]
+        self.position_handler.remove_closed()
 
     def create_history_table(self) -> None:
         """
-        Create pd.Dataframe to hold daily values of portfolio.
+        Create HistoryTable to hold daily values of portfolio.
         :return: None.
         """
         if self.benchmark != '':
-            self.history = pd.DataFrame(columns=['date',
-                                                 'current_cash',
-                                                 'total_commission',
-                                                 'realized_pnl',
-                                                 'unrealized_pnl',
-                                                 'total_pnl',
-                                                 'total_market_value',
-                                                 'benchmark_value'])
+            self.history_table = HistoryTable(columns=['current_cash',
+                                                       'total_commission',
+                                                       'realized_pnl',
+                                                       'unrealized_pnl',
+                                                       'total_pnl',
+                                                       'total_market_value',
+                                                       'benchmark_value'])
         else:
-            self.history = pd.DataFrame(columns=['date',
-                                                 'current_cash',
-                                                 'total_commission',
-                                                 'realized_pnl',
-                                                 'unrealized_pnl',
-                                                 'total_pnl',
-                                                 'total_market_value'])
-        self.history.set_index('date',
-                               inplace=True)
+            self.history_table = HistoryTable(columns=['current_cash',
+                                                       'total_commission',
+                                                       'realized_pnl',
+                                                       'unrealized_pnl',
+                                                       'total_pnl',
+                                                       'total_market_value'])
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """
+        Daily values of portfolio as a dataframe indexed by date. Built from the history table when read after a
+        change, so avoid reading it every bar.
+        :return: Pandas dataframe.
+        """
+        return self.history_table.frame()
+
+    @history.setter
+    def history(self,
+                history: pd.DataFrame) -> None:
+        """
+        Replace daily values of portfolio.
+        :param history: Pandas dataframe indexed by date, with the history columns.
+        :return: None.
+        """
+        self.history_table.replace(frame=history)
 
     def add_history(self,
-                    date: str,
+                    date: np.datetime64,
                     market_data: Markets) -> None:
         """
         Add portfolio values for a specific date to history.
@@ -99,11 +111,9 @@ class Portfolio:
         :param market_data: Market data for benchmark values.
         :return:
         """
-        new_bar = []
         if self.benchmark != '':
-            bm_value = market_data.select(columns=[self.benchmark],
-                                          start_date=self.current_date,
-                                          end_date=self.current_date).iloc[0, 0]
+            bm_value = market_data.price_at(date=self.current_date,
+                                            column=self.benchmark)
             new_bar = [self.current_cash,
                        self.total_commission,
                        self.total_realized_pnl,
@@ -117,44 +127,23 @@ class Portfolio:
                        self.total_realized_pnl,
                        self.total_unrealized_pnl,
                        self.total_pnl,
-                       self.total_market_value,
-                       0]
-        self.history.loc[date] = new_bar
-
-    def crete_records_table(self) -> None:
-        """
-        Create a holder for all transactions.
-        :return: None.
-        """
-        self.records = pd.DataFrame(columns=['date',
-                                             'direction',
-                                             'name',
-                                             'quantity',
-                                             'price',
-                                             'commission'])
-        self.records.set_index(['date'])
+                       self.total_market_value]
+        self.history_table.append(date=date,
+                                  row=new_bar)
 
-    def add_record(self,
-                   t: Transaction) -> None:
+    @property
+    def records(self) -> pd.DataFrame:
         """
-        Add a transaction to records.
-        :param t: Transaction object.
-        :return: None.
+        All transactions of portfolio.
+        :return: Pandas dataframe.
         """
-        new_record = [t.date,
-                      t.direction,
-                      t.name,
-                      t.quantity,
-                      t.price,
-                      t.commission]
-        self.records.loc[len(self.records)] = new_record
-
+        return self.ledger.records()
 
     def transact_security(self,
                           trans: Transaction) -> None:
         """
         Complete buy/sell operation in portfolio given a transaction.
-        Add transaction to records.
+        The transaction is added to records by its position.
         :param trans: Transaction object.
         :return: None.
         """
@@ -170,8 +159,6 @@ class Portfolio:
         else:
             self.current_cash += trans_total_cost
 
-        self.add_record(t=trans)
-
     @property
     def market_value(self) -> float:
         """
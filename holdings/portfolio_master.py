@@ -1,7 +1,9 @@
 import configparser as cp
+import numpy as np
 import pandas as pd
 import strategy.strategy as strat
 from holdings.portfolio import Portfolio
+from holdings.history_table import HistoryTable
 from market.markets import Markets
 
 
@@ -25,7 +27,7 @@ class MasterPortfolio:
         self.current_date = self.inception_date
         self.benchmark = self.config['benchmark']['benchmark_name']
         self.pf_id = self.config['portfolio_information']['pf_id']
-        self.history = pd.DataFrame()
+        self.history_table = None
         self.records = pd.DataFrame()
         self.create_history_table()
 
@@ -51,19 +53,35 @@ class MasterPortfolio:
 
     def create_history_table(self) -> None:
         """
-        Create pd.Dataframe to hold daily values of portfolio.
+        Create HistoryTable to hold daily values of portfolio.
         :return: None.
         """
-        self.history = pd.DataFrame(columns=['date',
-                                             'current_cash',
-                                             'total_commission',
-                                             'realized_pnl',
-                                             'unrealized_pnl',
-                                             'total_pnl',
-                                             'total_market_value',
-                                             'benchmark_value'])
-        self.history.set_index('date',
-                               inplace=True)
+        self.history_table = HistoryTable(columns=['current_cash',
+                                                   'total_commission',
+                                                   'realized_pnl',
+                                                   'unrealized_pnl',
+                                                   'total_pnl',
+                                                   'total_market_value',
+                                                   'benchmark_value'])
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """
+        Daily values of master portfolio as a dataframe indexed by date. Built from the history table when read
+        after a change, so avoid reading it every bar.
+        :return: Pandas dataframe.
+        """
+        return self.history_table.frame()
+
+    @history.setter
+    def history(self,
+                history: pd.DataFrame) -> None:
+        """
+        Replace daily values of master portfolio.
+        :param history: Pandas dataframe indexed by date, with the history columns.
+        :return: None.
+        """
+        self.history_table.replace(frame=history)
 
     def add_portfolio(self,
                       pf_id: str,
@@ -86,8 +104,23 @@ class MasterPortfolio:
         """
         self.strategies[pf_id] = st
 
+    def required_columns(self) -> list:
+        """
+        Market data columns needed by all strategies and benchmarks. Used to only load these from market data.
+        :return: List of column names.
+        """
+        columns = set()
+        if self.benchmark != '':
+            columns.add(self.benchmark)
+        for pf in self.portfolios.values():
+            if pf.benchmark != '':
+                columns.add(pf.benchmark)
+        for st in self.strategies.values():
+            columns.update(st.required_columns())
+        return sorted(columns)
+
     def update_bench_mark(self,
-                          date: str,
+                          date: np.datetime64,
                           market: Markets) -> None:
         """
         Aggregate all portfolio history collumn values for this date. Add benchmark value for MasterPortfolio.
@@ -105,17 +138,16 @@ class MasterPortfolio:
         # Add a new day's aggregated data for the Master Portfolio.
         for pf in self.portfolios:
             port = self.portfolios.get(pf)
-            current_cash += port.history.loc[date, 'current_cash']
-            total_commission += port.history.loc[date, 'total_commission']
-            realized_pnl += port.history.loc[date, 'realized_pnl']
-            unrealized_pnl += port.history.loc[date, 'unrealized_pnl']
-            total_pnl += port.history.loc[date, 'total_pnl']
-            total_market_value += port.history.loc[date, 'total_market_value']
+            pf_row = port.history_table.row(date=date)
+            current_cash += pf_row[0]
+            total_commission += pf_row[1]
+            realized_pnl += pf_row[2]
+            unrealized_pnl += pf_row[3]
+            total_pnl += pf_row[4]
+            total_market_value += pf_row[5]
         # Add the Master Portfolio's benchmark value.
-        bm = market.select([self.benchmark],
-                           start_date=date,
-                           end_date=date)
-        bm = bm.iloc[0, 0]
+        bm = market.price_at(date=date,
+                             column=self.benchmark)
         row = [current_cash,
                total_commission,
                realized_pnl,
@@ -123,4 +155,5 @@ class MasterPortfolio:
                total_pnl,
                total_market_value,
                bm]
-        self.history.loc[date] = row
+        self.history_table.append(date=date,
+                                  row=row)
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from holdings.transaction import Transaction
+from holdings.ledger import Ledger
+from holdings.position_arrays import PositionArrays
 
 
 class Position:
@@ -8,12 +10,22 @@ class Position:
     Position object. Is created by transaction.py objects.
     All transactions are separated into buy or sell to facilitate accounting.
     Short selling is supported.
-    A Position "knows" its full history for all its transactions.
+    A Position "knows" its full history for all its transactions, kept in its portfolio's Ledger.
+    Derived values (net quantity, average price, pnl etc.) and the current market price are kept in a slot of its
+    portfolio's PositionArrays, updated on each transaction and price update (see update_values and
+    update_market_values), so reading them costs nothing and all positions can be marked to market at once.
     """
-    def __init__(self):
-        self.name = ''
-        self.current_date = ''
-        self.current_price = 0.0
+    def __init__(self,
+                 name: str = '',
+                 ledger: Ledger = None,
+                 arrays: PositionArrays = None):
+        """
+
+        :param name: Name of the position.
+        :param ledger: Ledger of the portfolio. None creates a ledger for this position only.
+        :param arrays: PositionArrays of the portfolio. None creates arrays for this position only.
+        """
+        self.name = name
         self.sell_quantity = 0.0
         self.avg_sold = 0.0
         self.sell_commission = 0.0
@@ -21,51 +33,30 @@ class Position:
         self.avg_bought = 0.0
         self.buy_commission = 0.0
 
-        self.transaction_history = pd.DataFrame()
-        self.create_history_table()
+        self.ledger = ledger if ledger is not None else Ledger()
+        self.position_id = self.ledger.new_position()
+        self.arrays = arrays if arrays is not None else PositionArrays()
+        self.slot = self.arrays.add()
+        self.direction = 0
 
-    def create_history_table(self) -> None:
+    @property
+    def transaction_history(self) -> pd.DataFrame:
         """
-        Create pd.Dataframe to hold all transactions making up the Position.
-        :return: None.
+        All transactions making up the Position, with the Position's values after each.
+        :return: Pandas dataframe.
         """
-        self.transaction_history = pd.DataFrame(columns=['current_date',
-                                                         'current_price',
-                                                         'buy_quantity',
-                                                         'sell_quantity',
-                                                         'net_quantity',
-                                                         'avg_bought',
-                                                         'avg_sold',
-                                                         'avg_price',
-                                                         'buy_commission',
-                                                         'sell_commission',
-                                                         'total_commission',
-                                                         'realized_pnl',
-                                                         'unrealized_pnl',
-                                                         'total_pnl'])
-
-    def add_history(self) -> None:
+        return self.ledger.position_history(position_id=self.position_id)
+
+    def add_history(self,
+                    trans: Transaction) -> None:
         """
         Add current transaction details to Position history.
+        :param trans: Transaction object.
         :return: None.
         """
-        new_trans = {'current_date': self.current_date,
-                     'current_price': self.current_price,
-                     'buy_quantity': self.buy_quantity,
-                     'sell_quantity': self.sell_quantity,
-                     'net_quantity': self.net_quantity,
-                     'avg_bought': self.avg_bought,
-                     'avg_sold': self.avg_sold,
-                     'avg_price': self.avg_price,
-                     'buy_commission': self.buy_commission,
-                     'sell_commission': self.sell_commission,
-                     'total_commission': self.total_commission,
-                     'realized_pnl': self.realized_pnl,
-                     'unrealized_pnl': self.unrealized_pnl,
-                     'total_pnl': self.total_pnl}
-        t = pd.DataFrame(new_trans,
-                         index=['current_date'])
-        self.transaction_history = pd.concat([self.transaction_history, t])
+        self.ledger.append(position_id=self.position_id,
+                           trans=trans,
+                           position=self)
 
     def transact(self,
                  trans: Transaction,
@@ -88,7 +79,7 @@ class Position:
 
         self.update_current_market_price(trans.price,
                                          trans.date)
-        self.add_history()
+        self.add_history(trans=trans)
 
         if verbose:
             print('INFO: Transaction: ' + trans.direction + ' ' + str(trans.quantity) + ' ' + trans.name + ' '
@@ -96,7 +87,7 @@ class Position:
 
     def update_current_market_price(self,
                                     market_price: float,
-                                    date: str) -> None:
+                                    date: np.datetime64) -> None:
         """
         Updates current market price and current date.
         :param market_price: New market price from market.py.
@@ -108,8 +99,10 @@ class Position:
                   'update the position. Aborted.' % (market_price, self.name))
             quit()
         else:
-            self.current_price = market_price
-            self.current_date = date
+            self.arrays.set_price(slot=self.slot,
+                                  price=market_price,
+                                  date=date)
+            self.update_market_values()
 
     def transact_buy(self,
                      quantity: float,
@@ -125,6 +118,7 @@ class Position:
         self.avg_bought = ((self.avg_bought * self.buy_quantity) + (quantity * price)) / (self.buy_quantity + quantity)
         self.buy_quantity += quantity
         self.buy_commission += commission
+        self.update_values()
 
     def transact_sell(self,
                       quantity: float,
@@ -140,128 +134,180 @@ class Position:
         self.avg_sold = ((self.avg_sold * self.sell_quantity) + (quantity * price)) / (self.sell_quantity + quantity)
         self.sell_quantity += quantity
         self.sell_commission += commission
+        self.update_values()
 
-    @property
-    def direction(self) -> int:
+    def update_values(self) -> None:
         """
-        Determine direction of transaction.
-        :return: Returns 1 for buy transaction, -1 for a sell transaction.
+        Update values derived from the transactions. Called after each transaction.
+        :return: None.
         """
-        if self.net_quantity == 0:
-            return 0
+        net_quantity = self.buy_quantity - self.sell_quantity
+        if net_quantity == 0:
+            self.direction = 0
         else:
-            return np.copysign(1, self.net_quantity)
+            self.direction = np.copysign(1, net_quantity)
 
-    @property
-    def market_value(self) -> float:
+        if net_quantity == 0.0:
+            avg_price = 0.0
+        elif net_quantity >= 0.0:
+            avg_price = (self.avg_bought * self.buy_quantity + self.buy_commission) / self.buy_quantity
+        else:
+            avg_price = (self.avg_sold * self.sell_quantity - self.sell_commission) / self.sell_quantity
+
+        total_commission = self.buy_commission + self.sell_commission
+
+        # Buys.
+        if self.direction == 1:
+            if self.sell_quantity == 0:
+                realized_pnl = 0.0
+            else:
+                realized_pnl = (
+                    ((self.avg_sold - self.avg_bought) * self.sell_quantity) -
+                    ((self.sell_quantity / self.buy_quantity) * self.buy_commission) -
+                    self.sell_commission
+                )
+        # Sells.
+        elif self.direction == -1:
+            if self.buy_quantity == 0:
+                realized_pnl = 0.0
+            else:
+                realized_pnl = (
+                    ((self.avg_sold - self.avg_bought) * self.buy_quantity) -
+                    ((self.buy_quantity / self.sell_quantity) * self.sell_commission) -
+                    self.buy_commission
+                )
+        else:
+            realized_pnl = self.total_net - total_commission
+        self.arrays.set_values(slot=self.slot,
+                               net_quantity=net_quantity,
+                               avg_price=avg_price,
+                               realized_pnl=realized_pnl,
+                               total_commission=total_commission)
+        self.update_market_values()
+
+    def update_market_values(self) -> None:
         """
-        Calculate current market value.
-        :return: Current market value.
+        Update values derived from the current market price. Called after each transaction and price update.
+        :return: None.
         """
-        return self.net_quantity * self.current_price
+        self.arrays.revalue(slot=self.slot)
 
-    @property
-    def avg_price(self) -> float:
+    def verify(self) -> None:
         """
-        Calculate the average price for all long and short transactions.
-        :return: Average price.
+        Integrity check. Recalculate all derived values from scratch and compare them to the kept values.
+        :return: None.
         """
-        if self.net_quantity == 0.0:
-            return 0.0
-        elif self.net_quantity >= 0.0:
-            return (self.avg_bought * self.buy_quantity + self.buy_commission) / self.buy_quantity
-        else:
-            return (self.avg_sold * self.sell_quantity - self.sell_commission) / self.sell_quantity
+        kept = [self.net_quantity, self.direction, self.avg_price, self.total_commission, self.realized_pnl,
+                self.market_value, self.unrealized_pnl, self.total_pnl]
+        self.update_values()
+        calculated = [self.net_quantity, self.direction, self.avg_price, self.total_commission, self.realized_pnl,
+                      self.market_value, self.unrealized_pnl, self.total_pnl]
+        if kept != calculated:
+            print('CRITICAL: Kept values %s of position "%s" differ from recalculated values %s. '
+                  'Aborted.' % (kept, self.name, calculated))
+            quit()
 
     @property
-    def net_quantity(self) -> float:
+    def current_price(self) -> float:
         """
-        Calculate net quantity.
-        :return: Net quantity.
+        Current market price.
+        :return: Market price.
         """
-        return self.buy_quantity - self.sell_quantity
+        return float(self.arrays.prices[self.slot])
 
     @property
-    def total_bought(self) -> float:
+    def current_date(self) -> np.datetime64:
         """
-        Calculate the total average cost of buy transactions.
-        :return:Total average cost for buys.
+        Date of the current market price.
+        :return: Date, None before the first transaction.
         """
-        return self.avg_bought * self.buy_quantity
+        date = self.arrays.dates[self.slot]
+        return None if np.isnat(date) else date
 
     @property
-    def total_sold(self) -> float:
+    def net_quantity(self) -> float:
         """
-        Calculate the total average cost of sell transactions.
-        :return:Total average cost for sells.
+        Net quantity.
+        :return: Net quantity.
         """
-        return self.avg_sold * self.sell_quantity
+        return float(self.arrays.quantities[self.slot])
 
     @property
-    def total_net(self) -> float:
+    def avg_price(self) -> float:
         """
-        Calculate the total average cost of all transactions.
-        :return:Total average cost.
+        Average price for all long and short transactions.
+        :return: Average price.
         """
-        return self.total_sold - self.total_bought
+        return float(self.arrays.avg_prices[self.slot])
 
     @property
     def total_commission(self) -> float:
         """
-        Calculate total commission for all transactions.
+        Total commission for all transactions.
         :return: Total commission.
         """
-        return self.buy_commission + self.sell_commission
+        return float(self.arrays.commissions[self.slot])
 
     @property
-    def net_incl_commission(self) -> float:
+    def realized_pnl(self) -> float:
         """
-        Calculate the total average cost of all transactions including commission.
-        :return:
+        Profit-and-loss (pnl) for two opposing transaction in the position.
+        :return: Realized pnl.
         """
-        return self.total_net - self.total_commission
+        return float(self.arrays.realized_pnls[self.slot])
 
     @property
-    def realized_pnl(self) -> float:
+    def market_value(self) -> float:
         """
-        Calculate the profit-and-loss (pnl) for two opposing transaction in the position.
-        :return: Realized pnl.
+        Current market value.
+        :return: Current market value.
         """
-        # Buys.
-        if self.direction == 1:
-            if self.sell_quantity == 0:
-                return 0.0
-            else:
-                return (
-                    ((self.avg_sold - self.avg_bought) * self.sell_quantity) -
-                    ((self.sell_quantity / self.buy_quantity) * self.buy_commission) -
-                    self.sell_commission
-                )
-        # Sells.
-        elif self.direction == -1:
-            if self.buy_quantity == 0:
-                return 0.0
-            else:
-                return (
-                    ((self.avg_sold - self.avg_bought) * self.buy_quantity) -
-                    ((self.buy_quantity / self.sell_quantity) * self.sell_commission) -
-                    self.buy_commission
-                )
-        else:
-            return self.net_incl_commission
+        return float(self.arrays.market_values[self.slot])
 
     @property
     def unrealized_pnl(self) -> float:
         """
-        Calculate the profit-and-loss (pnl) for the remaining non-zero quantity for the current market price.
+        Profit-and-loss (pnl) for the remaining non-zero quantity for the current market price.
         :return: Unrealized pnl.
         """
-        return (self.current_price - self.avg_price) * self.net_quantity
+        return float(self.arrays.unrealized_pnls[self.slot])
 
     @property
     def total_pnl(self) -> float:
         """
-        Calculate the sum of realized and unrealized pnl.
+        Sum of realized and unrealized pnl.
         :return: Total net pnl.
         """
-        return self.realized_pnl + self.unrealized_pnl
+        return float(self.arrays.total_pnls[self.slot])
+
+    @property
+    def total_bought(self) -> float:
+        """
+        Calculate the total average cost of buy transactions.
+        :return:Total average cost for buys.
+        """
+        return self.avg_bought * self.buy_quantity
+
+    @property
+    def total_sold(self) -> float:
+        """
+        Calculate the total average cost of sell transactions.
+        :return:Total average cost for sells.
+        """
+        return self.avg_sold * self.sell_quantity
+
+    @property
+    def total_net(self) -> float:
+        """
+        Calculate the total average cost of all transactions.
+        :return:Total average cost.
+        """
+        return self.total_sold - self.total_bought
+
+    @property
+    def net_incl_commission(self) -> float:
+        """
+        Calculate the total average cost of all transactions including commission.
+        :return:
+        """
+        return self.total_net - self.total_commission
@@ -0,0 +1,198 @@
+import numpy as np
+
+
+class PositionArrays:
+    """
+    Values of the positions of a portfolio as a struct of arrays, one slot per position, in position order.
+    Positions keep their buy and sell accounting themselves and write the values derived from it here (see
+    Position.update_values). Values that depend on the market price are calculated here, for one position at a time
+    on transactions (see revalue) or for all positions at once on a new bar (see mark). Totals over all positions
+    are summed from the arrays (see totals), so a bar costs a few array operations however many positions are held.
+    Sums are taken one position at a time in position order, so they are the same as summing the positions in a loop.
+    """
+    # Names of the arrays, one value per slot.
+    arrays = ['columns',
+              'dates',
+              'quantities',
+              'avg_prices',
+              'realized_pnls',
+              'commissions',
+              'prices',
+              'market_values',
+              'unrealized_pnls',
+              'total_pnls']
+
+    def __init__(self,
+                 capacity: int = 16) -> None:
+        """
+
+        :param capacity: Number of slots to allocate.
+        """
+        capacity = max(int(capacity), 1)
+        self.length = 0
+        # Column positions of the positions in market data, -1 if not looked up yet.
+        self.columns = np.full(capacity, -1, dtype='int64')
+        self.dates = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.quantities = np.zeros(capacity)
+        self.avg_prices = np.zeros(capacity)
+        self.realized_pnls = np.zeros(capacity)
+        self.commissions = np.zeros(capacity)
+        self.prices = np.zeros(capacity)
+        self.market_values = np.zeros(capacity)
+        self.unrealized_pnls = np.zeros(capacity)
+        self.total_pnls = np.zeros(capacity)
+        # True if values have changed since totals were last summed.
+        self.stale = False
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle only the used slots.
+        :return: State dictionary.
+        """
+        state = self.__dict__.copy()
+        for key in self.arrays:
+            state[key] = state[key][:self.length].copy()
+        return state
+
+    def reserve(self,
+                capacity: int) -> None:
+        """
+        Make room for at least capacity slots in total.
+        :param capacity: Number of slots.
+        :return: None.
+        """
+        if capacity <= len(self.quantities):
+            return
+        for key in self.arrays:
+            old = getattr(self, key)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.length] = old[:self.length]
+            setattr(self, key, new)
+
+    def add(self) -> int:
+        """
+        Add a slot for a new position, after all other slots.
+        :return: Slot.
+        """
+        slot = self.length
+        if slot == len(self.quantities):
+            self.reserve(max(2 * slot, 16))
+        for key in self.arrays:
+            getattr(self, key)[slot] = 0
+        self.columns[slot] = -1
+        self.dates[slot] = np.datetime64('NaT')
+        self.length += 1
+        self.stale = True
+        return slot
+
+    def compact(self,
+                keep: np.ndarray) -> None:
+        """
+        Remove slots, keeping the order of the remaining slots.
+        :param keep: Numpy bool array, True for each slot to keep.
+        :return: None.
+        """
+        n = int(keep.sum())
+        for key in self.arrays:
+            values = getattr(self, key)
+            values[:n] = values[:self.length][keep]
+        self.length = n
+        self.stale = True
+
+    def set_values(self,
+                   slot: int,
+                   net_quantity: float,
+                   avg_price: float,
+                   realized_pnl: float,
+                   total_commission: float) -> None:
+        """
+        Set the values of a position derived from its transactions.
+        :param slot: Slot of the position.
+        :param net_quantity: Net quantity.
+        :param avg_price: Average price.
+        :param realized_pnl: Realized pnl.
+        :param total_commission: Total commission.
+        :return: None.
+        """
+        self.quantities[slot] = net_quantity
+        self.avg_prices[slot] = avg_price
+        self.realized_pnls[slot] = realized_pnl
+        self.commissions[slot] = total_commission
+
+    def set_price(self,
+                  slot: int,
+                  price: float,
+                  date: np.datetime64) -> None:
+        """
+        Set the current market price and date of a position.
+        :param slot: Slot of the position.
+        :param price: Market price.
+        :param date: Date.
+        :return: None.
+        """
+        self.prices[slot] = price
+        self.dates[slot] = date
+
+    def revalue(self,
+                slot: int) -> None:
+        """
+        Calculate the values of a position that depend on its market price.
+        :param slot: Slot of the position.
+        :return: None.
+        """
+        quantity = self.quantities[slot]
+        price = self.prices[slot]
+        self.market_values[slot] = quantity * price
+        self.unrealized_pnls[slot] = (price - self.avg_prices[slot]) * quantity
+        self.total_pnls[slot] = self.realized_pnls[slot] + self.unrealized_pnls[slot]
+        self.stale = True
+
+    def mark(self,
+             prices: np.ndarray,
+             date: np.datetime64) -> None:
+        """
+        Set the current market prices and date of all positions and calculate the values that depend on them.
+        :param prices: Numpy array of market prices, one per slot.
+        :param date: Date.
+        :return: None.
+        """
+        n = self.length
+        self.prices[:n] = prices
+        self.dates[:n] = date
+        np.multiply(self.quantities[:n], prices, out=self.market_values[:n])
+        np.multiply(prices - self.avg_prices[:n], self.quantities[:n], out=self.unrealized_pnls[:n])
+        np.add(self.realized_pnls[:n], self.unrealized_pnls[:n], out=self.total_pnls[:n])
+        self.stale = True
+
+    def totals(self) -> dict:
+        """
+        Sum values over all positions.
+        :return: Dictionary of totals.
+        """
+        n = self.length
+        sums = self.ordered_sum(np.stack([self.market_values[:n],
+                                          self.unrealized_pnls[:n],
+                                          self.realized_pnls[:n],
+                                          self.total_pnls[:n],
+                                          self.commissions[:n]]))
+        return {'market_value': float(sums[0]),
+                'unrealized_pnl': float(sums[1]),
+                'realized_pnl': float(sums[2]),
+                'total_pnl': float(sums[3]),
+                'total_commission': float(sums[4])}
+
+    @staticmethod
+    def ordered_sum(values: np.ndarray) -> np.ndarray:
+        """
+        Sum over the last axis one value at a time, in order, starting from zero. Gives the same result as a Python
+        loop (or sum()) over the values, unlike numpy's pairwise summation.
+        :param values: Numpy array.
+        :return: Numpy array without the last axis.
+        """
+        values = np.concatenate([np.zeros(values.shape[:-1] + (1,)), values],
+                                axis=-1)
+        return np.add.accumulate(values,
+                                 axis=-1)[..., -1]
@@ -1,14 +1,50 @@
+import numpy as np
 from holdings.position import Position
 from collections import OrderedDict
 from holdings.transaction import Transaction
+from holdings.ledger import Ledger
+from holdings.position_arrays import PositionArrays
+from market.markets import Markets
 
 
 class PositionHandler:
     """
     Helper class to handle position operations in a Portfolio object.
+    Transactions of all positions are kept in one Ledger.
+    Values of all positions are kept in one PositionArrays, in the order of self.positions. All positions are marked
+    to market with one indexed read of market data and a few array operations (see update_market_values).
+    Totals over all positions are kept, so reading them costs nothing. They are summed again from the arrays on the
+    next read after positions have changed.
+    Setting PositionHandler.verify to True recalculates all positions and totals from scratch on every read and
+    aborts if they differ from the kept values, for testing.
     """
-    def __init__(self):
+    verify = False
+
+    def __init__(self,
+                 ledger: Ledger = None):
+        """
+
+        :param ledger: Ledger of the portfolio. None creates a new ledger.
+        """
         self.positions = OrderedDict()
+        self.ledger = ledger if ledger is not None else Ledger()
+        self.arrays = PositionArrays()
+        # Column index of the market data that column positions in self.arrays were looked up in.
+        self.column_index = None
+        self.totals = {'market_value': 0,
+                       'unrealized_pnl': 0,
+                       'realized_pnl': 0,
+                       'total_pnl': 0,
+                       'total_commission': 0}
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle without the column index of market data, which is looked up again on the next price update.
+        :return: State dictionary.
+        """
+        state = self.__dict__.copy()
+        state['column_index'] = None
+        return state
 
     def transact_position(self,
                           trans: Transaction) -> None:
@@ -21,41 +57,152 @@ class PositionHandler:
         if security in self.positions:
             self.positions[security].transact(trans)
         else:
-            position = Position()
+            position = Position(name=security,
+                                ledger=self.ledger,
+                                arrays=self.arrays)
             position.transact(trans)
             self.positions[security] = position
 
+    def remove_closed(self) -> None:
+        """
+        Remove all positions with zero net quantity.
+        :return: None.
+        """
+        keep = self.arrays.quantities[:len(self.arrays)] != 0
+        if keep.all():
+            return
+        for security in [security for security, pos in self.positions.items() if not keep[pos.slot]]:
+            del self.positions[security]
+        self.compact(keep=keep)
+
+    def compact(self,
+                keep: np.ndarray) -> None:
+        """
+        Remove slots of removed positions from the arrays and renumber the slots of the remaining positions.
+        :param keep: Numpy bool array, True for each slot to keep.
+        :return: None.
+        """
+        self.arrays.compact(keep=keep)
+        for slot, pos in enumerate(self.positions.values()):
+            pos.slot = slot
+
+    def update_market_values(self,
+                             date: np.datetime64,
+                             market_data: Markets) -> None:
+        """
+        Update current date and prices of all positions, reading the prices for the date in one indexed read.
+        :param date: Date to update all prices for.
+        :param market_data: Market object.
+        :return: None.
+        """
+        n = len(self.arrays)
+        if n == 0:
+            return
+        columns = self.arrays.columns[:n]
+        if self.column_index is not market_data.column_index or (columns < 0).any():
+            for pos in self.positions.values():
+                try:
+                    columns[pos.slot] = market_data.column_index[pos.name]
+                except KeyError:
+                    print('CRITICAL: Column ' + str(pos.name) + ' not in market data. Aborted.')
+                    quit()
+            self.column_index = market_data.column_index
+        prices = market_data.prices_at(date=date,
+                                       columns=columns)
+        if (prices <= 0.0).any():
+            slot = int(np.argmax(prices <= 0.0))
+            print('CRITICAL: Market price "%s" of asset "%s" must be positive to update the position. '
+                  'Aborted.' % (float(prices[slot]), list(self.positions)[slot]))
+            quit()
+        self.arrays.mark(prices=prices,
+                         date=date)
+
+    def calculate_totals(self) -> dict:
+        """
+        Sum values over all positions, in position order, from the Position objects.
+        :return: Dictionary of totals.
+        """
+        market_value = unrealized_pnl = realized_pnl = total_pnl = total_commission = 0
+        for pos in self.positions.values():
+            market_value += pos.market_value
+            unrealized_pnl += pos.unrealized_pnl
+            realized_pnl += pos.realized_pnl
+            total_pnl += pos.total_pnl
+            total_commission += pos.total_commission
+        return {'market_value': market_value,
+                'unrealized_pnl': unrealized_pnl,
+                'realized_pnl': realized_pnl,
+                'total_pnl': total_pnl,
+                'total_commission': total_commission}
+
+    def total(self,
+              key: str) -> float:
+        """
+        Get a kept total, summing again first if positions have changed since the last read.
+        :param key: Name of total.
+        :return: Total.
+        """
+        if self.verify:
+            self.check()
+        elif self.arrays.stale:
+            self.totals = self.arrays.totals()
+            self.arrays.stale = False
+        return self.totals[key]
+
+    def check(self) -> None:
+        """
+        Integrity check. Recalculate all positions and totals from scratch and compare them to the kept values.
+        :return: None.
+        """
+        stale = self.arrays.stale
+        for pos in self.positions.values():
+            pos.verify()
+        if list(self.positions) != sorted(self.positions, key=lambda security: self.positions[security].slot) \
+                or len(self.positions) != len(self.arrays):
+            print('CRITICAL: Slots of positions do not match position order. Aborted.')
+            quit()
+        totals = self.calculate_totals()
+        if not stale and totals != self.totals:
+            print('CRITICAL: Kept totals %s differ from recalculated totals %s. Aborted.' % (self.totals, totals))
+            quit()
+        if totals != self.arrays.totals():
+            print('CRITICAL: Totals of position arrays %s differ from recalculated totals %s. '
+                  'Aborted.' % (self.arrays.totals(), totals))
+            quit()
+        self.totals = totals
+        self.arrays.stale = False
+
     def total_market_value(self) -> float:
         """
         Calculate total market value for all positions.
         :return: Market value.
         """
-        return sum(pos.market_value for asset, pos in self.positions.items())
+        return self.total('market_value')
 
     def total_unrealized_pnl(self) -> float:
         """
         Calculate total unrealized PnL for all positions.
         :return: Unrealized PnL.
         """
-        return sum(pos.unrealized_pnl for asset, pos in self.positions.items())
+        return self.total('unrealized_pnl')
 
     def total_realized_pnl(self) -> float:
         """
         Calculate total realized PnL for all positions.
         :return: Realized PnL.
         """
-        return sum(pos.realized_pnl for asset, pos in self.positions.items())
+        return self.total('realized_pnl')
 
     def total_pnl(self) -> float:
         """
         Calculate total PnL for all positions.
         :return: PnL.
         """
-        return sum(pos.total_pnl for asset, pos in self.positions.items())
+        return self.total('total_pnl')
 
     def total_commission(self) -> float:
         """
         Calculate total commission for all positions.
         :return: Total commission.
         """
-        return sum(pos.total_commission for asset, pos in self.positions.items())
+        return self.total('total_commission')
@@ -1,4 +1,4 @@
-import datetime as dt
+import numpy as np
 import holdings.commission_scheme as cs
 
 
@@ -6,45 +6,53 @@ class Transaction:
     """
 
     Transaction object. One or more transactions together make up a Position object.
+    Slotted, since one is created for every buy or sell.
     """
+    __slots__ = ('name', 'direction', 'quantity', 'price', 'commission_scheme', 'commission', 'date', 'total_cash')
+
     def __init__(self,
                  name: str,
                  direction: str,
                  quantity: float,
                  price: float,
                  commission_scheme: str,
-                 date: str):
+                 date: np.datetime64,
+                 validate: bool = True):
         """
         :param name: Security identifier (RIC, ticker, ISIN, id etc.)
         :param direction: "B" for bought or "S" for sold.
         :param quantity: Number of units in the transaction. Sign is ignored and handled by direction parameter.
         :param price: Transaction price.
-        :param commission_scheme: Name of commission scheme.
-        :param date: Transaction date in format "YYYY-MM-DD". Used for history.
+        :param commission_scheme: Name of commission scheme. All transactions share one CommissionScheme per name.
+        :param date: Transaction date as np.datetime64, or a string in format "YYYY-MM-DD". Used for history.
+        :param validate: If False, direction and date are not validated. For transactions created by strategies,
+        with dates from market data (validated when read) and a literal direction.
         """
         self.name = name
-        self.direction = self.validate_direction(direction)
+        self.direction = self.validate_direction(direction) if validate else direction
         self.quantity = quantity
         self.price = price
-        self.commission_scheme = cs.CommissionScheme(commission_scheme)
+        self.commission_scheme = cs.CommissionScheme.shared(commission_scheme)
         self.commission = self.commission_scheme.calculate_commission(quantity=abs(self.quantity),
                                                                       price=self.price)
-        self.date = self.validate_date_format(date)
+        self.date = self.validate_date_format(date) if validate else date
         self.total_cash = self.commission + abs(self.quantity * self.price)
 
     @staticmethod
-    def validate_date_format(date: str) -> str:
+    def validate_date_format(date) -> np.datetime64:
         """
-        Make sure date formatting is 'YYYY-MM-DD'.
+        Make sure date is a np.datetime64. Dates from market data already are and are not parsed again.
+        Other dates must have format 'YYYY-MM-DD'.
         :param date: Date.
-        :return: Date string.
+        :return: Date.
         """
+        if isinstance(date, np.datetime64):
+            return date
         try:
-            dt.datetime.strptime(date, '%Y-%m-%d')
+            return np.datetime64(date, 'ns')
         except ValueError:
-            print('CRITICAL: Transaction date format must be "YYYY-MM-DD". "' + date + '" was given. Aborted.')
+            print('CRITICAL: Transaction date format must be "YYYY-MM-DD". "' + str(date) + '" was given. Aborted.')
             quit()
-        return date
 
     @staticmethod
     def validate_direction(direction: str) -> str:
@@ -10,8 +10,6 @@ if __name__ == '__main__':
     start_date = '2020-12-30'
     end_date = '2023-03-06'
 
-    market = m.Markets(fill_missing_method=None)
-
     mp = portfolio_master.MasterPortfolio(inception_date=start_date)
     p1 = portfolio.Portfolio(init_cash=500000.0,
                              benchmark='^OMX_Close',
@@ -31,6 +29,10 @@ if __name__ == '__main__':
     mp.add_strategy(pf_id=p2.pf_id,
                     st=s2)
 
+    # Only load market data needed by strategies and benchmarks.
+    market = m.Markets(fill_missing_method=None,
+                       columns=mp.required_columns())
+
     dnn1 = dnn.DNN(data=market.data,
                    load_from_file=False,
                    model_file_name='dnn1',
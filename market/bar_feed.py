@@ -0,0 +1,125 @@
+import numpy as np
+from market.market_lookup import MarketLookup
+from market.markets import Markets
+
+
+class BarFeed(MarketLookup):
+    """
+    Streaming market data source for Backtests.
+    Bars are read from disk in chunks (from the memory-mapped price cube for the memmap storage backend) and only
+    the current chunk plus a window of the most recent "lookback" bars is held in memory.
+    Exposes the same lookup API as a Markets object (see MarketLookup), so it can be passed to Backtests in place of
+    one and strategies, portfolios and the event loop run unchanged. Lookups outside the window, or ahead of the
+    current bar, abort.
+    """
+    # Bars are read while the backtest runs, so strategy data can not be selected up front.
+    streaming = True
+
+    def __init__(self,
+                 market: Markets,
+                 lookback: int = 1,
+                 chunk_size: int = 256) -> None:
+        """
+
+        :param market: Markets object. Use the memmap storage backend to avoid holding all market data in memory.
+        :param lookback: Number of most recent bars (including the current one) that can be looked up.
+        :param chunk_size: Number of bars read from disk at a time.
+        """
+        self.market = market
+        self.lookback = max(int(lookback), 1)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.columns = market.columns
+        self.column_index = market.column_index
+        self.dates = market.dates
+        self.date_index = market.date_index
+        self.calendar = market.calendar
+        self.buffer = np.empty((0, len(self.columns)))
+        self.buffer_start = 0
+        self.current_index = -1
+
+    def load_chunk(self,
+                   idx: int,
+                   end: int) -> None:
+        """
+
+        Read the next chunk of bars from disk starting at idx, keeping the last lookback - 1 bars before it.
+        :param idx: Row index of the first new bar.
+        :param end: Last row index of the backtest (included).
+        :return: None.
+        """
+        keep_start = max(idx - self.lookback + 1, 0)
+        if self.buffer_start <= keep_start < self.buffer_start + len(self.buffer):
+            kept = self.buffer[keep_start - self.buffer_start:idx - self.buffer_start]
+        else:
+            kept = self.market.rows(start=keep_start,
+                                    end=idx)
+        chunk = self.market.rows(start=idx,
+                                 end=min(idx + self.chunk_size, end + 1))
+        self.buffer = np.concatenate([kept, chunk])
+        self.buffer_start = keep_start
+
+    def bars(self,
+             start: int,
+             end: int):
+        """
+
+        Generator of bars to be consumed by the backtest loop. Reads a new chunk from disk when needed.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Generator of (row index, date) tuples.
+        """
+        self.buffer = np.empty((0, len(self.columns)))
+        self.buffer_start = 0
+        for idx in range(start, end + 1):
+            if idx >= self.buffer_start + len(self.buffer):
+                self.load_chunk(idx=idx,
+                                end=end)
+            self.current_index = idx
+            yield idx, self.dates[idx]
+
+    def buffer_row(self,
+                   idx: int) -> int:
+        """
+
+        Get position of a row index in the in-memory window.
+        :param idx: Row index.
+        :return: Position in self.buffer.
+        """
+        if not (self.current_index - self.lookback < idx <= self.current_index):
+            print('CRITICAL: Bar ' + str(idx) + ' requested, but only bars ' +
+                  str(max(self.current_index - self.lookback + 1, 0)) + ' to ' + str(self.current_index) +
+                  ' are available in the streaming window. Increase lookback. Aborted.')
+            quit()
+        return idx - self.buffer_start
+
+    def row_at(self,
+               idx: int) -> np.ndarray:
+        """
+
+        Get all values for one bar in the window as a view into the buffer.
+        :param idx: Row index.
+        :return: Numpy array.
+        """
+        return self.buffer[self.buffer_row(idx)]
+
+    def locate(self,
+               row: int) -> int:
+        """
+
+        Get the position of a row index in the in-memory window.
+        :param row: Row index.
+        :return: Position in self.buffer.
+        """
+        return self.buffer_row(row)
+
+    def read(self,
+             positions,
+             columns) -> np.ndarray:
+        """
+
+        Read values from the in-memory window.
+        :param positions: Position, or slice of positions, in self.buffer.
+        :param columns: Column position, or list or numpy array of column positions.
+        :return: Value, or numpy array with one row per position if positions is a slice.
+        """
+        return self.buffer[positions, columns]
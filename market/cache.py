@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+import pandas as pd
+
+
+class MarketCache:
+    """
+    On-disk cache for merged and validated market data.
+    Data is stored in a columnar binary format (Parquet or Feather, pickle if pyarrow is not installed) together
+    with a small json file holding the fingerprint of the source files it was built from.
+    New rows can be appended as separate part files, which are joined with the main file when loaded.
+    Data built with different parameters (e.g. required columns or dtype) is kept in separate entries, one
+    subdirectory per key, so backtests loading different columns do not overwrite each other's cache. The least
+    recently used entries are removed when there are more than max_entries.
+    """
+    formats = ['parquet', 'feather', 'pickle']
+    # Bump when the layout of the cached data changes, to invalidate existing caches.
+    version = 3
+
+    def __init__(self,
+                 cache_directory: str,
+                 cache_format: str,
+                 key: str = '',
+                 max_entries: int = 0) -> None:
+        """
+
+        :param cache_directory: Directory for cache entries.
+        :param cache_format: Either "parquet", "feather" or "pickle".
+        :param key: Key of the entry, from MarketCache.key. Files are stored in a subdirectory with this name.
+        :param max_entries: Maximum number of entries kept in cache_directory. 0 keeps all entries.
+        """
+        if cache_format not in self.formats:
+            print('CRITICAL: Cache format "' + cache_format + '" not implemented. Should be either "parquet", '
+                  '"feather" or "pickle". Aborted.')
+            quit()
+        self.root_directory = Path(cache_directory)
+        self.cache_directory = self.root_directory / key
+        self.max_entries = max_entries
+        self.cache_format = cache_format
+        self.data_file = self.cache_directory / ('market_data.' + cache_format)
+        self.meta_file = self.cache_directory / 'market_data.json'
+
+    @classmethod
+    def fingerprint(cls,
+                    source_files: list,
+                    **params) -> str:
+        """
+
+        Create a fingerprint from names, sizes and modification times of all source files.
+        Any keyword parameters affecting the resulting data (e.g. fill method) and the cache version are included
+        as well.
+        :param source_files: List of Path objects.
+        :param params: Parameters used when building the data.
+        :return: Fingerprint as hex string.
+        """
+        h = hashlib.sha256(str(cls.version).encode())
+        for f in sorted(source_files):
+            stat = f.stat()
+            h.update((f.name + '|' + str(stat.st_size) + '|' + str(stat.st_mtime_ns) + '\n').encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    @classmethod
+    def key(cls,
+            **params) -> str:
+        """
+
+        Create a short key from the parameters used when building the data and the cache version. Unlike the
+        fingerprint it does not depend on the source files, so the entry for a set of parameters is replaced when
+        the source files change.
+        :param params: Parameters used when building the data.
+        :return: Key as hex string.
+        """
+        h = hashlib.sha256(str(cls.version).encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()[:16]
+
+    @staticmethod
+    def touch(directory: Path) -> None:
+        """
+
+        Mark an entry as used, by its directory modification time.
+        :param directory: Entry directory.
+        :return: None.
+        """
+        try:
+            os.utime(directory)
+        except OSError:
+            pass
+
+    @staticmethod
+    def evict(root_directory: Path,
+              max_entries: int,
+              keep: Path) -> None:
+        """
+
+        Remove the least recently used entry directories, so that at most max_entries are left.
+        Processes that have files of a removed entry open or memory-mapped keep reading them until they close them.
+        :param root_directory: Directory holding the entries.
+        :param max_entries: Maximum number of entries. 0 keeps all entries.
+        :param keep: Entry directory that is never removed, i.e. the one in use.
+        :return: None.
+        """
+        if max_entries <= 0 or not root_directory.is_dir():
+            return
+        entries = [d for d in root_directory.iterdir() if d.is_dir() and d != keep]
+        entries.sort(key=lambda d: d.stat().st_mtime_ns,
+                     reverse=True)
+        for d in entries[max(max_entries - 1, 0):]:
+            shutil.rmtree(d,
+                          ignore_errors=True)
+            print('INFO: Least recently used cache entry "' + str(d) + '" removed.')
+
+    @staticmethod
+    def file_stats(source_files: list) -> dict:
+        """
+
+        Get sizes and modification times of source files.
+        :param source_files: List of Path objects.
+        :return: Dictionary with {file name: [size, modification time in ns]}.
+        """
+        stats = {}
+        for f in source_files:
+            stat = f.stat()
+            stats[f.name] = [stat.st_size, stat.st_mtime_ns]
+        return stats
+
+    def read_meta(self) -> dict:
+        """
+
+        Read cache metadata.
+        :return: Dictionary. Empty if no cache exists.
+        """
+        if not self.meta_file.exists():
+            return {}
+        with open(self.meta_file, 'r') as f:
+            return json.load(f)
+
+    def load(self,
+             fingerprint: str) -> (pd.DataFrame, dict):
+        """
+
+        Load cached market data if it was built from the same source files.
+        :param fingerprint: Fingerprint of the current source files.
+        :return: Market data and cache metadata. (None, {}) if there is no valid cache.
+        """
+        meta = self.read_meta()
+        if meta.get('fingerprint') != fingerprint:
+            if meta:
+                print('INFO: Source files changed. Market data cache invalidated.')
+            return None, {}
+        data_file = self.cache_directory / meta['data_file']
+        try:
+            frames = [self.read_file(file=self.cache_directory / f)
+                      for f in [meta['data_file']] + meta.get('parts', [])]
+            data = pd.concat(frames) if len(frames) > 1 else frames[0]
+        except (OSError, ValueError, ImportError) as e:
+            print('WARNING: Market data cache could not be read with the following exception:')
+            print('   ' + str(e))
+            return None, {}
+        self.touch(self.cache_directory)
+        print('INFO: Market data read from cache "' + str(data_file) + '".')
+        return data, meta
+
+    @staticmethod
+    def read_file(file: Path) -> pd.DataFrame:
+        """
+
+        Read one cache file. The format is given by the file suffix.
+        :param file: Path to file.
+        :return: Pandas dataframe.
+        """
+        if file.suffix == '.parquet':
+            return pd.read_parquet(file)
+        elif file.suffix == '.feather':
+            return pd.read_feather(file).set_index('Date')
+        else:
+            return pd.read_pickle(file)
+
+    def write_file(self,
+                   data: pd.DataFrame,
+                   file_stem: str) -> Path:
+        """
+
+        Write one cache file in the cache format, or as pickle if pyarrow is not installed.
+        :param data: Pandas dataframe.
+        :param file_stem: File name without suffix.
+        :return: Path to written file.
+        """
+        data_file = self.cache_directory / (file_stem + '.' + self.cache_format)
+        try:
+            if self.cache_format == 'parquet':
+                data.to_parquet(data_file)
+            elif self.cache_format == 'feather':
+                data.rename_axis('Date').reset_index().to_feather(data_file)
+            else:
+                data.to_pickle(data_file)
+        except ImportError:
+            print('WARNING: pyarrow is not installed. Market data cached as pickle instead of ' + self.cache_format +
+                  '.')
+            data_file = self.cache_directory / (file_stem + '.pickle')
+            data.to_pickle(data_file)
+        return data_file
+
+    def save(self,
+             data: pd.DataFrame,
+             fingerprint: str,
+             **meta) -> None:
+        """
+
+        Write market data and metadata to cache.
+        :param data: Market data.
+        :param fingerprint: Fingerprint of the source files.
+        :param meta: Additional metadata to store, must be json serializable.
+        :return: None.
+        """
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        for f in self.read_meta().get('parts', []):
+            (self.cache_directory / f).unlink(missing_ok=True)
+        data_file = self.write_file(data=data,
+                                    file_stem='market_data')
+
+        meta.update({'fingerprint': fingerprint,
+                     'data_file': data_file.name,
+                     'parts': []})
+        with open(self.meta_file, 'w') as f:
+            json.dump(meta, f)
+        print('INFO: Market data written to cache "' + str(data_file) + '".')
+        self.evict(root_directory=self.root_directory,
+                   max_entries=self.max_entries,
+                   keep=self.cache_directory)
+
+    def append(self,
+               data: pd.DataFrame,
+               fingerprint: str,
+               **meta) -> None:
+        """
+
+        Append new rows to the cache as a separate part file, without rewriting existing data.
+        The cache must exist.
+        :param data: New rows of market data.
+        :param fingerprint: Fingerprint of the source files, including the new rows.
+        :param meta: Additional metadata to update, must be json serializable.
+        :return: None.
+        """
+        cache_meta = self.read_meta()
+        parts = cache_meta.get('parts', [])
+        data_file = self.write_file(data=data,
+                                    file_stem='market_data.' + str(len(parts) + 1))
+        cache_meta.update(meta)
+        cache_meta.update({'fingerprint': fingerprint,
+                           'parts': parts + [data_file.name]})
+        with open(self.meta_file, 'w') as f:
+            json.dump(cache_meta, f)
+        print('INFO: ' + str(len(data.index)) + ' new rows appended to cache in "' + str(data_file) + '".')
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+
+class TradingCalendar:
+    """
+    Trading calendar for the dates in market data.
+    Computes period-boundary masks with vectorized operations and exposes rebalance dates as arrays of row indexes,
+    so the backtest knows all rebalance dates up front.
+    Supported periods:
+    * som/eom -> start/end-of-month
+    * sow/eow -> start/end-of-week
+    * soq/eoq -> start/end-of-quarter
+    * soy/eoy -> start/end-of-year
+    * <N>d -> every N trading days, counted from the first date of the selection (e.g. "5d")
+    Holidays are treated as non-trading days: they are never flagged, and period boundaries move to the closest
+    trading day within the period.
+    """
+    periods = {'som': 'start-of-month',
+               'eom': 'end-of-month',
+               'sow': 'start-of-week',
+               'eow': 'end-of-week',
+               'soq': 'start-of-quarter',
+               'eoq': 'end-of-quarter',
+               'soy': 'start-of-year',
+               'eoy': 'end-of-year'}
+
+    def __init__(self,
+                 dates,
+                 holidays: list = None) -> None:
+        """
+
+        :param dates: Sorted dates of market data.
+        :param holidays: List of dates that are not trading days.
+        """
+        self.dates = pd.DatetimeIndex(pd.to_datetime(np.asarray(dates)))
+        self.holidays = pd.DatetimeIndex(pd.to_datetime(holidays if holidays else []))
+        self.trading = ~np.asarray(self.dates.isin(self.holidays))
+        self.masks = {}
+        self.build_masks()
+
+    @classmethod
+    def valid_period(cls,
+                     period: str) -> bool:
+        """
+
+        Check if a period string is supported.
+        :param period: Period.
+        :return: True/False.
+        """
+        if period in cls.periods:
+            return True
+        return len(period) > 1 and period[-1] == 'd' and period[:-1].isdigit() and int(period[:-1]) > 0
+
+    @classmethod
+    def describe(cls,
+                 period: str) -> str:
+        """
+
+        Get a readable name for a period.
+        :param period: Period.
+        :return: Name of period.
+        """
+        if period in cls.periods:
+            return cls.periods[period]
+        return 'every ' + period[:-1] + ' trading days'
+
+    def build_masks(self,
+                    first: int = 0) -> None:
+        """
+
+        Compute start and end masks for all calendar periods on trading days.
+        A date starts a period if its period key differs from the previous trading day's, and ends a period if the
+        next trading day starts one. The first and last trading days are never flagged.
+        :param first: First row to (re)compute. Masks for earlier rows are kept, so appending dates only costs time
+        proportional to the new dates.
+        :return: None.
+        """
+        rows = np.flatnonzero(self.trading)
+        # Start one trading day earlier, since the end flag of the previous last day depends on the new days.
+        pos = max(np.searchsorted(rows, first) - 1, 0)
+        rows = rows[pos:]
+        days = self.dates[rows]
+        keys = {'m': days.year * 12 + days.month,
+                'w': (days - pd.to_timedelta(days.weekday, unit='D')).normalize().asi8,
+                'q': days.year * 4 + days.quarter,
+                'y': days.year}
+        for k, key in keys.items():
+            key = np.asarray(key)
+            start = np.zeros(len(days), dtype=bool)
+            start[1:] = key[1:] != key[:-1]
+            end = np.zeros(len(days), dtype=bool)
+            end[:-1] = start[1:]
+            for name, mask in (('so' + k, start), ('eo' + k, end)):
+                full = np.zeros(len(self.dates), dtype=bool)
+                if name in self.masks:
+                    kept = min(len(self.masks[name]), len(self.dates))
+                    full[:kept] = self.masks[name][:kept]
+                # The first recomputed day keeps its start flag, which depends on the day before it.
+                if pos > 0:
+                    full[rows[1:]] = mask[1:]
+                    if name.startswith('eo'):
+                        full[rows[0]] = mask[0]
+                else:
+                    full[rows] = mask
+                self.masks[name] = full
+
+    def extend(self,
+               dates) -> None:
+        """
+
+        Append new dates, later than all existing dates, and update the masks for them.
+        :param dates: Sorted new dates.
+        :return: None.
+        """
+        first = len(self.dates)
+        self.dates = self.dates.append(pd.DatetimeIndex(pd.to_datetime(np.asarray(dates))))
+        self.trading = ~np.asarray(self.dates.isin(self.holidays))
+        self.build_masks(first=first)
+
+    def mask(self,
+             period: str) -> np.ndarray:
+        """
+
+        Boolean mask over all dates for a calendar period boundary.
+        :param period: Period, e.g. "som".
+        :return: Numpy array of bools.
+        """
+        if period not in self.masks:
+            print('CRITICAL: Calendar period "' + period + '" not implemented. Aborted.')
+            quit()
+        return self.masks[period]
+
+    def indices(self,
+                period: str,
+                start: int = 0,
+                end: int = None,
+                last: int = None) -> np.ndarray:
+        """
+
+        Row indexes of all rebalance dates for a period between start and end.
+        :param period: Period, e.g. "eom" or "5d".
+        :param start: First row index (included).
+        :param end: Last row index (included). Defaults to the last date.
+        :param last: Row index of the last rebalance date before start, if any. Periods of N trading days then count
+        on from it instead of starting at start.
+        :return: Numpy array of row indexes.
+        """
+        if end is None:
+            end = len(self.dates) - 1
+        if period in self.periods:
+            return np.flatnonzero(self.mask(period)[start:end + 1]) + start
+        elif self.valid_period(period):
+            n = int(period[:-1])
+            if last is None:
+                trading = np.flatnonzero(self.trading[start:end + 1]) + start
+                return trading[::n]
+            trading = np.flatnonzero(self.trading[last + 1:end + 1]) + last + 1
+            trading = trading[n - 1::n]
+            return trading[trading >= start]
+        else:
+            print('CRITICAL: Calendar period "' + period + '" not implemented. Aborted.')
+            quit()
+
+    def flags(self) -> pd.DataFrame:
+        """
+
+        Start/end of month and week flags as 0/1 columns, indexed on date.
+        :return: Pandas dataframe with columns is_som, is_eom, is_sow and is_eow.
+        """
+        return pd.DataFrame({'is_' + period: self.masks[period].astype(int)
+                             for period in ['som', 'eom', 'sow', 'eow']},
+                            index=self.dates)
@@ -0,0 +1,103 @@
+import numpy as np
+from market.calendar import TradingCalendar
+from market.market_lookup import MarketLookup
+
+
+class LiveMarket(MarketLookup):
+    """
+    Market data that arrives one bar at a time, for paper trading.
+    The trading dates are known in advance (from the feed's exchange calendar), so row indexes, the trading calendar
+    and strategy schedules are the same as in a backtest over the same dates. Prices are only known for bars that
+    have arrived. Lookups of bars that have not arrived yet abort.
+    Exposes the same lookup API as a Markets object (see MarketLookup), so portfolios and strategies run unchanged.
+    """
+    # Bars arrive while the backtest runs, so strategy data can not be selected up front.
+    streaming = True
+
+    def __init__(self,
+                 columns: list,
+                 dates: np.ndarray,
+                 holidays: list = None,
+                 dtype: str = 'float64') -> None:
+        """
+
+        :param columns: Column names of the bars.
+        :param dates: All trading dates, sorted, as np.datetime64 (ns).
+        :param holidays: List of dates that are not trading days.
+        :param dtype: Dtype of stored bars.
+        """
+        self.columns = list(columns)
+        self.column_index = {col: i for i, col in enumerate(self.columns)}
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.date_index = {date: row for row, date in enumerate(self.dates)}
+        self.calendar = TradingCalendar(dates=self.dates,
+                                        holidays=holidays)
+        self.prices = np.full((len(self.dates), len(self.columns)), np.nan, dtype=dtype)
+        self.received = np.zeros(len(self.dates), dtype=bool)
+        self.last_index = -1
+
+    def append(self,
+               date: np.datetime64,
+               values: np.ndarray) -> int:
+        """
+        Add a bar that has arrived.
+        :param date: Date of the bar.
+        :param values: Values in column order.
+        :return: Row index of the bar.
+        """
+        try:
+            row = self.date_index[date]
+        except KeyError:
+            print('CRITICAL: Bar for ' + self.date_str(date) + ' is not a trading date. Aborted.')
+            quit()
+        self.prices[row] = values
+        self.received[row] = True
+        self.last_index = max(self.last_index, row)
+        return row
+
+    def checked_row(self,
+                    row: int) -> int:
+        """
+        Make sure a bar has arrived.
+        :param row: Row index.
+        :return: Row index.
+        """
+        if not self.received[row]:
+            print('CRITICAL: Bar for ' + self.date_str(self.dates[row]) + ' has not arrived. Aborted.')
+            quit()
+        return row
+
+    def row_at(self,
+               idx: int) -> np.ndarray:
+        """
+
+        Get all values of a bar that has arrived, as a view.
+        :param idx: Row index.
+        :return: Numpy array.
+        """
+        return self.prices[self.checked_row(idx)]
+
+    def locate(self,
+               row: int) -> int:
+        """
+        Make sure a bar has arrived, before reading it.
+        :param row: Row index.
+        :return: Position in self.prices, the row index.
+        """
+        return self.checked_row(row)
+
+    def locate_span(self,
+                    start: int,
+                    end: int) -> slice:
+        """
+        Make sure all bars of a block have arrived, before reading them.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Slice of positions.
+        """
+        span = slice(self.checked_row(start), self.checked_row(end) + 1)
+        if not self.received[span].all():
+            print('CRITICAL: Not all bars from ' + self.date_str(self.dates[start]) + ' to ' +
+                  self.date_str(self.dates[end]) + ' have arrived. Aborted.')
+            quit()
+        return span
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+
+class MarketLookup:
+    """
+    Lookup API shared by all market data sources: Markets, SharedMarket, BarFeed and LiveMarket.
+    Subclasses set self.dates (sorted np.datetime64 (ns)), self.date_index, self.columns and self.column_index, and
+    hold their values in self.prices, one row per date. All lookups read values through three methods, which
+    subclasses override where their storage differs:
+    * locate(row): position of a row index in the stored values, after checking that it can be read,
+    * locate_span(start, end): positions of a block of rows, after checking that all of them can be read,
+    * read(positions, columns): values at positions for column positions.
+    """
+    @staticmethod
+    def to_date(date) -> np.datetime64:
+        """
+
+        Convert a date to the np.datetime64 (ns) used in market data. Only needed at the input edge, dates from
+        market data are already converted.
+        :param date: Date as "YYYY-MM-DD" string, datetime, pd.Timestamp or np.datetime64.
+        :return: Date.
+        """
+        try:
+            return np.datetime64(date, 'ns')
+        except ValueError:
+            print('CRITICAL: Date "' + str(date) + '" can not be read. Format must be "YYYY-MM-DD". Aborted.')
+            quit()
+
+    @staticmethod
+    def date_str(date) -> str:
+        """
+
+        Format a date as "YYYY-MM-DD" string, for output.
+        :param date: Date.
+        :return: Date string.
+        """
+        return str(np.datetime64(date, 'D'))
+
+    def index_of(self,
+                 date) -> int:
+        """
+
+        Get the row index of a date in market data, by binary search on the sorted dates.
+        :param date: Date, converted with to_date.
+        :return: Row index.
+        """
+        date = self.to_date(date)
+        row = np.searchsorted(self.dates, date)
+        if row < len(self.dates) and self.dates[row] == date:
+            return int(row)
+        print('CRITICAL: Date ' + self.date_str(date) + ' not in market data. Aborted.')
+        quit()
+
+    def row_of(self,
+               date) -> int:
+        """
+
+        Get the row index of a date in constant time.
+        :param date: Date from market data. Other date types are converted with to_date, at extra cost.
+        :return: Row index.
+        """
+        try:
+            return self.date_index[date]
+        except KeyError:
+            return self.index_of(date)
+
+    def locate(self,
+               row: int) -> int:
+        """
+
+        Get the position of a row index in self.prices.
+        :param row: Row index.
+        :return: Position.
+        """
+        return row
+
+    def locate_span(self,
+                    start: int,
+                    end: int) -> slice:
+        """
+
+        Get the positions of a block of rows in self.prices.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Slice of positions.
+        """
+        return slice(self.locate(start), self.locate(end) + 1)
+
+    def read(self,
+             positions,
+             columns) -> np.ndarray:
+        """
+
+        Read values from self.prices.
+        :param positions: Position, or slice of positions, from locate or locate_span.
+        :param columns: Column position, or list or numpy array of column positions.
+        :return: Value, or numpy array with one row per position if positions is a slice.
+        """
+        return self.prices[positions, columns]
+
+    def row_at(self,
+               idx: int) -> np.ndarray:
+        """
+
+        Get all values for one row of market data as a view into self.prices.
+        Column positions are given by self.column_index.
+        :param idx: Row index.
+        :return: Numpy array.
+        """
+        return self.prices[idx]
+
+    def rows(self,
+             start: int,
+             end: int) -> np.ndarray:
+        """
+
+        Get all values for a block of rows of market data, with the same column positions as row_at.
+        Used to read market data in chunks.
+        :param start: First row index (included).
+        :param end: Last row index (excluded).
+        :return: Numpy array with one row per date.
+        """
+        return self.prices[start:end]
+
+    def bars(self,
+             start: int,
+             end: int):
+        """
+
+        Generator of bars to be consumed by the backtest loop. All market data is already in memory (or memory
+        mapped), so this only steps through the dates.
+        :param start: First row index (included).
+        :param end: Last row index (included).
+        :return: Generator of (row index, date) tuples.
+        """
+        for idx in range(start, end + 1):
+            yield idx, self.dates[idx]
+
+    def price_at(self,
+                 date: np.datetime64,
+                 column: str) -> float:
+        """
+
+        Get a single value from market data in constant time, as a Python float regardless of storage dtype.
+        :param date: Date from market data. Other date types are converted with to_date, at extra cost.
+        :param column: Column name.
+        :return: Value as float.
+        """
+        row = self.row_of(date)
+        try:
+            col = self.column_index[column]
+        except KeyError:
+            print('CRITICAL: Column ' + str(column) + ' not in market data. Aborted.')
+            quit()
+        return float(self.read(positions=self.locate(row),
+                               columns=col))
+
+    def prices_at(self,
+                  date: np.datetime64,
+                  columns: np.ndarray) -> np.ndarray:
+        """
+
+        Get the values of several columns for one date in one indexed read, as float64 (as price_at).
+        :param date: Date from market data. Other date types are converted with to_date, at extra cost.
+        :param columns: Numpy array of column positions, given by self.column_index.
+        :return: Numpy array, in the order of columns.
+        """
+        values = self.read(positions=self.locate(self.row_of(date)),
+                           columns=columns)
+        return values.astype(np.float64)
+
+    def select(self,
+               columns: list,
+               start_date: np.datetime64,
+               end_date: np.datetime64) -> pd.DataFrame:
+        """
+
+        Select a subset of market data between start_date and end_date.
+        :param columns: List of column names.
+        :param start_date: Start date (the oldest date, included in selection).
+        :param end_date:End date (the newest date, included in selection)
+        :return: Pandas dataframe.
+        """
+        if not all(item in self.column_index for item in columns):
+            print('CRITICAL: Selected column name not in market data. Aborted.')
+            quit()
+        start = self.index_of(start_date)
+        end = self.index_of(end_date)
+        values = self.read(positions=self.locate_span(start=start,
+                                                      end=end),
+                           columns=[self.column_index[col] for col in columns])
+        return pd.DataFrame(values,
+                            index=pd.Index(self.dates[start:end + 1], name='Date'),
+                            columns=list(columns))
+
+    def date_from_index(self,
+                        current_date,
+                        index_loc: int) -> np.datetime64:
+        """
+
+        Get date. Starts at current date and offsets index_loc number of days.
+        :param current_date: Date.
+        :param index_loc: Number of offset days.
+        :return: Date.
+        """
+        return self.dates[np.searchsorted(self.dates, self.to_date(current_date)) + index_loc]
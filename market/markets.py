@@ -1,27 +1,107 @@
 import configparser as cp
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
+from market.cache import MarketCache
+from market.calendar import TradingCalendar
+from market.market_lookup import MarketLookup
+from market.price_cube import PriceCube
 
 
-class Markets:
+class Markets(MarketLookup):
+    # Field names in market data columns and the corresponding column names in Yahoo Finance files.
+    fields = {'Open': 'Open',
+              'High': 'High',
+              'Low': 'Low',
+              'Close': 'Close',
+              'AdjClose': 'Adj Close',
+              'Volume': 'Volume'}
+
     def __init__(self,
-                 fill_missing_method) -> None:
+                 fill_missing_method,
+                 columns: list = None,
+                 dtype: str = None) -> None:
         """
 
         Markets class object.
         :param fill_missing_method: Fill missing values method as string.
+        :param columns: List of required columns as "<asset>_<field>", e.g. from MasterPortfolio.required_columns().
+        Only these assets and fields are loaded. None loads all columns of all files.
+        :param dtype: Either "float64", or "float32" for compact storage with volumes as int32. None uses the
+        dtype set in market_config.ini.
         """
         self.config = self.config()
         self.assets = []
         self.fill_missing_method = fill_missing_method
+        self.required_columns = sorted(set(columns)) if columns is not None else None
+        self.dtype = dtype if dtype is not None else self.config['data']['dtype']
+        if self.dtype not in ['float64', 'float32']:
+            print('CRITICAL: Market data dtype "' + self.dtype + '" not implemented. Should be either "float64" or '
+                  '"float32". Aborted.')
+            quit()
         self.data = pd.DataFrame()
-        self.read_csv()
-        self.data_valid()
-        self.columns = self.data.columns.to_list()
-        self.som_eom()
+        self.columns = []
+        # Sizes and modification times of the source files the data was read from, to find appended rows.
+        self.files = {}
+        # Dates and price matrix are the first self.length rows of buffers with room for appended rows.
+        self.length = 0
+        self.date_buffer = np.array([], dtype='datetime64[ns]')
+        self.price_buffer = np.empty((0, 0))
+        self.dates = self.date_buffer
+        self.prices = self.price_buffer
+        self.date_index = {}
+        self.column_index = {}
+        self.calendar = None
+        self.use_cache = self.config.getboolean('cache', 'use_cache')
+        # Data built with other columns or dtype is kept in other cache and cube entries.
+        key = MarketCache.key(fill_missing_method=self.fill_missing_method,
+                              columns=self.required_columns,
+                              dtype=self.dtype)
+        self.cache = MarketCache(cache_directory=self.config['cache']['cache_directory'],
+                                 cache_format=self.config['cache']['cache_format'],
+                                 key=key,
+                                 max_entries=int(self.config['cache']['max_entries']))
+        self.storage = self.config['storage']['backend']
+        self.cube = None
+        if self.storage == 'memmap':
+            self.cube = PriceCube(cube_directory=self.config['storage']['cube_directory'],
+                                  dtype=self.dtype,
+                                  key=key,
+                                  max_entries=int(self.config['storage']['max_entries']))
+        elif self.storage != 'memory':
+            print('CRITICAL: Storage backend "' + self.storage + '" not implemented. Should be either "memory" or '
+                  '"memmap". Aborted.')
+            quit()
+        if not self.open_cube():
+            if not self.read_cache():
+                self.read_csv()
+                self.data_valid()
+                self.memory_report()
+                self.write_cache()
+            self.write_cube()
+        self.build_index()
         print('SUCCESS: Market created.')
         print(' ')
 
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+
+        Market data as a Pandas dataframe. Rows appended by update() are kept as separate frames and only joined
+        here, the first time the dataframe is used after an update.
+        :return: Pandas dataframe.
+        """
+        if len(self.data_frames) > 1:
+            self.data_frames = [pd.concat(self.data_frames)]
+        return self.data_frames[0]
+
+    @data.setter
+    def data(self,
+             data: pd.DataFrame) -> None:
+        self.data_frames = [data]
+
     @staticmethod
     def config() -> cp.ConfigParser:
         """
@@ -38,56 +118,434 @@ class Markets:
 
         return conf
 
+    def source_files(self) -> list:
+        """
+
+        Get all market data files in /input_files/assets.
+        :return: List of Path objects.
+        """
+        input_file_directory = Path(self.config['input_files']['input_file_directory'])
+        return [f for f in input_file_directory.iterdir() if f.is_file()]
+
+    def fingerprint(self) -> str:
+        """
+
+        Fingerprint of the market data files and the parameters used to build self.data.
+        :return: Fingerprint as hex string.
+        """
+        return self.cache.fingerprint(self.source_files(),
+                                      fill_missing_method=self.fill_missing_method,
+                                      columns=self.required_columns,
+                                      dtype=self.dtype)
+
+    def read_cache(self) -> bool:
+        """
+
+        Read merged and validated market data from cache if the source files are unchanged.
+        :return: True if market data was read from cache.
+        """
+        if not self.use_cache:
+            return False
+        data, meta = self.cache.load(fingerprint=self.fingerprint())
+        if data is None:
+            return False
+        self.data = data
+        self.assets = meta['assets']
+        self.files = meta.get('files', {})
+        return True
+
+    def write_cache(self) -> None:
+        """
+
+        Write market data to cache.
+        :return: None.
+        """
+        if self.use_cache:
+            self.cache.save(data=self.data,
+                            fingerprint=self.fingerprint(),
+                            assets=self.assets,
+                            files=self.files)
+
+    def open_cube(self) -> bool:
+        """
+
+        Open the memory-mapped price cube if the memmap storage backend is used and the cube was built from
+        unchanged source files. Only the small non-price columns are then held in self.data.
+        :return: True if the cube was opened.
+        """
+        if self.cube is None or not self.cube.open(fingerprint=self.fingerprint()):
+            return False
+        self.assets = self.cube.assets
+        self.data = self.cube.other
+        self.files = self.cube.meta.get('files', {})
+        return True
+
+    def write_cube(self) -> None:
+        """
+
+        Write price columns to the memory-mapped price cube and drop them from self.data.
+        Does nothing for the memory storage backend.
+        :return: None.
+        """
+        if self.cube is not None:
+            self.cube.write(data=self.data,
+                            assets=self.assets,
+                            fingerprint=self.fingerprint(),
+                            files=self.files)
+            self.open_cube()
+
+    @staticmethod
+    def read_file(f: Path,
+                  fields: list = None,
+                  dtype: str = 'float64',
+                  offset: int = 0) -> pd.DataFrame:
+        """
+
+        Read one Yahoo Finance historical download daily format file.
+        Column names are prefixed with the file name (asset name) and the frame is indexed on date, parsed once
+        here into datetime64. Of rows with the same date, only the last is kept.
+        Run in a worker pool by read_csv.
+        :param f: Path to file.
+        :param fields: List of fields to read, e.g. ["Close"]. None reads all columns.
+        :param dtype: Either "float64", or "float32" for compact storage with volumes as int32.
+        :param offset: Byte offset of the first row to read. Used to only read rows appended to a file.
+        :return: Pandas dataframe.
+        """
+        usecols = None
+        if fields is not None:
+            usecols = ['Date'] + [Markets.fields[field] for field in fields]
+        if offset == 0:
+            raw_data = pd.read_csv(f,
+                                   sep=',',
+                                   usecols=usecols)
+        else:
+            with open(f, 'rb') as file:
+                header = file.readline().decode().strip().split(',')
+                file.seek(offset)
+                raw_data = pd.read_csv(file,
+                                       sep=',',
+                                       header=None,
+                                       names=header,
+                                       usecols=usecols)
+        file_name = str(f.stem)
+
+        # Change column names to include asset name.
+        raw_data.rename(columns={'Open': file_name + '_Open',
+                                 'High': file_name + '_High',
+                                 'Low': file_name + '_Low',
+                                 'Close': file_name + '_Close',
+                                 'Adj Close': file_name + '_AdjClose',
+                                 'Volume': file_name + '_Volume'},
+                        inplace=True)
+        raw_data = raw_data.set_index(['Date'])
+        raw_data.index = pd.to_datetime(raw_data.index,
+                                        format='%Y-%m-%d')
+        duplicated = raw_data.index.duplicated(keep='last')
+        if duplicated.any():
+            print('WARNING: Data file "' + file_name + '" has ' + str(int(duplicated.sum())) + ' duplicate dates. '
+                  'Kept the last row of each date.')
+            raw_data = raw_data[~duplicated]
+
+        # Compact storage. Columns that can not be converted are left as is, and reported by data_valid.
+        if dtype == 'float32':
+            for col in raw_data.columns:
+                values = raw_data[col]
+                try:
+                    if col.endswith('_Volume') and values.notna().all() \
+                            and values.abs().max() <= np.iinfo(np.int32).max:
+                        raw_data[col] = values.astype(np.int32)
+                    else:
+                        raw_data[col] = values.astype(np.float32)
+                except (ValueError, TypeError):
+                    pass
+        return raw_data
+
+    def update(self,
+               delta_file: str = None) -> None:
+        """
+
+        Incrementally append new rows of market data without a full reload.
+        Either reads only the rows appended to the source files since market data was read (sizes kept in
+        self.files, and in the cache and cube metadata), or reads a delta file in the merged format (a "Date" column
+        and market data columns).
+        New rows must come after the existing dates and line up across all assets. If source files were changed
+        in other ways than appending rows, or the new rows do not line up, market data is fully reloaded.
+        :param delta_file: Path to delta file. None reads appended rows from the source files.
+        :return: None.
+        """
+        if delta_file is not None:
+            new_data = pd.read_csv(delta_file,
+                                   sep=',',
+                                   index_col='Date')
+            new_data.index = pd.to_datetime(new_data.index,
+                                            format='%Y-%m-%d')
+            missing = set(self.data_columns()) - set(new_data.columns)
+            if missing:
+                print('CRITICAL: Delta file ' + str(delta_file) + ' is missing column(s) ' +
+                      ', '.join(sorted(missing)) + '. Aborted.')
+                quit()
+            new_data = new_data[self.data_columns()].astype(self.data_dtypes())
+        else:
+            new_data = self.read_appended_rows()
+
+        if new_data is None or not self.aligned(new_data):
+            print('WARNING: New market data can not be appended. Reloading all market data.')
+            self.reload()
+        elif new_data.empty:
+            print('INFO: No new market data.')
+        else:
+            self.append(new_data=new_data,
+                        update_files=delta_file is None)
+
+    def reload(self) -> None:
+        """
+
+        Read all source files again and rebuild cache, price cube and indexes.
+        :return: None.
+        """
+        self.assets = []
+        self.read_csv()
+        self.data_valid()
+        self.write_cache()
+        self.write_cube()
+        self.build_index()
+
+    def read_appended_rows(self):
+        """
+
+        Read the rows appended to each source file since market data was read.
+        :return: Pandas dataframe with new rows joined on date. None if any source file changed in another way.
+        """
+        old_stats = self.files
+        if not old_stats:
+            return None
+        asset_fields = self.required_fields()
+        files = [f for f in sorted(self.source_files()) if f.stem in self.assets]
+        stats = self.cache.file_stats(files)
+        offsets = []
+        for f in files:
+            old = old_stats.get(f.name)
+            if old is None or stats[f.name][0] < old[0]:
+                return None
+            # Only appending whole rows is supported.
+            with open(f, 'rb') as file:
+                file.seek(old[0] - 1)
+                if file.read(1) != b'\n':
+                    return None
+            offsets.append(old[0])
+
+        frames = [self.read_file(f=f,
+                                 fields=asset_fields[f.stem] if asset_fields is not None else None,
+                                 dtype=self.dtype,
+                                 offset=offset)
+                  for f, offset in zip(files, offsets)]
+        sizes = [len(frame.index) for frame in frames]
+        new_data = pd.concat(frames,
+                             axis=1,
+                             join='inner').dropna()
+        if len(new_data.index) != max(sizes):
+            print('WARNING: New rows do not line up across assets.')
+            return None
+        return new_data[self.data_columns()]
+
+    def data_columns(self) -> list:
+        """
+
+        Get market data columns, also for the memmap storage backend where price columns are not in self.data.
+        :return: List of column names.
+        """
+        if self.cube is None:
+            return list(self.columns)
+        return [col for col in self.columns[:self.cube.width] if
+                self.required_columns is None or col in self.required_columns] + self.columns[self.cube.width:]
+
+    def data_dtypes(self) -> dict:
+        """
+
+        Get dtypes of market data columns.
+        :return: Dictionary with {column name: dtype}.
+        """
+        if self.cube is None:
+            return self.data_frames[0].dtypes.to_dict()
+        return {col: self.dtype for col in self.data_columns()}
+
+    def aligned(self,
+                new_data: pd.DataFrame) -> bool:
+        """
+
+        Check that new rows line up with existing market data: same columns, and dates sorted and after the last
+        existing date.
+        :param new_data: New rows.
+        :return: True/False.
+        """
+        if new_data.empty:
+            return True
+        if new_data.columns.to_list() != self.data_columns():
+            print('WARNING: New rows have other columns than market data.')
+            return False
+        dates = new_data.index.values
+        if not (dates[:-1] < dates[1:]).all() or dates[0] <= self.dates[-1]:
+            print('WARNING: New rows are not sorted, or not after the last date ' + self.date_str(self.dates[-1]) + '.')
+            return False
+        return True
+
+    def append(self,
+               new_data: pd.DataFrame,
+               update_files: bool) -> None:
+        """
+
+        Append new rows to market data, cache, price cube, price matrix, indexes and trading calendar.
+        Costs time proportional to the new rows: the price matrix and dates grow in preallocated buffers, the new
+        rows are written to a part file of the cache and in place to the price cube, and self.data only joins
+        them when used.
+        :param new_data: New rows, checked by aligned().
+        :param update_files: True if the new rows were read from the source files, to update the fingerprints and
+        file sizes.
+        :return: None.
+        """
+        if update_files:
+            self.files = self.cache.file_stats(self.source_files())
+        if self.use_cache and self.cache.read_meta():
+            meta = {}
+            fingerprint = self.cache.read_meta()['fingerprint']
+            if update_files:
+                fingerprint = self.fingerprint()
+                meta['files'] = self.files
+            self.cache.append(data=new_data,
+                              fingerprint=fingerprint,
+                              **meta)
+
+        width = 0
+        if self.cube is not None:
+            self.cube.append(data=new_data,
+                             fingerprint=self.fingerprint() if update_files else self.cube.meta['fingerprint'],
+                             files=self.files if update_files else None)
+            width = self.cube.width
+
+        other = new_data[self.columns[width:]]
+        self.data_frames.append(other)
+        first = self.length
+        new_dates = new_data.index.values
+        self.store(dates=new_dates,
+                   prices=other.to_numpy(dtype=self.dtype))
+        self.date_index.update({date: first + row for row, date in enumerate(new_dates)})
+        self.calendar.extend(new_dates)
+        print('SUCCESS: ' + str(len(new_dates)) + ' new rows appended to market data.')
+
+    def store(self,
+              dates: np.ndarray,
+              prices: np.ndarray) -> None:
+        """
+
+        Append rows to the date and price matrix buffers, doubling their size when full, and set self.dates and
+        self.prices to the used rows.
+        :param dates: Numpy array of dates.
+        :param prices: Numpy array with one row per date and the columns of self.prices.
+        :return: None.
+        """
+        n = self.length + len(dates)
+        if n > len(self.date_buffer):
+            capacity = max(n, 2 * len(self.date_buffer))
+            date_buffer = np.empty(capacity, dtype='datetime64[ns]')
+            price_buffer = np.empty((capacity, prices.shape[1]), dtype=self.dtype)
+            date_buffer[:self.length] = self.date_buffer[:self.length]
+            price_buffer[:self.length] = self.price_buffer[:self.length]
+            self.date_buffer = date_buffer
+            self.price_buffer = price_buffer
+        self.date_buffer[self.length:n] = dates
+        self.price_buffer[self.length:n] = prices
+        self.length = n
+        self.dates = self.date_buffer[:n]
+        self.prices = self.price_buffer[:n]
+
+    def required_fields(self) -> dict:
+        """
+
+        Get the required fields of each required asset.
+        :return: Dictionary with {asset name: list of fields}. None if all columns are required.
+        """
+        if self.required_columns is None:
+            return None
+        asset_fields = {}
+        for col in self.required_columns:
+            asset, _, field = col.rpartition('_')
+            if field not in self.fields:
+                print('CRITICAL: Required column ' + col + ' does not end with a valid field name (' +
+                      ', '.join(self.fields) + '). Aborted.')
+                quit()
+            asset_fields.setdefault(asset, []).append(field)
+        return asset_fields
+
     def read_csv(self) -> None:
         """
 
         Read config.ini file. Read all files in /input_files/assets.
         All files must be of ".csv" type and in Yahoo Finance historical download daily format.
-        Merge all files on dates with inner join, leaving the maximum number of dates that are equal.
+        If required columns are given, only the files and columns for those are read.
+        Files are parsed concurrently in a thread or process pool, with the number of workers set in
+        market_config.ini (0 uses all cores).
+        Join all files on dates in one step with inner join, leaving the maximum number of dates that are equal.
         :return: None.
         """
+        files = sorted(self.source_files())
+        self.files = self.cache.file_stats(files)
+        asset_fields = self.required_fields()
+        if asset_fields is None:
+            fields = [None] * len(files)
+        else:
+            missing = set(asset_fields) - set(f.stem for f in files)
+            if missing:
+                print('CRITICAL: No data file for required asset(s) ' + ', '.join(sorted(missing)) + '. Aborted.')
+                quit()
+            files = [f for f in files if f.stem in asset_fields]
+            fields = [asset_fields[f.stem] for f in files]
+        workers = int(self.config['ingestion']['workers']) or os.cpu_count()
+        pool = self.config['ingestion']['pool']
+        if pool == 'thread':
+            executor = ThreadPoolExecutor(max_workers=workers)
+        elif pool == 'process':
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            print('CRITICAL: Ingestion pool "' + pool + '" not implemented. Should be either "thread" or "process". '
+                  'Aborted.')
+            quit()
 
-        input_file_directory = Path(self.config['input_files']['input_file_directory'])
-        num_files = 0
-
-        # Loop over each file in the directory.
-        for f in list(input_file_directory.iterdir()):
-            # Read file into DataFrame.
+        # Read files into DataFrames, in the same order as the files.
+        with executor:
             try:
-                raw_data = pd.read_csv(f, sep=',')
+                frames = list(executor.map(self.read_file, files, fields, [self.dtype] * len(files)))
             except ValueError as e:
                 print('ERROR: File read failed with the following exception:')
                 print('   ' + str(e))
                 print('INFO: Aborted.')
                 quit()
-            else:
-                file_name = str(f.stem)
-                self.assets.append(file_name)
-                print('INFO: Data file "' + file_name + '" read.')
-
-                # Change column names to include asset name.
-                raw_data.rename(columns={'Open': file_name + '_Open',
-                                         'High': file_name + '_High',
-                                         'Low': file_name + '_Low',
-                                         'Close': file_name + '_Close',
-                                         'Adj Close': file_name + '_AdjClose',
-                                         'Volume': file_name + '_Volume'},
-                                inplace=True)
-                raw_data = raw_data.set_index(['Date'])
-
-                # For the first file we use the data as is.
-                if num_files == 0:
-                    self.data = raw_data.copy()
-                # For subsequent files we merge on date (inner join).
-                else:
-                    self.data = pd.merge(self.data,
-                                         raw_data,
-                                         left_index=True,
-                                         right_index=True)
-                num_files += 1
+
+        for f in files:
+            self.assets.append(str(f.stem))
+            print('INFO: Data file "' + str(f.stem) + '" read.')
+
+        # Join all files on date (inner join).
+        if frames:
+            self.data = pd.concat(frames,
+                                  axis=1,
+                                  join='inner')
         print(' ')
         self.data.dropna(inplace=True)
 
+    def memory_report(self) -> None:
+        """
+
+        Report memory used by market data, and memory saved compared to loading all columns as float64.
+        :return: None.
+        """
+        used = self.data.memory_usage(deep=True).sum()
+        full = len(self.data.index) * len(self.fields) * len(self.source_files()) * 8 + \
+            self.data.index.memory_usage(deep=True)
+        saved = max(full - used, 0)
+        print('INFO: Market data uses ' + format(used / 1e6, '.1f') + ' MB. ' + format(saved / 1e6, '.1f') +
+              ' MB (' + format(100 * saved / full, '.0f') + ' %) saved by column pruning and dtype ' + self.dtype +
+              '.')
+
     def data_valid(self) -> None:
         """
 
@@ -102,7 +560,7 @@ class Markets:
         for col in cols:
             col_empties = len(self.data[self.data[col] == ''])
             col_nans = self.data[col].isna().sum()
-            if self.data[col].dtypes != 'float64':
+            if self.data[col].dtype.kind not in 'fiu':
                 floats += 1
             empties += col_empties
             nans += col_nans
@@ -141,90 +599,92 @@ class Markets:
             print('CRITICAL: Fill method ' + self.fill_missing_method + ' not implemented. Aborted.')
             quit()
 
-    def som_eom(self) -> None:
+    def holidays(self) -> list:
+        """
+
+        Read the custom holiday list from market_config.ini.
+        :return: List of dates as strings.
+        """
+        holidays = self.config['calendar']['holidays']
+        return [d.strip() for d in holidays.split(',') if d.strip()]
+
+    def build_index(self) -> None:
         """
 
-        Add columns indicating:
-        * is_som -> is-start-of-month
-        * is_eom -> is-end-of-month
-        * is_sow -> is-start-of-week
-        * is_eow -> is-end-ow-week
-        Used for monthly re-balancing strategies.
+        Build a contiguous price matrix (float64, or float32 for compact storage) of self.data together with hash
+        indexes for date -> row and column name -> column. Used for constant time lookups of prices in the backtest
+        loop. Dates are np.datetime64 (ns), sorted, so they can also be binary searched.
+        Also builds the trading calendar for the dates.
+        For the memmap storage backend, columns in the price cube come first and self.prices only holds the
+        remaining columns of self.data.
+        Must be called again if self.data is changed.
         :return: None.
         """
-        # Add temporary columns for month and week.
-        self.data['dt'] = pd.to_datetime(self.data.index,
-                                         format='%Y-%m-%d')
-        self.data['month'] = self.data['dt'].dt.month.diff()
-        self.data['month'].fillna(0.0, inplace=True)
-        self.data['week'] = self.data['dt'].dt.isocalendar().week.diff()
-        self.data['week'].fillna(0.0, inplace=True)
-
-        # Start of month.
-        self.data['is_som'] = self.data['month'].apply(lambda x: 1 if x != 0.0 else 0)
-
-        # End of month.
-        self.data['is_eom'] = self.data['is_som'].shift(-1)
-        self.data['is_eom'].fillna(0.0, inplace=True)
-        self.data['is_eom'] = self.data['is_eom'].astype(int)
-
-        # Start of week.
-        self.data['is_sow'] = self.data['week'].apply(lambda x: 1 if x != 0.0 else 0)
-
-        # End of week.
-        self.data['is_eow'] = self.data['is_sow'].shift(-1)
-        self.data['is_eow'].fillna(0.0, inplace=True)
-        self.data['is_eow'] = self.data['is_eow'].astype(int)
-
-        # Drop temp columns.
-        self.data.drop(labels='month',
-                       axis='columns',
-                       inplace=True)
-        self.data.drop(labels='week',
-                       axis='columns',
-                       inplace=True)
-        self.data.drop(labels='dt',
-                       axis='columns',
-                       inplace=True)
-
-    def select(self,
-               columns: list,
-               start_date: str,
-               end_date: str) -> pd.DataFrame:
-        """
-
-        Select a subset of market data between start_date and end_date.
-        :param columns: List of column names.
-        :param start_date: Start date (the oldest date, included in selection).
-        :param end_date:End date (the newest date, included in selection)
-        :return: Pandas dataframe.
+        self.columns = self.data.columns.to_list()
+        if self.cube is not None:
+            self.columns = self.cube.columns + self.columns
+        self.length = 0
+        self.date_buffer = np.array([], dtype='datetime64[ns]')
+        self.price_buffer = np.empty((0, len(self.data.columns)), dtype=self.dtype)
+        self.store(dates=self.data.index.values,
+                   prices=self.data.to_numpy(dtype=self.dtype))
+        self.date_index = {date: row for row, date in enumerate(self.dates)}
+        self.column_index = {col: i for i, col in enumerate(self.columns)}
+        self.calendar = TradingCalendar(dates=self.dates,
+                                        holidays=self.holidays())
+
+    def read(self,
+             positions,
+             columns) -> np.ndarray:
         """
-        cols = columns.copy()
-        if any(item in self.columns for item in columns):
-            if start_date not in self.data.index.values:
-                print('CRITICAL: Selected start date not in market data. Aborted.')
-                quit()
-            if end_date not in self.data.index.values:
-                print('CRITICAL: Selected end date not in market data. Aborted.')
-                quit()
-            mask = (self.data.index.values >= start_date) & (self.data.index.values <= end_date)
-            df = self.data[cols].loc[mask]
-            return df
-        else:
-            print('CRITICAL: Selected column name not in market data. Aborted.')
-            quit()
 
-    def date_from_index(self,
-                        current_date: str,
-                        index_loc: int) -> str:
+        Read values from the price matrix, or for the memmap storage backend from the price cube and the price
+        matrix.
+        :param positions: Row index, or slice of row indexes.
+        :param columns: Column position, or list or numpy array of column positions, given by self.column_index.
+        :return: Value, or numpy array with one row per row index if positions is a slice.
+        """
+        if self.cube is None:
+            return self.prices[positions, columns]
+        if np.ndim(columns) == 0:
+            if columns < self.cube.width:
+                return self.cube.values(cols=columns,
+                                        rows=positions)
+            return self.prices[positions, columns - self.cube.width]
+        columns = np.asarray(columns)
+        in_cube = columns < self.cube.width
+        other = self.prices[positions, columns[~in_cube] - self.cube.width]
+        values = np.empty(other.shape[:-1] + (len(columns),), dtype=self.dtype)
+        values[..., in_cube] = self.cube.values(cols=columns[in_cube],
+                                                rows=positions)
+        values[..., ~in_cube] = other
+        return values
+
+    def row_at(self,
+               idx: int) -> np.ndarray:
+        """
+
+        Get all values for one row of market data, see MarketLookup.row_at.
+        For the memmap storage backend the row is read from the price cube and returned as a copy.
+        :param idx: Row index.
+        :return: Numpy array.
+        """
+        if self.cube is None:
+            return super().row_at(idx)
+        return np.concatenate([self.cube.row(idx), self.prices[idx]])
+
+    def rows(self,
+             start: int,
+             end: int) -> np.ndarray:
         """
 
-        Get date as string. Starts at current date and offsets index_loc number of days.
-        :param current_date: Date.
-        :param index_loc: Number of offset days.
-        :return: Date.
+        Get all values for a block of rows of market data, see MarketLookup.rows.
+        For the memmap storage backend the rows are read from the price cube and returned as a copy.
+        :param start: First row index (included).
+        :param end: Last row index (excluded).
+        :return: Numpy array with one row per date.
         """
-        mask = (self.data.index.values >= current_date)
-        df = self.data.loc[mask]
-        date = df.iloc[[index_loc]].index.values[0]
-        return date
+        if self.cube is None:
+            return super().rows(start=start,
+                                end=end)
+        return np.hstack([self.cube.rows(start=start, end=end), self.prices[start:end]])
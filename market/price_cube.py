@@ -0,0 +1,329 @@
+import json
+import uuid
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from market.cache import MarketCache
+
+
+class PriceCube:
+    """
+    Memory-mapped (asset x field x day) price array on disk, float64 or float32.
+    Written once from merged market data and opened read-only, so several processes on the same machine share
+    the OS page cache instead of holding their own copies of the data.
+    Time series for one asset and field are contiguous on disk.
+    Files are allocated with room for more days than written, so new days can be appended in place, at a cost
+    proportional to the new days. Readers only read the days up to the length they opened the cube with, so days
+    written after that do not affect them.
+    Each write, and each growth beyond the allocated days, goes to new files named with a random token, and is
+    published by replacing the metadata file that names them. Files mapped by other processes are never truncated
+    or rewritten in place.
+    Only fields present in market data for at least one asset are stored.
+    """
+    all_fields = ['Open', 'High', 'Low', 'Close', 'AdjClose', 'Volume']
+
+    def __init__(self,
+                 cube_directory: str,
+                 dtype: str = 'float64',
+                 key: str = '',
+                 max_entries: int = 0) -> None:
+        """
+
+        :param cube_directory: Directory for cube entries.
+        :param dtype: Either "float64" or "float32".
+        :param key: Key of the entry, from MarketCache.key. Files are stored in a subdirectory with this name.
+        :param max_entries: Maximum number of entries kept in cube_directory. 0 keeps all entries.
+        """
+        self.root_directory = Path(cube_directory)
+        self.cube_directory = self.root_directory / key
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.fields = []
+        self.data_file = None
+        self.meta_file = self.cube_directory / 'prices.json'
+        self.meta = {}
+        self.array = None
+        self.date_array = None
+        self.other_array = None
+        self.length = 0
+        self.assets = []
+        self.dates = np.array([], dtype='datetime64[ns]')
+        self.lookup = {}
+        self.width = 0
+        self.other = pd.DataFrame()
+
+    def write(self,
+              data: pd.DataFrame,
+              assets: list,
+              fingerprint: str,
+              files: dict = None) -> None:
+        """
+
+        Write all price columns of market data to disk. Columns must be named "<asset>_<field>".
+        Remaining columns, if any, are stored separately and held in memory when the cube is opened.
+        :param data: Market data.
+        :param assets: List of asset names.
+        :param fingerprint: Fingerprint of the source files the data was built from.
+        :param files: Sizes and modification times of the source files, from MarketCache.file_stats.
+        :return: None.
+        """
+        self.cube_directory.mkdir(parents=True, exist_ok=True)
+        fields = [field for field in self.all_fields
+                  if any(asset + '_' + field in data.columns for asset in assets)]
+        price_cols = [asset + '_' + field for asset in assets for field in fields]
+        other = data.drop(columns=[col for col in price_cols if col in data.columns])
+        length = len(data.index)
+        meta = {'fingerprint': fingerprint,
+                'assets': list(assets),
+                'fields': fields,
+                'dtype': self.dtype,
+                'other_columns': other.columns.to_list(),
+                'length': length,
+                'capacity': max(2 * length, 256),
+                'files': files if files is not None else {}}
+        meta.update(self.file_names())
+        array, date_array, other_array = self.allocate(meta)
+        for a, asset in enumerate(assets):
+            for f, field in enumerate(fields):
+                col = asset + '_' + field
+                if col in data.columns:
+                    array[a, f, :length] = data[col].to_numpy(dtype=self.dtype)
+                else:
+                    array[a, f, :length] = np.nan
+        date_array[:length] = data.index.values
+        if other_array is not None:
+            other_array[:length] = other.to_numpy(dtype=self.dtype)
+        self.flush(array, date_array, other_array)
+        self.publish(meta)
+        print('INFO: Price cube written to "' + str(self.cube_directory / meta['data_file']) + '".')
+        MarketCache.evict(root_directory=self.root_directory,
+                          max_entries=self.max_entries,
+                          keep=self.cube_directory)
+
+    def append(self,
+               data: pd.DataFrame,
+               fingerprint: str,
+               files: dict = None) -> None:
+        """
+
+        Append new days to the open cube. The new days are written in place after the existing days, so only the
+        new days are written, unless the allocated days are used up and the cube is first copied to larger files.
+        :param data: New rows of market data, with the same columns as the data the cube was written from.
+        :param fingerprint: Fingerprint of the source files, including the new rows.
+        :param files: Sizes and modification times of the source files. None keeps the stored ones.
+        :return: None.
+        """
+        start = self.length
+        end = start + len(data.index)
+        if end > self.meta['capacity']:
+            self.grow(capacity=max(end, 2 * self.meta['capacity']))
+        array, date_array, other_array = self.allocate(self.meta,
+                                                       mode='r+')
+        for col, (a, f) in self.lookup.items():
+            if col in data.columns:
+                array[a, f, start:end] = data[col].to_numpy(dtype=self.dtype)
+            else:
+                array[a, f, start:end] = np.nan
+        date_array[start:end] = data.index.values
+        if other_array is not None:
+            other_array[start:end] = data[self.meta['other_columns']].to_numpy(dtype=self.dtype)
+        self.flush(array, date_array, other_array)
+
+        meta = dict(self.meta)
+        meta['fingerprint'] = fingerprint
+        meta['length'] = end
+        if files is not None:
+            meta['files'] = files
+        self.publish(meta)
+        self.map(meta)
+        print('INFO: ' + str(end - start) + ' new days appended to price cube "' + str(self.data_file) + '".')
+
+    def grow(self,
+             capacity: int) -> None:
+        """
+
+        Copy the open cube to new files with room for more days, and open those.
+        :param capacity: Number of days to allocate.
+        :return: None.
+        """
+        meta = dict(self.meta)
+        meta['capacity'] = capacity
+        meta.update(self.file_names())
+        array, date_array, other_array = self.allocate(meta)
+        array[:, :, :self.length] = self.array[:, :, :self.length]
+        date_array[:self.length] = self.date_array[:self.length]
+        if other_array is not None:
+            other_array[:self.length] = self.other_array[:self.length]
+        self.flush(array, date_array, other_array)
+        self.publish(meta)
+        self.map(meta)
+
+    @staticmethod
+    def file_names() -> dict:
+        """
+
+        Names of a new set of cube files.
+        :return: Dictionary of file names.
+        """
+        token = uuid.uuid4().hex[:12]
+        return {'data_file': 'prices.' + token + '.dat',
+                'dates_file': 'dates.' + token + '.dat',
+                'other_file': 'other.' + token + '.dat'}
+
+    def allocate(self,
+                 meta: dict,
+                 mode: str = 'w+') -> tuple:
+        """
+
+        Memory-map the cube files named in the metadata, with room for the allocated number of days.
+        :param meta: Cube metadata.
+        :param mode: Either "w+" to create new files, "r+" to write to existing files, or "r" to read them.
+        :return: Tuple of numpy memmaps for prices, dates and other columns. The last is None without other columns.
+        """
+        capacity = meta['capacity']
+        array = np.memmap(self.cube_directory / meta['data_file'],
+                          dtype=self.dtype,
+                          mode=mode,
+                          shape=(len(meta['assets']), len(meta['fields']), capacity))
+        date_array = np.memmap(self.cube_directory / meta['dates_file'],
+                               dtype='datetime64[ns]',
+                               mode=mode,
+                               shape=(capacity,))
+        other_array = None
+        if meta['other_columns']:
+            other_array = np.memmap(self.cube_directory / meta['other_file'],
+                                    dtype=self.dtype,
+                                    mode=mode,
+                                    shape=(capacity, len(meta['other_columns'])))
+        return array, date_array, other_array
+
+    @staticmethod
+    def flush(*arrays) -> None:
+        """
+
+        Flush written memmaps to disk.
+        :param arrays: Numpy memmaps, or None.
+        :return: None.
+        """
+        for array in arrays:
+            if array is not None:
+                array.flush()
+
+    def publish(self,
+                meta: dict) -> None:
+        """
+
+        Replace the metadata file, making the files it names the current cube, and remove files of earlier writes.
+        Processes that still have those mapped keep reading the old data, the space is freed when they close it.
+        :param meta: Cube metadata.
+        :return: None.
+        """
+        temp_file = self.meta_file.with_suffix('.' + uuid.uuid4().hex[:12] + '.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump(meta, f)
+        temp_file.replace(self.meta_file)
+        keep = [meta['data_file'], meta['dates_file'], meta['other_file']]
+        for pattern in ['prices.*', 'dates.*', 'other.*']:
+            for f in self.cube_directory.glob(pattern):
+                if f.name not in keep and f != self.meta_file:
+                    f.unlink(missing_ok=True)
+
+    def open(self,
+             fingerprint: str) -> bool:
+        """
+
+        Open the cube read-only if it was built from the same source files.
+        :param fingerprint: Fingerprint of the current source files.
+        :return: True if the cube was opened.
+        """
+        if not self.meta_file.exists():
+            return False
+        with open(self.meta_file, 'r') as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') != fingerprint or meta['dtype'] != self.dtype or 'dates_file' not in meta:
+            print('INFO: Source files changed. Price cube invalidated.')
+            return False
+        try:
+            self.map(meta)
+        except (OSError, ValueError) as e:
+            # E.g. replaced and removed by another process between reading the metadata and the files.
+            print('WARNING: Price cube could not be opened with the following exception:')
+            print('   ' + str(e))
+            return False
+        MarketCache.touch(self.cube_directory)
+        print('INFO: Price cube opened from "' + str(self.data_file) + '".')
+        return True
+
+    def map(self,
+            meta: dict) -> None:
+        """
+
+        Memory-map the cube files read-only and set the views of the first meta["length"] days.
+        :param meta: Cube metadata.
+        :return: None.
+        """
+        self.array, self.date_array, self.other_array = self.allocate(meta,
+                                                                      mode='r')
+        self.meta = meta
+        self.data_file = self.cube_directory / meta['data_file']
+        self.length = meta['length']
+        self.assets = meta['assets']
+        self.fields = meta['fields']
+        self.dates = self.date_array[:self.length]
+        self.lookup = {asset + '_' + field: (a, f)
+                       for a, asset in enumerate(self.assets)
+                       for f, field in enumerate(self.fields)}
+        self.width = len(self.lookup)
+        other = self.other_array[:self.length] if self.other_array is not None \
+            else np.empty((self.length, 0), dtype=self.dtype)
+        self.other = pd.DataFrame(other,
+                                  index=pd.Index(self.dates, name='Date'),
+                                  columns=meta['other_columns'])
+
+    @property
+    def columns(self) -> list:
+        """
+        Column names of the cube, asset by asset in field order.
+        :return: List of column names.
+        """
+        return list(self.lookup.keys())
+
+    def values(self,
+               cols,
+               rows) -> np.ndarray:
+        """
+
+        Get the values of one or several columns for one day or a block of days.
+        :param cols: Column position, or numpy array of column positions, in self.columns.
+        :param rows: Row (day) index, or slice of row indexes.
+        :return: Value, or numpy array with one row per day if rows is a slice and one column per column position if
+        cols is an array.
+        """
+        a, f = np.divmod(cols, len(self.fields))
+        values = self.array[a, f, rows]
+        if isinstance(rows, slice) and np.ndim(cols) > 0:
+            return values.T
+        return values
+
+    def row(self,
+            row: int) -> np.ndarray:
+        """
+
+        Get all values for one day, in the same order as self.columns.
+        :param row: Row (day) index.
+        :return: Numpy array.
+        """
+        return self.array[:, :, row].ravel()
+
+    def rows(self,
+             start: int,
+             end: int) -> np.ndarray:
+        """
+
+        Get all values for a block of days, one row per day in the same column order as self.columns.
+        :param start: First row (day) index (included).
+        :param end: Last row (day) index (excluded).
+        :return: Numpy array.
+        """
+        block = self.array[:, :, start:end]
+        return block.reshape(self.width, block.shape[2]).T
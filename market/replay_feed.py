@@ -0,0 +1,55 @@
+import asyncio
+import time
+import numpy as np
+from market.markets import Markets
+
+
+class ReplayFeed:
+    """
+    Simulated live market data feed for paper trading, replaying bars of loaded market data with a delay between
+    bars. Stands in for a real feed: any object with the same attributes (columns, dates, holidays, dtype,
+    start_index, end_index), warmup() and an async bars() iterator can be passed to PaperTrading instead.
+    """
+    def __init__(self,
+                 market: Markets,
+                 start_date: str,
+                 end_date: str,
+                 interval: float = 0.0) -> None:
+        """
+
+        :param market: Markets or SharedMarket object to replay.
+        :param start_date: Date of the first bar sent.
+        :param end_date: Date of the last bar sent.
+        :param interval: Seconds between bars.
+        """
+        self.market = market
+        self.interval = max(float(interval), 0.0)
+        self.columns = market.columns
+        # The exchange calendar is known in advance, bar values are not.
+        self.dates = market.dates
+        self.holidays = [Markets.date_str(date) for date in market.calendar.holidays]
+        self.dtype = market.row_at(0).dtype
+        self.start_index = market.index_of(start_date)
+        self.end_index = market.index_of(end_date)
+        if self.end_index < self.start_index:
+            print('CRITICAL: Replay end date is before start date. Aborted.')
+            quit()
+
+    def warmup(self,
+               n: int) -> list:
+        """
+        Bars before the first bar sent, for strategies looking back at recent history when the feed starts.
+        :param n: Number of bars.
+        :return: List of (date, values) tuples, oldest first.
+        """
+        first = max(self.start_index - int(n), 0)
+        return [(self.dates[idx], self.market.row_at(idx)) for idx in range(first, self.start_index)]
+
+    async def bars(self):
+        """
+        Send bars from start date to end date, one every interval seconds.
+        :return: Async iterator of (date, values, arrival time) tuples, with arrival time from time.perf_counter.
+        """
+        for idx in range(self.start_index, self.end_index + 1):
+            await asyncio.sleep(self.interval)
+            yield self.dates[idx], np.array(self.market.row_at(idx)), time.perf_counter()
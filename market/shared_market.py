@@ -0,0 +1,149 @@
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from market.markets import Markets
+from market.calendar import TradingCalendar
+from market.market_lookup import MarketLookup
+
+
+class SharedMarket(MarketLookup):
+    """
+    Read-only market data in shared memory, for running many Backtests in worker processes on one machine.
+    The parent process publishes a loaded Markets object once with SharedMarket.publish(market). The returned object
+    pickles to a small handle (block names, shape, dtype and column names), so it can be passed to worker processes
+    as an argument. Workers attach zero-copy, read-only views of the price matrix and dates instead of re-reading
+    market data files or unpickling a copy of the data.
+    Exposes the same lookup API as a Markets object (see MarketLookup), so it can be passed to Backtests (or a
+    BarFeed) in place of one.
+    The publishing process owns the shared memory blocks and must call close() when all workers are done.
+    """
+    # Attached objects per shared memory block name, so a worker process attaches once for all its backtests.
+    attached = {}
+
+    def __init__(self,
+                 handle: dict,
+                 owner: bool = False) -> None:
+        """
+
+        Use publish() or attach() instead of calling this directly.
+        :param handle: Shared memory handle from publish().
+        :param owner: True for the publishing process, which unlinks the shared memory blocks on close().
+        """
+        self.handle = handle
+        self.owner = owner
+        self.blocks = [shared_memory.SharedMemory(name=handle['prices']),
+                       shared_memory.SharedMemory(name=handle['dates'])]
+        rows, width = handle['shape']
+        self.dtype = handle['dtype']
+        self.prices = np.ndarray((rows, width),
+                                 dtype=self.dtype,
+                                 buffer=self.blocks[0].buf)
+        self.dates = np.ndarray((rows,),
+                                dtype='datetime64[ns]',
+                                buffer=self.blocks[1].buf)
+        self.prices.flags.writeable = False
+        self.dates.flags.writeable = False
+        self.assets = handle['assets']
+        self.columns = handle['columns']
+        self.column_index = {col: i for i, col in enumerate(self.columns)}
+        self.date_index = {date: row for row, date in enumerate(self.dates)}
+        self.calendar = TradingCalendar(dates=self.dates,
+                                        holidays=handle['holidays'])
+        self.frame = None
+
+    def __reduce__(self):
+        """
+
+        Pickle as the shared memory handle only. Unpickling attaches to the shared memory blocks.
+        :return: Tuple for pickle.
+        """
+        return SharedMarket.attach, (self.handle,)
+
+    @classmethod
+    def publish(cls,
+                market: Markets) -> 'SharedMarket':
+        """
+
+        Copy the price matrix and dates of a Markets object into new shared memory blocks.
+        For the memmap storage backend the price cube columns are included.
+        :param market: Markets object.
+        :return: SharedMarket object owning the shared memory blocks.
+        """
+        prices = market.rows(start=0,
+                             end=len(market.dates))
+        dates = market.dates.astype('datetime64[ns]')
+        blocks = []
+        for array in [prices, dates]:
+            # Shared memory blocks can not be empty.
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            blocks.append(block)
+        handle = {'prices': blocks[0].name,
+                  'dates': blocks[1].name,
+                  'shape': prices.shape,
+                  'dtype': str(prices.dtype),
+                  'assets': list(market.assets),
+                  'columns': list(market.columns),
+                  'holidays': market.holidays()}
+        shared = cls(handle=handle,
+                     owner=True)
+        for block in blocks:
+            block.close()
+        cls.attached[handle['prices']] = shared
+
+        print('INFO: Market data published to shared memory (' + str(round(prices.nbytes / 1024 ** 2, 2)) + ' MB).')
+        print(' ')
+
+        return shared
+
+    @classmethod
+    def attach(cls,
+               handle: dict) -> 'SharedMarket':
+        """
+
+        Attach to shared memory blocks published by another process. Attaches once per process and handle.
+        :param handle: Shared memory handle from publish().
+        :return: SharedMarket object.
+        """
+        shared = cls.attached.get(handle['prices'])
+        if shared is None:
+            try:
+                shared = cls(handle=handle)
+            except FileNotFoundError:
+                print('CRITICAL: Shared market data "' + handle['prices'] + '" not found. Has it been closed by the '
+                      'publishing process? Aborted.')
+                quit()
+            cls.attached[handle['prices']] = shared
+        return shared
+
+    def close(self) -> None:
+        """
+
+        Release the views of the shared memory. The owner also frees the shared memory blocks, after which they can
+        no longer be attached.
+        :return: None.
+        """
+        self.frame = None
+        self.prices = None
+        self.dates = None
+        for block in self.blocks:
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = []
+        SharedMarket.attached.pop(self.handle['prices'], None)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+
+        Market data as a dataframe over the shared price matrix (read-only, not copied).
+        :return: Pandas dataframe.
+        """
+        if self.frame is None:
+            self.frame = pd.DataFrame(self.prices,
+                                      index=pd.Index(self.dates, name='Date'),
+                                      columns=self.columns,
+                                      copy=False)
+        return self.frame
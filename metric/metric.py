@@ -220,15 +220,8 @@ class Metrics:
         :param pf: Portfolio object.
         :return: Sharpe ratio.
         """
-        # Get data from backtest results.
-        df = pf.metrics.copy()
-        df['dt'] = pd.to_datetime(df.index,
-                                  format='%Y-%m-%d')
-        df.reset_index(inplace=True)
-        df.set_index(keys='dt',
-                     inplace=True)
-
-        rets = df['pf_1d_pct_rets']
+        # Get data from backtest results. Index is already datetime.
+        rets = pf.metrics['pf_1d_pct_rets']
 
         return np.sqrt(float(self.sharpe_ratio_period)) * (np.mean(rets)) / np.std(rets)
 
@@ -239,15 +232,8 @@ class Metrics:
         :param pf:Portfolio object.
         :return: Sortino ratio.
         """
-        # Get data from backtest results.
-        df = pf.metrics.copy()
-        df['dt'] = pd.to_datetime(df.index,
-                                  format='%Y-%m-%d')
-        df.reset_index(inplace=True)
-        df.set_index(keys='dt',
-                     inplace=True)
-
-        rets = df['pf_1d_pct_rets']
+        # Get data from backtest results. Index is already datetime.
+        rets = pf.metrics['pf_1d_pct_rets']
 
         return np.sqrt(float(self.sortino_ratio_period)) * (np.mean(rets)) / np.std(rets[rets < 0])
 
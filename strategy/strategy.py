@@ -1,7 +1,9 @@
 import abc
+import numpy as np
 import pandas as pd
 from holdings.portfolio import Portfolio, Transaction
 from event_handler.event import Transaction as t_ev
+from market.calendar import TradingCalendar
 
 
 class Strategy(metaclass=abc.ABCMeta):
@@ -13,13 +15,54 @@ class Strategy(metaclass=abc.ABCMeta):
                     data,
                     idx: str,
                     pf: Portfolio,
-                    commission: str):
+                    commission: str) -> list:
+        """
+        Calculate signal. Returns a list of Transaction events, empty if there is nothing to do.
+        Data is a dataframe of the required_columns() for the last lookback() bars, up to and including the current
+        one, prepared by a backtest.signal_handler.SignalHandler.
+        """
         pass
 
     @abc.abstractmethod
     def description(self):
         pass
 
+    @abc.abstractmethod
+    def required_columns(self) -> list:
+        """
+        Market data columns used by the strategy.
+        """
+        pass
+
+    def lookback(self) -> int:
+        """
+        Number of bars of market data, up to and including the current one, the strategy needs for a signal.
+        """
+        return 1
+
+    def schedule(self,
+                 calendar: TradingCalendar,
+                 start: int,
+                 end: int):
+        """
+        Row indexes of the bars the strategy needs a signal for, if they are known before the backtest starts.
+        Strategies with a schedule can be run by Backtests.run_vectorized.
+        :param calendar: TradingCalendar of market data.
+        :param start: Row index of backtest start date.
+        :param end: Row index of backtest end date.
+        :return: Numpy array of row indexes, or None if a signal is needed for every bar.
+        """
+        return None
+
+    def carry_state(self,
+                    strategy: 'Strategy') -> None:
+        """
+        Take over the state of a strategy of the same class that this one replaces in a running portfolio, e.g. when
+        walk-forward optimisation changes parameters between windows. Strategies without state do nothing.
+        :param strategy: Replaced strategy.
+        """
+        pass
+
 
 class BuyAndHold(Strategy):
     def __init__(self,
@@ -33,26 +76,28 @@ class BuyAndHold(Strategy):
                     data: pd.DataFrame,
                     idx: str,
                     pf: Portfolio,
-                    commission: str) -> Transaction:
+                    commission: str) -> list:
+        trans_evs = []
         if not self.completed:
             self.pf = pf
             for key, item in self.id_num_shares.items():
-                intraday_price = data[key].values
+                # Latest bar of the lookback window.
+                intraday_price = data[key].values[-1]
                 date = pf.current_date
                 quantity = int(item)
                 trans = Transaction(name=key,
                                     direction='B',
                                     quantity=quantity,
-                                    price=intraday_price[0],
+                                    price=intraday_price,
                                     commission_scheme=commission,
-                                    date=date)
+                                    date=date,
+                                    validate=False)
                 trans_ev = t_ev(date=pf.current_date,
                                 trans=trans,
                                 pf_id=pf.pf_id)
-                self.completed = True
-                return trans_ev
-        else:
-            pass
+                trans_evs.append(trans_ev)
+            self.completed = True
+        return trans_evs
 
     def description(self) -> str:
         """
@@ -64,6 +109,36 @@ class BuyAndHold(Strategy):
             desc_str = desc_str + key + ': ' + str(100 * int(item)) + ' %' + '\n\n'
         return desc_str
 
+    def required_columns(self) -> list:
+        """
+        Market data columns used by the strategy.
+        :return: List of column names.
+        """
+        return list(self.id_num_shares.keys())
+
+    def schedule(self,
+                 calendar: TradingCalendar,
+                 start: int,
+                 end: int) -> np.ndarray:
+        """
+        Buy on the first bar of the backtest, unless already done.
+        :param calendar: TradingCalendar of market data.
+        :param start: Row index of backtest start date.
+        :param end: Row index of backtest end date.
+        :return: Numpy array of row indexes.
+        """
+        if self.completed:
+            return np.array([], dtype=int)
+        return np.array([start])
+
+    def carry_state(self,
+                    strategy: 'BuyAndHold') -> None:
+        """
+        Keep a completed purchase completed, so a replacing strategy does not buy again.
+        :param strategy: Replaced strategy.
+        """
+        self.completed = strategy.completed
+
 
 class PeriodicRebalancing(Strategy):
     """
@@ -72,35 +147,37 @@ class PeriodicRebalancing(Strategy):
     * start-of-month (som)
     * end-of-week (eow)
     * start-of-week (sow)
+    * end-of-quarter (eoq)
+    * start-of-quarter (soq)
+    * end-of-year (eoy)
+    * start-of-year (soy)
+    * every N trading days (e.g. 5d)
     Last business day counts as last day of month.
+    Re-balance dates are taken from the market's TradingCalendar.
     """
     def __init__(self,
                  period: str,
                  id_weight: dict):
         """
         Set parameters for
-        :param period: Either: end-of-month (eom), start-of-month (som), end-of-week (eow) or
-        start-of-week (sow).
+        :param period: Either: end-of-month (eom), start-of-month (som), end-of-week (eow),
+        start-of-week (sow), end-of-quarter (eoq), start-of-quarter (soq), end-of-year (eoy), start-of-year (soy)
+        or every N trading days (Nd).
         :param id_weight: Dictionary with {position name: weight}. Weight between 0 ans 1.0.
         """
         self.pf = None
-        if period in ['som', 'eom', 'sow', 'eow']:
-            if period == 'sow':
-                p = 'start-of-week'
-            elif period == 'eow':
-                p = 'end-of-week'
-            elif period == 'som':
-                p = 'start-of-month'
-            else:
-                p = 'end-of-month'
+        if TradingCalendar.valid_period(period):
             self.name = 'Periodic re-balancing'
-            self.p = p
+            self.p = TradingCalendar.describe(period)
             self.period = period
             self.id_weight = id_weight
+            # Date of the last re-balance, None before the first.
+            self.last_rebalance = None
 
         else:
             print('CRITICAL: PeriodicRebalancing strategy given parameter period = "'
-                  + period + '". Should be either "som", "eom", "sow" or "eow". Aborted.')
+                  + period + '". Should be either "som", "eom", "sow", "eow", "soq", "eoq", "soy", "eoy" or '
+                  '"<N>d". Aborted.')
             quit()
 
     def calc_signal(self,
@@ -110,81 +187,102 @@ class PeriodicRebalancing(Strategy):
                     commission: str) -> Transaction:
         """
         Calculate if we need to buy more or sell to match target weight.
+        All quantities are calculated from the portfolio before any of the transactions are made.
         :param data: Market data from Backtest.
         :param idx: Index from date in Backtest.
         :param pf: Portfolio from Backtest.
         :param commission: Commission.
-        :return: Transaction.
+        :return: List of Transaction events.
         """
         self.pf = pf
+        self.last_rebalance = pf.current_date
+        positions = self.pf.position_handler.positions
+        pf_mv = pf.total_market_value
+        trans_evs = []
         for key, item in self.id_weight.items():
-            positions = self.pf.position_handler.positions
+            # Latest bar of the lookback window.
+            price = data[key].iloc[-1]
+            date = pf.current_date
 
-            # No positions in portfolio. Buy to match target weight.
-            if not list(positions.items()):
-                price = data[key].iloc[0]
-                date = pf.current_date
-                quantity = int(item * self.pf.total_market_value / price)
+            # Buy or sell to match target weight. No position means a weight of zero.
+            if key in positions:
+                pos_mv = positions[key].market_value
+            else:
+                pos_mv = 0.0
+            pos_weight = pos_mv / pf_mv
+            diff = pos_weight - item
+
+            quantity = int(diff * pf_mv / price)
+
+            if quantity > 0:
+
+                # Sell excess weight.
                 trans = Transaction(name=key,
-                                    direction='B',
+                                    direction='S',
                                     quantity=quantity,
                                     price=price,
                                     commission_scheme=commission,
-                                    date=date)
-                trans_ev = t_ev(date=pf.current_date,
-                                trans=trans)
-                return trans_ev
+                                    date=date,
+                                    validate=False)
+            elif quantity < 0:
 
-            # Existing positions. Buy or sell to match target weight.
+                # Buy the difference in weight.
+                trans = Transaction(name=key,
+                                    direction='B',
+                                    quantity=quantity * -1,
+                                    price=price,
+                                    commission_scheme=commission,
+                                    date=date,
+                                    validate=False)
             else:
-                pos_mv = pf.position_handler.positions[key].market_value
-                pf_mv = pf.total_market_value
-                pos_weight = pos_mv / pf_mv
-                diff = pos_weight - item
-
-                price = data[key].iloc[0]
-                date = pf.current_date
-
-                quantity = int(diff * pf_mv / price)
-
-                if quantity > 0:
-
-                    # Sell excess weight.
-                    trans = Transaction(name=key,
-                                        direction='S',
-                                        quantity=quantity,
-                                        price=price,
-                                        commission_scheme=commission,
-                                        date=date)
-                else:
-
-                    # Buy the difference in weight.
-                    trans = Transaction(name=key,
-                                        direction='B',
-                                        quantity=quantity * -1,
-                                        price=price,
-                                        commission_scheme=commission,
-                                        date=date)
-                trans_ev = t_ev (date=pf.current_date,
-                                 trans=trans)
-                return trans_ev
+                continue
+            trans_ev = t_ev(date=pf.current_date,
+                            trans=trans,
+                            pf_id=pf.pf_id)
+            trans_evs.append(trans_ev)
+        return trans_evs
 
     def description(self) -> str:
         """
         Get {position name: weight} as string with line break in between.
         :return: String.
         """
-        p = ''
-        if self.period in ['som', 'eom', 'sow', 'eow']:
-            if self.period == 'sow':
-                p = 'start-of-week'
-            elif self.period == 'eow':
-                p = 'end-of-week'
-            elif self.period == 'som':
-                p = 'start-of-month'
-            else:
-                p = 'end-of-month'
-        desc_str = 'Periodic re-balancing at ' + p + ':' + '\n\n'
+        desc_str = 'Periodic re-balancing at ' + self.p + ':' + '\n\n'
         for key, item in self.id_weight.items():
             desc_str = desc_str + key + ': ' + str(100 * float(item)) + ' %' + '\n\n'
         return desc_str
+
+    def required_columns(self) -> list:
+        """
+        Market data columns used by the strategy.
+        :return: List of column names.
+        """
+        return list(self.id_weight.keys())
+
+    def schedule(self,
+                 calendar: TradingCalendar,
+                 start: int,
+                 end: int) -> np.ndarray:
+        """
+        Re-balance dates from the trading calendar. Periods of N trading days count on from the last re-balance, if
+        the strategy has made one, e.g. when resumed or carried over (see carry_state).
+        :param calendar: TradingCalendar of market data.
+        :param start: Row index of backtest start date.
+        :param end: Row index of backtest end date.
+        :return: Numpy array of row indexes.
+        """
+        last = None
+        if self.last_rebalance is not None:
+            last = int(calendar.dates.searchsorted(pd.Timestamp(self.last_rebalance), side='right')) - 1
+        return calendar.indices(period=self.period,
+                                start=start,
+                                end=end,
+                                last=last)
+
+    def carry_state(self,
+                    strategy: 'PeriodicRebalancing') -> None:
+        """
+        Continue from the last re-balance of the replaced strategy.
+        :param strategy: Replaced strategy.
+        """
+        self.last_rebalance = strategy.last_rebalance
@@ -0,0 +1,47 @@
+import configparser as cp
+import shutil
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmark.synthetic import SyntheticMarket
+
+
+@pytest.fixture(scope='session')
+def workspace(tmp_path_factory) -> Path:
+    """
+    Workspace directory with copies of the project's config files and synthetic market data of 3 assets
+    ("S0000_Close", ...) and the benchmark index "^OMX_Close", on business days of 2020 and 2021.
+    Configs are read relative to the working directory, so tests run with the workspace as working directory.
+    :return: Path of workspace directory.
+    """
+    workspace = tmp_path_factory.mktemp('workspace')
+    for config_file in ROOT.glob('*/*.ini'):
+        target = workspace / config_file.relative_to(ROOT)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(config_file, target)
+    market_config = cp.ConfigParser()
+    market_config.read(workspace / 'market' / 'market_config.ini')
+    market_config['input_files']['input_file_directory'] = './input_files/assets'
+    market_config['cache']['cache_directory'] = './input_files/cache'
+    market_config['storage']['cube_directory'] = './input_files/cube'
+    with open(workspace / 'market' / 'market_config.ini', 'w') as f:
+        market_config.write(f)
+    SyntheticMarket(assets=3,
+                    years=2,
+                    start_date='2020-01-01',
+                    seed=1).write(workspace / 'input_files' / 'assets')
+    return workspace
+
+
+@pytest.fixture(autouse=True)
+def in_workspace(workspace, monkeypatch) -> Path:
+    """
+    Run every test with the workspace as working directory.
+    """
+    monkeypatch.chdir(workspace)
+    return workspace
+
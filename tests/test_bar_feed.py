@@ -0,0 +1,108 @@
+import numpy as np
+import market.markets as m
+from market.bar_feed import BarFeed
+from holdings import portfolio_master, portfolio
+from holdings.transaction import Transaction
+import backtest.backtest as bt
+import strategy.strategy as strat
+from event_handler.event import Transaction as t_ev
+
+START_DATE = '2020-03-02'
+END_DATE = '2021-06-30'
+CHUNK_SIZE = 4
+
+
+class MovingAverage(strat.Strategy):
+    """
+    Strategy holding an asset while its close is above its moving average, with a signal on every bar.
+    """
+    def __init__(self,
+                 name: str,
+                 window: int,
+                 quantity: int):
+        self.name = name
+        self.window = window
+        self.quantity = quantity
+        self.holding = False
+
+    def calc_signal(self,
+                    data,
+                    idx,
+                    pf,
+                    commission) -> list:
+        close = data[self.name].values
+        assert len(close) == self.window
+        above = close[-1] > close.mean()
+        if above == self.holding:
+            return []
+        self.holding = above
+        trans = Transaction(name=self.name,
+                            direction='B' if above else 'S',
+                            quantity=self.quantity,
+                            price=close[-1],
+                            commission_scheme=commission,
+                            date=pf.current_date,
+                            validate=False)
+        return [t_ev(date=pf.current_date,
+                     trans=trans,
+                     pf_id=pf.pf_id)]
+
+    def description(self) -> str:
+        return 'Moving average'
+
+    def required_columns(self) -> list:
+        return [self.name]
+
+    def lookback(self) -> int:
+        return self.window
+
+
+def build() -> portfolio_master.MasterPortfolio:
+    """
+    Master portfolio with strategies looking back over more bars than a chunk, and a scheduled strategy.
+    :return: MasterPortfolio.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    strategies = [MovingAverage(name='S0000_Close',
+                                window=10,
+                                quantity=100),
+                  MovingAverage(name='S0001_Close',
+                                window=3 * CHUNK_SIZE + 1,
+                                quantity=200),
+                  strat.PeriodicRebalancing(period='5d',
+                                            id_weight={'S0001_Close': 0.2,
+                                                       'S0002_Close': 0.6})]
+    for i, st in enumerate(strategies):
+        pf = portfolio.Portfolio(init_cash=200000.0,
+                                 benchmark='^OMX_Close',
+                                 pf_id='pf' + str(i))
+        mp.add_portfolio(pf_id=pf.pf_id,
+                         pf=pf)
+        mp.add_strategy(pf_id=pf.pf_id,
+                        st=st)
+    return mp
+
+
+def test_bar_feed_identical():
+    market = m.Markets(fill_missing_method=None)
+    results = {}
+    for source in [market, BarFeed(market=market,
+                                   lookback=3 * CHUNK_SIZE + 1,
+                                   chunk_size=CHUNK_SIZE)]:
+        mp = build()
+        bt.Backtests(market=source,
+                     mpf=mp,
+                     start_date=START_DATE,
+                     end_date=END_DATE).run()
+        results[type(source).__name__] = mp
+    a, b = results['Markets'], results['BarFeed']
+    assert a.history.equals(b.history)
+    for pf_id in a.portfolios:
+        x, y = a.portfolios[pf_id], b.portfolios[pf_id]
+        assert len(x.ledger) > 2
+        assert x.history.equals(y.history)
+        assert x.records.equals(y.records)
+        assert len(x.ledger) == len(y.ledger)
+        assert x.ledger.names == y.ledger.names
+        for name in ['dates', 'position_ids', 'name_codes', 'directions', 'values']:
+            assert np.array_equal(getattr(x.ledger, name)[:len(x.ledger)], getattr(y.ledger, name)[:len(y.ledger)])
@@ -0,0 +1,120 @@
+import os
+import shutil
+from pathlib import Path
+import pytest
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import strategy.strategy as strat
+
+START_DATE = '2020-01-01'
+END_DATE = '2020-06-30'
+INTERVAL = 20
+
+
+@pytest.fixture
+def checkpoints(workspace) -> Path:
+    """
+    Empty checkpoint directory of the workspace.
+    """
+    directory = workspace / 'checkpoints'
+    shutil.rmtree(directory, ignore_errors=True)
+    return directory
+
+
+def build() -> portfolio_master.MasterPortfolio:
+    """
+    Master portfolio with a re-balancing and a buy and hold portfolio.
+    :return: MasterPortfolio.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    strategies = [strat.PeriodicRebalancing(period='eom',
+                                            id_weight={'S0000_Close': 0.5,
+                                                       'S0001_Close': 0.3}),
+                  strat.BuyAndHold(id_num_shares={'S0001_Close': 100,
+                                                  'S0002_Close': 50})]
+    for i, st in enumerate(strategies):
+        pf = portfolio.Portfolio(init_cash=200000.0,
+                                 benchmark='^OMX_Close',
+                                 pf_id='pf' + str(i))
+        mp.add_portfolio(pf_id=pf.pf_id,
+                         pf=pf)
+        mp.add_strategy(pf_id=pf.pf_id,
+                        st=st)
+    return mp
+
+
+def run_saved(market: m.Markets) -> portfolio_master.MasterPortfolio:
+    """
+    Run a backtest saving a checkpoint every INTERVAL bars.
+    :param market: Market data.
+    :return: MasterPortfolio after the backtest.
+    """
+    mp = build()
+    test = bt.Backtests(market=market,
+                        mpf=mp,
+                        start_date=START_DATE,
+                        end_date=END_DATE)
+    test.checkpoint_interval = INTERVAL
+    test.run()
+    return mp
+
+
+def assert_identical(a: portfolio_master.MasterPortfolio,
+                     b: portfolio_master.MasterPortfolio) -> None:
+    assert a.history.equals(b.history)
+    for pf_id in a.portfolios:
+        assert a.portfolios[pf_id].history.equals(b.portfolios[pf_id].history)
+        assert a.portfolios[pf_id].records.equals(b.portfolios[pf_id].records)
+
+
+def test_resume_identical(checkpoints):
+    market = m.Markets(fill_missing_method=None)
+    saved = run_saved(market=market)
+    files = sorted(checkpoints.glob('*.ckpt'))
+    assert len(files) > 2
+    # Resume the latest checkpoint of the run's id, also when another run id starts with it.
+    middle = files[1]
+    os.utime(middle)
+    shutil.copyfile(middle, checkpoints / ('mp1x_' + middle.name[4:]))
+    assert bt.Backtests.latest_checkpoint().resolve() == middle
+    test = bt.Backtests.resume(market=market)
+    test.checkpoint_interval = 0
+    test.run()
+    assert_identical(saved, test.mpf)
+
+
+def fork(market: m.Markets,
+         date: str) -> portfolio_master.MasterPortfolio:
+    """
+    Fork the saved run at a date as run "alt", with another strategy for portfolio pf0.
+    :param market: Market data.
+    :param date: Date of a checkpoint of the saved run.
+    :return: MasterPortfolio after the backtest.
+    """
+    test = bt.Backtests.fork(market=market,
+                             date=date,
+                             strategies={'pf0': strat.PeriodicRebalancing(period='eow',
+                                                                          id_weight={'S0002_Close': 0.9})},
+                             run_id='alt')
+    test.checkpoint_interval = INTERVAL
+    test.run()
+    return test.mpf
+
+
+def test_fork_from_source_run(checkpoints):
+    market = m.Markets(fill_missing_method=None)
+    saved = run_saved(market=market)
+    dates = [f.stem[-10:] for f in sorted(checkpoints.glob('mp1_*.ckpt'))]
+    first = fork(market=market,
+                 date=dates[0])
+    # The fork saved a checkpoint on a later date of the source run, which must not hide the source's.
+    assert (checkpoints / ('alt_' + dates[1] + '.ckpt')).exists()
+    second = fork(market=market,
+                  date=dates[1])
+    for mp in [first, second]:
+        assert not mp.portfolios['pf0'].history.equals(saved.portfolios['pf0'].history)
+        assert mp.portfolios['pf1'].history.equals(saved.portfolios['pf1'].history)
+    # Up to the fork date, the second fork has the history of the source run.
+    history = second.portfolios['pf0'].history
+    assert history.loc[:dates[1]].equals(saved.portfolios['pf0'].history.loc[:dates[1]])
@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+import pytest
+from event_handler import event as ev
+from event_handler.e_handler import EventHandler
+
+DATE = np.datetime64('2020-01-02', 'ns')
+NEXT_DATE = np.datetime64('2020-01-03', 'ns')
+
+
+def describe(events: list) -> list:
+    """
+    Compact description of events, to compare queue order.
+    :param events: List of Event objects.
+    :return: List of (date, event type, portfolio id) tuples.
+    """
+    return [(event.date, event.event_type, event.pf_id) for event in events]
+
+
+@pytest.mark.parametrize('thread_safe', [False, True])
+def test_same_date_in_priority_order(thread_safe):
+    handler = EventHandler(thread_safe=thread_safe)
+    handler.put_event(ev.CalcSignal(date=NEXT_DATE,
+                                    pf_id='a'))
+    handler.put_event(ev.Transaction(date=DATE,
+                                     trans=None,
+                                     pf_id='a'))
+    handler.put_event(ev.CalcSignal(date=DATE,
+                                    pf_id='a'))
+    handler.put_event(ev.NewBar(date=NEXT_DATE,
+                                pf_id='a'))
+    handler.put_event(ev.NewBar(date=DATE,
+                                pf_id='a'))
+    events = []
+    while not handler.is_empty():
+        events.append(handler.get_event())
+    assert describe(events) == [(DATE, ev.EventType.BAR, 'a'),
+                                (DATE, ev.EventType.CALCSIGNAL, 'a'),
+                                (DATE, ev.EventType.TRANSACTION, 'a'),
+                                (NEXT_DATE, ev.EventType.BAR, 'a'),
+                                (NEXT_DATE, ev.EventType.CALCSIGNAL, 'a')]
+
+
+@pytest.mark.parametrize('thread_safe', [False, True])
+def test_equal_priority_in_insertion_order(thread_safe):
+    handler = EventHandler(thread_safe=thread_safe)
+    pf_ids = ['pf' + str(i) for i in range(20)]
+    handler.put_event(ev.CalcSignal(date=DATE,
+                                    pf_id=pf_ids[0]))
+    handler.put_events([ev.CalcSignal(date=DATE,
+                                      pf_id=pf_id) for pf_id in pf_ids[1:10]])
+    handler.put_event(ev.NewBar(date=DATE,
+                                pf_id='bar'))
+    for pf_id in pf_ids[10:]:
+        handler.put_event(ev.CalcSignal(date=DATE,
+                                        pf_id=pf_id))
+    assert describe(handler.get_events()) == [(DATE, ev.EventType.BAR, 'bar')] + \
+        [(DATE, ev.EventType.CALCSIGNAL, pf_id) for pf_id in pf_ids]
+    assert handler.is_empty()
+
+
+def test_batches_with_lock():
+    handler = EventHandler(thread_safe=True)
+    assert handler.lock is not None
+    pf_ids = ['pf' + str(i) for i in range(4)]
+    # Batches from several threads at once. Each batch is put in one locked operation, so it stays in order.
+    threads = [threading.Thread(target=handler.put_events,
+                                args=([ev.CalcSignal(date=DATE,
+                                                     pf_id=pf_id) for _ in range(250)] +
+                                      [ev.Transaction(date=DATE,
+                                                      trans=None,
+                                                      pf_id=pf_id) for _ in range(250)],)) for pf_id in pf_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    first = handler.get_events(max_events=600)
+    rest = handler.get_events()
+    assert not handler.lock.locked()
+    assert len(first) == 600
+    assert len(rest) == 1400
+    assert handler.is_empty()
+    assert handler.get_events() == []
+    events = first + rest
+    assert [event.event_type for event in events] == [ev.EventType.CALCSIGNAL] * 1000 + \
+        [ev.EventType.TRANSACTION] * 1000
+    # Equal priority events of one batch are in a block, in the order the batches were put.
+    signals = [event.pf_id for event in events[:1000]]
+    transactions = [event.pf_id for event in events[1000:]]
+    order = signals[::250]
+    assert sorted(order) == pf_ids
+    assert signals == [pf_id for pf_id in order for _ in range(250)]
+    assert transactions == signals
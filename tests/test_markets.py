@@ -0,0 +1,82 @@
+import configparser as cp
+import shutil
+import numpy as np
+import pytest
+import market.markets as m
+
+CUT = 10
+
+
+@pytest.fixture(params=['memory', 'memmap'])
+def private_workspace(request, workspace, tmp_path, monkeypatch):
+    """
+    Copy of the workspace with its own market data files, which a test may change, and the storage backend given by
+    the fixture parameter.
+    """
+    private = tmp_path / 'workspace'
+    shutil.copytree(workspace, private,
+                    ignore=shutil.ignore_patterns('cache', 'cube', 'checkpoints'))
+    market_config = cp.ConfigParser()
+    market_config.read(private / 'market' / 'market_config.ini')
+    market_config['storage']['backend'] = request.param
+    with open(private / 'market' / 'market_config.ini', 'w') as f:
+        market_config.write(f)
+    monkeypatch.chdir(private)
+    return private
+
+
+def test_update_appends_new_rows(private_workspace):
+    files = sorted((private_workspace / 'input_files' / 'assets').glob('*.csv'))
+    full = {f: f.read_text() for f in files}
+    for f, text in full.items():
+        lines = text.splitlines(keepends=True)
+        f.write_text(''.join(lines[:-CUT]))
+    market = m.Markets(fill_missing_method=None)
+    assert (market.cube is not None) == (market.config['storage']['backend'] == 'memmap')
+    length = len(market.dates)
+    # New rows in two steps, so the second append goes to buffers and files grown by the first.
+    for f, text in full.items():
+        lines = text.splitlines(keepends=True)
+        f.write_text(''.join(lines[:-CUT // 2]))
+    market.update()
+    for f, text in full.items():
+        f.write_text(text)
+    market.update()
+    assert len(market.dates) == length + CUT
+
+    shutil.rmtree(private_workspace / 'input_files' / 'cache')
+    shutil.rmtree(private_workspace / 'input_files' / 'cube', ignore_errors=True)
+    fresh = m.Markets(fill_missing_method=None)
+    assert np.array_equal(market.dates, fresh.dates)
+    assert market.date_index == fresh.date_index
+    assert np.array_equal(market.rows(0, len(market.dates)), fresh.rows(0, len(fresh.dates)),
+                          equal_nan=True)
+    # The trading calendar was extended with the new dates.
+    assert market.calendar.dates.equals(fresh.calendar.dates)
+    assert list(market.calendar.masks) == list(fresh.calendar.masks)
+    for period in fresh.calendar.masks:
+        assert np.array_equal(market.calendar.mask(period), fresh.calendar.mask(period))
+    assert market.select(columns=['S0000_Close'],
+                         start_date=fresh.dates[-CUT],
+                         end_date=fresh.dates[-1]).equals(fresh.select(columns=['S0000_Close'],
+                                                                       start_date=fresh.dates[-CUT],
+                                                                       end_date=fresh.dates[-1]))
+
+    # Reloaded from the cache and, for the memmap backend, the price cube with the appended rows.
+    cached = m.Markets(fill_missing_method=None)
+    assert np.array_equal(cached.rows(0, len(cached.dates)), fresh.rows(0, len(fresh.dates)),
+                          equal_nan=True)
+
+
+def test_duplicate_dates_keep_last_row(private_workspace, capsys):
+    f = private_workspace / 'input_files' / 'assets' / 'S0001.csv'
+    lines = f.read_text().splitlines(keepends=True)
+    # Repeat the row of the 6th date with another close price, after the 7th date.
+    fields = lines[6].rstrip('\n').split(',')
+    fields[4] = '123.5'
+    f.write_text(''.join(lines[:8] + [','.join(fields) + '\n'] + lines[8:]))
+    market = m.Markets(fill_missing_method=None)
+    assert 'WARNING: Data file "S0001" has 1 duplicate dates.' in capsys.readouterr().out
+    assert len(market.dates) == len(lines) - 1
+    assert market.price_at(date=market.dates[5],
+                           column='S0001_Close') == 123.5
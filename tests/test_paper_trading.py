@@ -0,0 +1,89 @@
+import numpy as np
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import strategy.strategy as strat
+from backtest.paper_trading import PaperTrading
+from market.replay_feed import ReplayFeed
+
+START_DATE = '2020-12-30'
+END_DATE = '2021-06-30'
+
+
+def build() -> portfolio_master.MasterPortfolio:
+    """
+    Master portfolio with one portfolio per kind of scheduled strategy.
+    :return: MasterPortfolio.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    strategies = [strat.BuyAndHold(id_num_shares={'S0000_Close': 100,
+                                                  'S0001_Close': 200}),
+                  strat.PeriodicRebalancing(period='eom',
+                                            id_weight={'S0000_Close': 0.5,
+                                                       'S0002_Close': 0.3}),
+                  strat.PeriodicRebalancing(period='5d',
+                                            id_weight={'S0001_Close': 0.2,
+                                                       'S0002_Close': 0.6,
+                                                       '^OMX_Close': 0.1})]
+    for i, st in enumerate(strategies):
+        pf = portfolio.Portfolio(init_cash=200000.0,
+                                 benchmark='^OMX_Close',
+                                 pf_id='pf' + str(i))
+        mp.add_portfolio(pf_id=pf.pf_id,
+                         pf=pf)
+        mp.add_strategy(pf_id=pf.pf_id,
+                        st=st)
+    return mp
+
+
+def paper_trading(market: m.Markets) -> PaperTrading:
+    """
+    Paper trading of build() on all bars from START_DATE to END_DATE, replayed without delay.
+    :param market: Markets object.
+    :return: PaperTrading object after the run.
+    """
+    test = PaperTrading(feed=ReplayFeed(market=market,
+                                        start_date=START_DATE,
+                                        end_date=END_DATE),
+                        mpf=build())
+    test.run()
+    return test
+
+
+def test_paper_trading_identical():
+    market = m.Markets(fill_missing_method=None)
+    mp = build()
+    bt.Backtests(market=market,
+                 mpf=mp,
+                 start_date=START_DATE,
+                 end_date=END_DATE).run()
+    paper = paper_trading(market).mpf
+    assert mp.history.equals(paper.history)
+    for pf_id in mp.portfolios:
+        x, y = mp.portfolios[pf_id], paper.portfolios[pf_id]
+        assert len(x.records) > 0
+        assert x.history.equals(y.history)
+        assert x.records.equals(y.records)
+        assert x.metrics.equals(y.metrics)
+
+
+def test_latency_report():
+    market = m.Markets(fill_missing_method=None)
+    test = paper_trading(market)
+    report = test.latency_report()
+    assert list(report.columns) == ['stage', 'pf_id', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    bars = market.index_of(END_DATE) - market.index_of(START_DATE) + 1
+    counts = {(row['stage'], row['pf_id']): row['count'] for _, row in report.iterrows()}
+    signals = {pf_id: len(test.signal_dates[pf_id]) for pf_id in test.mpf.portfolios}
+    assert counts == {('bar', test.mpf.pf_id): bars,
+                      ('queue', test.mpf.pf_id): bars,
+                      **{('signal', pf_id): n for pf_id, n in signals.items()}}
+    # BuyAndHold buys on the first bar only.
+    assert signals['pf0'] == 1
+    values = report[['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']].to_numpy()
+    assert (values >= 0).all()
+    assert np.all(np.diff(values[:, 1:], axis=1) >= 0)
+    assert (values[:, 0] <= values[:, 4]).all()
+    # A bar is fully processed after its orders are generated.
+    bar = report.set_index('stage').loc['bar', 'max_ms']
+    assert bar >= report.set_index('stage').loc['signal', 'max_ms'].max()
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+import market.markets as m
+from holdings import portfolio_master, portfolio
+from holdings.position_handler import PositionHandler
+import backtest.backtest as bt
+import strategy.strategy as strat
+from event_handler.event import Transaction as t_ev
+from holdings.transaction import Transaction
+
+START_DATE = '2020-01-01'
+END_DATE = '2020-06-30'
+
+
+class Scripted(strat.Strategy):
+    """
+    Strategy making fixed transactions on fixed dates, at the close.
+    """
+    def __init__(self,
+                 orders: dict):
+        """
+
+        :param orders: Dictionary with {"YYYY-MM-DD": list of (name, direction, quantity)}.
+        """
+        self.orders = orders
+
+    def calc_signal(self,
+                    data,
+                    idx,
+                    pf,
+                    commission) -> list:
+        trans_evs = []
+        for name, direction, quantity in self.orders.get(str(np.datetime64(pf.current_date, 'D')), []):
+            trans = Transaction(name=name,
+                                direction=direction,
+                                quantity=quantity,
+                                price=data[name].values[-1],
+                                commission_scheme=commission,
+                                date=pf.current_date,
+                                validate=False)
+            trans_evs.append(t_ev(date=pf.current_date,
+                                  trans=trans,
+                                  pf_id=pf.pf_id))
+        return trans_evs
+
+    def description(self) -> str:
+        return 'Scripted'
+
+    def required_columns(self) -> list:
+        return sorted({order[0] for orders in self.orders.values() for order in orders})
+
+    def schedule(self,
+                 calendar,
+                 start,
+                 end) -> np.ndarray:
+        return np.sort(calendar.dates.get_indexer(pd.to_datetime(list(self.orders))))
+
+
+@pytest.fixture
+def verify(monkeypatch):
+    """
+    Recalculate all positions and totals from scratch on every read, aborting if they differ from the kept values.
+    """
+    monkeypatch.setattr(PositionHandler, 'verify', True)
+
+
+def run_backtest(market: m.Markets,
+                 strategy: strat.Strategy,
+                 mode: str = 'run') -> portfolio.Portfolio:
+    """
+    Run one strategy in one portfolio over START_DATE to END_DATE.
+    :param market: Market data.
+    :param strategy: Strategy.
+    :param mode: Backtests method, "run" or "run_vectorized".
+    :return: Portfolio after the backtest.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    pf = portfolio.Portfolio(init_cash=200000.0,
+                             benchmark='^OMX_Close',
+                             pf_id='pf1')
+    mp.add_portfolio(pf_id=pf.pf_id,
+                     pf=pf)
+    mp.add_strategy(pf_id=pf.pf_id,
+                    st=strategy)
+    test = bt.Backtests(market=market,
+                        mpf=mp,
+                        start_date=START_DATE,
+                        end_date=END_DATE)
+    getattr(test, mode)()
+    return pf
+
+
+def test_totals_verified(verify):
+    market = m.Markets(fill_missing_method=None)
+    pf = run_backtest(market=market,
+                      strategy=strat.PeriodicRebalancing(period='5d',
+                                                         id_weight={'S0000_Close': 0.4,
+                                                                    'S0001_Close': 0.3,
+                                                                    'S0002_Close': 0.2}))
+    handler = pf.position_handler
+    assert len(handler.positions) == 3
+    assert pf.total_market_value == handler.calculate_totals()['market_value'] + pf.current_cash
+    assert handler.totals == handler.calculate_totals()
+
+
+@pytest.mark.parametrize('mode', ['run', 'run_vectorized'])
+def test_non_positive_price_aborts(mode, capsys):
+    market = m.Markets(fill_missing_method=None)
+    market.prices[market.row_of(market.to_date('2020-03-02')), market.column_index['S0001_Close']] = 0.0
+    with pytest.raises(SystemExit):
+        run_backtest(market=market,
+                     strategy=strat.BuyAndHold(id_num_shares={'S0000_Close': 100,
+                                                              'S0001_Close': 100}),
+                     mode=mode)
+    assert 'CRITICAL: Market price "0.0" of asset "S0001_Close" must be positive' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('mode', ['run', 'run_vectorized'])
+def test_close_middle_position(verify, mode):
+    market = m.Markets(fill_missing_method=None)
+    pf = run_backtest(market=market,
+                      strategy=Scripted(orders={'2020-01-01': [('S0000_Close', 'B', 100),
+                                                               ('S0001_Close', 'B', 200),
+                                                               ('S0002_Close', 'B', 300)],
+                                                '2020-02-03': [('S0001_Close', 'S', 200)],
+                                                '2020-03-02': [('S0000_Close', 'S', 40)],
+                                                '2020-04-01': [('S0001_Close', 'B', 50)]}),
+                      mode=mode)
+    handler = pf.position_handler
+    # The closed position was removed and bought again as a new position, after the others.
+    assert list(handler.positions) == ['S0000_Close', 'S0002_Close', 'S0001_Close']
+    assert [pos.slot for pos in handler.positions.values()] == [0, 1, 2]
+    assert list(handler.arrays.quantities[:len(handler.arrays)]) == [60, 300, 50]
+    assert len(handler.positions['S0001_Close'].transaction_history) == 1
+    assert len(pf.records) == 6
+    # Values of the remaining positions were kept through the compaction.
+    date = market.to_date(END_DATE)
+    for name, pos in handler.positions.items():
+        assert pos.market_value == pos.net_quantity * market.price_at(date=date,
+                                                                      column=name)
@@ -0,0 +1,102 @@
+import contextlib
+import itertools
+import numpy as np
+import pytest
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import backtest.profiler
+import strategy.strategy as strat
+from backtest.profiler import Profiler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Clock of the profiler advancing by one second at every reading.
+    """
+    ticks = itertools.count()
+    monkeypatch.setattr(backtest.profiler.time, 'perf_counter', lambda: float(next(ticks)))
+
+
+def test_disabled_phase_is_nullcontext():
+    profiler = Profiler(enabled=False,
+                        trace_memory=True)
+    assert not profiler.trace_memory
+    phase = profiler.phase(name='run')
+    assert phase is Profiler.disabled
+    assert isinstance(phase, contextlib.nullcontext)
+    with profiler.phase(name='BAR',
+                        pf_id='pf0'):
+        pass
+    assert profiler.durations == {}
+    assert profiler.report().empty
+
+
+def test_report_nested_and_repeated(clock):
+    profiler = Profiler()
+    with profiler.phase(name='run'):
+        for _ in range(3):
+            with profiler.phase(name='BAR'):
+                for pf_id in ['pf0', 'pf1']:
+                    with profiler.phase(name='mark_to_market',
+                                        pf_id=pf_id):
+                        pass
+        with profiler.phase(name='metrics',
+                            pf_id='pf0'):
+            pass
+        with pytest.raises(ValueError):
+            with profiler.phase(name='failed'):
+                raise ValueError
+    # Each phase reads the clock when it starts and stops, and its nested phases in between. The failed phase is not
+    # recorded, but its start is part of the run.
+    report = profiler.report().set_index(['phase', 'pf_id'])
+    assert list(report.index) == [('run', ''), ('BAR', ''), ('mark_to_market', 'pf0'), ('mark_to_market', 'pf1'),
+                                  ('metrics', 'pf0')]
+    assert report['count'].to_dict() == {('run', ''): 1,
+                                         ('BAR', ''): 3,
+                                         ('mark_to_market', 'pf0'): 3,
+                                         ('mark_to_market', 'pf1'): 3,
+                                         ('metrics', 'pf0'): 1}
+    assert report['total_s'].to_dict() == {('run', ''): 22.0,
+                                           ('BAR', ''): 15.0,
+                                           ('mark_to_market', 'pf0'): 3.0,
+                                           ('mark_to_market', 'pf1'): 3.0,
+                                           ('metrics', 'pf0'): 1.0}
+    assert report.loc[('BAR', ''), 'mean_ms'] == 5000.0
+    assert report.loc[('run', ''), 'share'] == 1.0
+    assert report.loc[('BAR', ''), 'share'] == 15.0 / 22.0
+    assert report['alloc_kb'].isna().all()
+
+
+def test_backtest_report():
+    market = m.Markets(fill_missing_method=None)
+    mp = portfolio_master.MasterPortfolio(inception_date='2020-01-01')
+    for i, period in enumerate(['eom', '5d']):
+        pf = portfolio.Portfolio(init_cash=200000.0,
+                                 benchmark='^OMX_Close',
+                                 pf_id='pf' + str(i))
+        mp.add_portfolio(pf_id=pf.pf_id,
+                         pf=pf)
+        mp.add_strategy(pf_id=pf.pf_id,
+                        st=strat.PeriodicRebalancing(period=period,
+                                                     id_weight={'S0000_Close': 0.5}))
+    test = bt.Backtests(market=market,
+                        mpf=mp,
+                        start_date='2020-01-01',
+                        end_date='2020-12-30')
+    test.profiler = Profiler()
+    test.run()
+    report = test.profiler.report()
+    bars = test.end_index - test.start_index + 1
+    counts = report.set_index(['phase', 'pf_id'])['count']
+    assert counts[('run', '')] == 1
+    assert counts[('BAR', '')] == bars
+    assert counts[('mark_to_market', 'pf0')] == counts[('mark_to_market', 'pf1')] == bars
+    assert counts[('CALCSIGNAL', 'pf1')] == len(test.signal_dates['pf1'])
+    run_s = float(report.loc[report['phase'] == 'run', 'total_s'].sum())
+    metrics_s = float(report.loc[report['phase'] == 'metrics', 'total_s'].sum())
+    assert 0 < metrics_s < run_s
+    assert report['phase'].iloc[0] == 'run'
+    assert report.loc[report['phase'] == 'run', 'share'].iloc[0] == 1.0
+    assert np.all(report['share'] <= 1.0)
@@ -0,0 +1,64 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+import market.markets as m
+from market.shared_market import SharedMarket
+
+COLUMNS = ['S0000_Close', '^OMX_Close', 'S0002_Volume']
+
+
+def lookups(market) -> dict:
+    """
+    Results of the lookup API, to compare market data sources. Runs in a worker process for SharedMarket.
+    :param market: Market data source.
+    :return: Dictionary of results.
+    """
+    date = market.dates[100]
+    return {'attached': type(market).__name__ + str(len(SharedMarket.attached)),
+            'dates': np.array(market.dates),
+            'columns': list(market.columns),
+            'row_at': np.array(market.row_at(100)),
+            'rows': np.array(market.rows(start=50,
+                                         end=60)),
+            'bars': list(market.bars(start=3,
+                                     end=7)),
+            'row_of': market.row_of(date),
+            'price_at': market.price_at(date=date,
+                                        column='S0001_Close'),
+            'prices_at': market.prices_at(date=date,
+                                          columns=np.array([market.column_index[col] for col in COLUMNS])),
+            'select': market.select(columns=COLUMNS,
+                                    start_date=market.dates[10],
+                                    end_date=market.dates[20]),
+            'date_from_index': market.date_from_index(current_date=date,
+                                                      index_loc=-5),
+            'calendar': market.calendar.dates}
+
+
+def test_attach_in_worker_process():
+    market = m.Markets(fill_missing_method=None)
+    expected = lookups(market)
+    shared = SharedMarket.publish(market)
+    try:
+        # Spawned, so the worker unpickles the handle and attaches instead of inheriting the published object.
+        with ProcessPoolExecutor(max_workers=1,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(lookups, shared).result()
+    finally:
+        handle = shared.handle
+        shared.close()
+    assert result.pop('attached') == 'SharedMarket1'
+    expected.pop('attached')
+    assert np.array_equal(result.pop('dates'), expected.pop('dates'))
+    assert np.array_equal(result.pop('row_at'), expected.pop('row_at'), equal_nan=True)
+    assert np.array_equal(result.pop('rows'), expected.pop('rows'), equal_nan=True)
+    assert np.array_equal(result.pop('prices_at'), expected.pop('prices_at'), equal_nan=True)
+    assert result.pop('select').equals(expected.pop('select'))
+    assert result.pop('calendar').equals(expected.pop('calendar'))
+    assert result == expected
+
+    # Unlinked by the publishing process.
+    assert handle['prices'] not in SharedMarket.attached
+    with pytest.raises(SystemExit):
+        SharedMarket.attach(handle)
@@ -0,0 +1,78 @@
+import numpy as np
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import strategy.strategy as strat
+
+START_DATE = '2020-01-01'
+END_DATE = '2020-12-31'
+INIT_CASH = 500000.0
+
+
+def run_backtest(strategy: strat.Strategy) -> portfolio.Portfolio:
+    """
+    Run one strategy in one portfolio over START_DATE to END_DATE.
+    :param strategy: Strategy.
+    :return: Portfolio after the backtest.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    pf = portfolio.Portfolio(init_cash=INIT_CASH,
+                             benchmark='^OMX_Close',
+                             pf_id='pf1')
+    mp.add_portfolio(pf_id=pf.pf_id,
+                     pf=pf)
+    mp.add_strategy(pf_id=pf.pf_id,
+                    st=strategy)
+    market = m.Markets(fill_missing_method=None,
+                       columns=mp.required_columns())
+    bt.Backtests(market=market,
+                 mpf=mp,
+                 start_date=START_DATE,
+                 end_date=END_DATE).run()
+    return pf
+
+
+def test_buy_and_hold_single_asset():
+    # Same values as before strategies returned a list of events: one purchase on the first bar, then held.
+    pf = run_backtest(strat.BuyAndHold(id_num_shares={'S0000_Close': 100}))
+    records = pf.records
+    assert len(records) == 1
+    price = records['price'].iloc[0]
+    cash = INIT_CASH - 100 * price - records['commission'].iloc[0]
+    market = m.Markets(fill_missing_method=None,
+                       columns=['S0000_Close'])
+    closes = market.select(columns=['S0000_Close'],
+                           start_date=START_DATE,
+                           end_date=END_DATE)['S0000_Close'].values
+    assert price == closes[0]
+    # History of the first bar is added before the purchase is filled.
+    history = pf.history
+    assert history['current_cash'].iloc[0] == INIT_CASH
+    assert (history['current_cash'].values[1:] == cash).all()
+    assert np.allclose(history['total_market_value'].values[1:], cash + 100 * closes[1:])
+
+
+def test_buy_and_hold_buys_every_asset():
+    # Before strategies returned a list of events, only the first asset was bought.
+    pf = run_backtest(strat.BuyAndHold(id_num_shares={'S0000_Close': 100,
+                                                      'S0001_Close': 50}))
+    records = pf.records
+    assert list(records['name']) == ['S0000_Close', 'S0001_Close']
+    assert list(records['quantity']) == [100, 50]
+    assert (records['date'] == np.datetime64(START_DATE, 'ns')).all()
+    assert list(pf.position_handler.positions) == ['S0000_Close', 'S0001_Close']
+
+
+def test_rebalancing_first_purchase():
+    # On an empty portfolio, each asset is bought for its weight of the portfolio value before any purchase, as the
+    # first asset was before strategies returned a list of events.
+    weights = {'S0000_Close': 0.5,
+               'S0001_Close': 0.3}
+    pf = run_backtest(strat.PeriodicRebalancing(period='eom',
+                                                id_weight=weights))
+    records = pf.records
+    first = records[records['date'] == records['date'].iloc[0]]
+    assert list(first['name']) == list(weights)
+    assert (first['direction'] == 'B').all()
+    for name, quantity, price in zip(first['name'], first['quantity'], first['price']):
+        assert quantity == int(weights[name] * INIT_CASH / price)
@@ -0,0 +1,43 @@
+import numpy as np
+import market.markets as m
+import strategy.strategy as strat
+from backtest.sweep import Sweep, run_combination
+
+START_DATE = '2020-01-01'
+END_DATE = '2021-06-30'
+
+
+def test_parallel_sweep_identical():
+    grid = {'period': ['eom', '10d'],
+            'id_weight': [{'S0000_Close': 0.5,
+                           'S0001_Close': 0.3},
+                          {'S0002_Close': 0.8},
+                          # Not in market data, so these runs fail.
+                          {'S9999_Close': 0.5}]}
+    market = m.Markets(fill_missing_method=None)
+    sweep = Sweep(strategy=strat.PeriodicRebalancing,
+                  grid=grid,
+                  start_date=START_DATE,
+                  end_date=END_DATE,
+                  init_cash=100000.0,
+                  benchmark='^OMX_Close',
+                  workers=2)
+    results = sweep.run(market)
+    assert len(results) == len(sweep.combinations) == 6
+    for row, params in zip(results.to_dict('records'), sweep.combinations):
+        expected = run_combination(market=market,
+                                   strategy=strat.PeriodicRebalancing,
+                                   params=params,
+                                   start_date=START_DATE,
+                                   end_date=END_DATE,
+                                   init_cash=100000.0,
+                                   benchmark='^OMX_Close')
+        assert {key: row[key] for key in params} == params
+        if 'S9999_Close' in params['id_weight']:
+            assert expected['error'].startswith('CRITICAL')
+            assert row['error'] == expected['error']
+            continue
+        assert row['error'] is None
+        assert row['transactions'] > 0
+        for key, value in expected.items():
+            assert row[key] == value or (np.isnan(row[key]) and np.isnan(value))
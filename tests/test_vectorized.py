@@ -0,0 +1,57 @@
+import pytest
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import strategy.strategy as strat
+
+START_DATE = '2020-01-01'
+END_DATE = '2021-06-30'
+
+
+def build() -> portfolio_master.MasterPortfolio:
+    """
+    Master portfolio with one portfolio per kind of scheduled strategy.
+    :return: MasterPortfolio.
+    """
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    strategies = [strat.BuyAndHold(id_num_shares={'S0000_Close': 100,
+                                                  'S0001_Close': 200}),
+                  strat.PeriodicRebalancing(period='eom',
+                                            id_weight={'S0000_Close': 0.5,
+                                                       'S0002_Close': 0.3}),
+                  strat.PeriodicRebalancing(period='5d',
+                                            id_weight={'S0001_Close': 0.2,
+                                                       'S0002_Close': 0.6,
+                                                       '^OMX_Close': 0.1})]
+    for i, st in enumerate(strategies):
+        pf = portfolio.Portfolio(init_cash=200000.0,
+                                 benchmark='^OMX_Close',
+                                 pf_id='pf' + str(i))
+        mp.add_portfolio(pf_id=pf.pf_id,
+                         pf=pf)
+        mp.add_strategy(pf_id=pf.pf_id,
+                        st=st)
+    return mp
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+def test_run_vectorized_identical(dtype):
+    market = m.Markets(fill_missing_method=None,
+                       dtype=dtype)
+    results = {}
+    for mode in ['run', 'run_vectorized']:
+        mp = build()
+        getattr(bt.Backtests(market=market,
+                             mpf=mp,
+                             start_date=START_DATE,
+                             end_date=END_DATE), mode)()
+        results[mode] = mp
+    a, b = results['run'], results['run_vectorized']
+    assert a.history.equals(b.history)
+    for pf_id in a.portfolios:
+        x, y = a.portfolios[pf_id], b.portfolios[pf_id]
+        assert len(x.records) > 0
+        assert x.history.equals(y.history)
+        assert x.records.equals(y.records)
+        assert list(x.position_handler.positions) == list(y.position_handler.positions)
+        assert x.metrics.equals(y.metrics)
@@ -0,0 +1,108 @@
+import numpy as np
+import market.markets as m
+from holdings import portfolio_master, portfolio
+import backtest.backtest as bt
+import strategy.strategy as strat
+from backtest.sweep import run_combination
+from backtest.walk_forward import WalkForward
+
+START_DATE = '2020-01-01'
+END_DATE = '2021-11-30'
+
+
+def walk_forward(strategy: type,
+                 grid) -> WalkForward:
+    """
+    Run walk-forward optimisation in this process, with windows of 120 in-sample and 60 out-of-sample bars.
+    :param strategy: Strategy class.
+    :param grid: Parameter grid.
+    :return: WalkForward object after the run.
+    """
+    wf = WalkForward(strategy=strategy,
+                     grid=grid,
+                     start_date=START_DATE,
+                     end_date=END_DATE,
+                     in_sample=120,
+                     out_of_sample=60,
+                     mode='rolling',
+                     objective='total_return',
+                     workers=1)
+    wf.run(market=m.Markets(fill_missing_method=None))
+    return wf
+
+
+def test_buy_and_hold_buys_once():
+    wf = walk_forward(strategy=strat.BuyAndHold,
+                      grid={'id_num_shares': [{'S0000_Close': 100},
+                                              {'S0000_Close': 200}]})
+    assert len(wf.windows) > 2
+    records = wf.portfolio.records
+    assert len(records) == 1
+    assert records['date'].iloc[0] == wf.windows['out_of_sample_start'].iloc[0]
+    assert wf.portfolio.position_handler.positions['S0000_Close'].net_quantity == records['quantity'].iloc[0]
+
+
+def test_out_of_sample_continuous():
+    # With one combination, the out-of-sample windows are the same as one backtest over all of them.
+    params = {'period': '7d',
+              'id_weight': {'S0000_Close': 0.5,
+                            'S0001_Close': 0.3}}
+    wf = walk_forward(strategy=strat.PeriodicRebalancing,
+                      grid=[params])
+    market = m.Markets(fill_missing_method=None)
+    mp = portfolio_master.MasterPortfolio(inception_date=START_DATE)
+    pf = portfolio.Portfolio(init_cash=wf.init_cash,
+                             benchmark=wf.benchmark,
+                             pf_id='walk_forward')
+    mp.add_portfolio(pf_id=pf.pf_id,
+                     pf=pf)
+    mp.add_strategy(pf_id=pf.pf_id,
+                    st=strat.PeriodicRebalancing(**params))
+    bt.Backtests(market=market,
+                 mpf=mp,
+                 start_date=wf.windows['out_of_sample_start'].iloc[0],
+                 end_date=wf.windows['out_of_sample_end'].iloc[-1]).run()
+    assert wf.portfolio.history.equals(pf.history)
+    assert wf.portfolio.records.equals(pf.records)
+
+
+def test_carry_state():
+    market = m.Markets(fill_missing_method=None)
+    old = strat.PeriodicRebalancing(period='5d',
+                                    id_weight={'S0000_Close': 0.5})
+    old.last_rebalance = market.dates[10]
+    new = strat.PeriodicRebalancing(period='5d',
+                                    id_weight={'S0001_Close': 0.5})
+    assert list(new.schedule(calendar=market.calendar, start=12, end=30)) == [12, 17, 22, 27]
+    new.carry_state(old)
+    assert list(new.schedule(calendar=market.calendar, start=12, end=30)) == [15, 20, 25, 30]
+
+    bought = strat.BuyAndHold(id_num_shares={'S0000_Close': 100})
+    bought.completed = True
+    new = strat.BuyAndHold(id_num_shares={'S0000_Close': 200})
+    new.carry_state(bought)
+    assert len(new.schedule(calendar=market.calendar, start=12, end=30)) == 0
+
+
+def test_in_sample_windows_run_by_themselves():
+    grid = {'period': ['eom', '10d'],
+            'id_weight': [{'S0000_Close': 0.9},
+                          {'S0002_Close': 0.9}]}
+    wf = walk_forward(strategy=strat.PeriodicRebalancing,
+                      grid=grid)
+    market = m.Markets(fill_missing_method=None)
+    combinations = wf.sweep.combinations
+    results = wf.in_sample_results
+    assert len(results) == len(wf.windows) * len(combinations)
+    for w in [0, len(wf.windows) - 1]:
+        for c, params in enumerate(combinations):
+            expected = run_combination(market=market,
+                                       strategy=strat.PeriodicRebalancing,
+                                       params=params,
+                                       start_date=wf.windows['in_sample_start'].iloc[w],
+                                       end_date=wf.windows['in_sample_end'].iloc[w],
+                                       init_cash=wf.init_cash,
+                                       benchmark=wf.benchmark)
+            row = results.iloc[w * len(combinations) + c]
+            for key, value in expected.items():
+                assert row[key] == value or (np.isnan(row[key]) and np.isnan(value))